@@ -0,0 +1,303 @@
+"""
+Batch writes of owners and patients (POST /api/owners/bulk/, /api/patients/bulk/).
+
+A batch is a list of up to MAX_OPERATIONS operations:
+
+    {"op": "create", "data": {...}}
+    {"op": "update", "id": 12, "data": {...}}
+    {"op": "delete", "id": 12}
+
+`data` has the same fields as the single-row endpoints and is validated by
+the same OwnerForm / PatientForm (an update replaces every form field, like
+the update endpoints). The batch is all or nothing: if any item is invalid,
+not found, repeats an id or would duplicate an identity key (see
+main/models.py), nothing is written and every item's result says why.
+
+A valid batch is applied in one transaction with a few set-based statements:
+deletes (cascading to patients and cases), then bulk_update, then
+bulk_create, instead of a request, a transaction and the derived-table
+maintenance per row. The search index, read model and counters are updated
+once per statement through notify_rows_changed (main/signals.py).
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .forms import OwnerForm, PatientForm, DUPLICATE_OWNER_ERROR, DUPLICATE_PATIENT_ERROR
+from .models import Owner, Patient, Case
+from . import reference
+from .signals import notify_rows_changed
+
+MAX_OPERATIONS = 1000
+OPERATIONS = ('create', 'update', 'delete')
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+CONFLICT_ERROR = 'The batch conflicts with existing rows or with itself (e.g. two rows swapping names); nothing was written.'
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+
+def _int_id(value):
+    # Row id of an update/delete item; bools are ints in Python but not valid ids
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _delete_rows(model, ids):
+    """DELETE by pk in chunks (no per-row Collector work or signals), then one notification."""
+    if not ids:
+        return
+    table, column = model._meta.db_table, model._meta.pk.column
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    notify_rows_changed(model, ids, 'deleted')
+
+
+# --- Per-Model Rules --- #
+
+def _owner_identity(owner):
+    return owner.identity_key
+
+
+def _existing_owners(owners):
+    # identity key -> pk of the rows that already have the batch's keys
+    keys = [owner.identity_key for owner in owners]
+    found = {}
+    for chunk in _chunks(keys):
+        found.update(Owner.objects.filter(identity_key__in=chunk).values_list('identity_key', 'pk'))
+    return found
+
+
+def _delete_owners(ids):
+    patient_ids, case_ids = [], set()
+    for chunk in _chunks(ids):
+        patient_ids.extend(Patient.objects.filter(owner_id__in=chunk).values_list('pk', flat=True))
+        case_ids.update(Case.objects.filter(Q(owner_id__in=chunk) | Q(patient__owner_id__in=chunk))
+                        .values_list('pk', flat=True))
+    # Children first, each model notified once (the CASCADE that Model.delete() would do)
+    _delete_rows(Case, sorted(case_ids))
+    _delete_rows(Patient, patient_ids)
+    _delete_rows(Owner, ids)
+
+
+def _patient_identity(patient):
+    # The columns of patient_identity_unique; NULLs never conflict, as in the database
+    identity = (patient.owner_id, patient.name_key, patient.species_id, patient.breed_id, patient.date_of_birth)
+    return None if None in identity else identity
+
+
+def _existing_patients(patients):
+    owner_ids = sorted({patient.owner_id for patient in patients})
+    names = {patient.name_key for patient in patients}
+    found = {}
+    for chunk in _chunks(owner_ids):
+        rows = Patient.objects.filter(owner_id__in=chunk, name_key__in=names).values_list(
+            'owner_id', 'name_key', 'species_id', 'breed_id', 'date_of_birth', 'pk')
+        found.update((row[:5], row[5]) for row in rows)
+    return found
+
+
+def _delete_patients(ids):
+    case_ids = []
+    for chunk in _chunks(ids):
+        case_ids.extend(Case.objects.filter(patient_id__in=chunk).values_list('pk', flat=True))
+    _delete_rows(Case, case_ids)
+    _delete_rows(Patient, ids)
+
+
+def _owner_form_setup(operations):
+    return lambda form: None
+
+
+class _PatientBatchForm(PatientForm):
+    """
+    PatientForm for batch items. owner, species and breed are resolved by their
+    form fields from the batch's preloaded owners and reference snapshot; left
+    out of the model fields, they aren't looked up again by the model's
+    full_clean() (a ForeignKey existence query each, per item). save() sets
+    them instead. The identity constraint they are part of is checked for the
+    whole batch in apply().
+    """
+    RESOLVED_FIELDS = ('owner', 'species', 'breed')
+
+    class Meta(PatientForm.Meta):
+        fields = [name for name in PatientForm.Meta.fields if name not in ('owner', 'species', 'breed')]
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        for name in self.RESOLVED_FIELDS:
+            setattr(instance, name, self.cleaned_data[name])
+        if commit:
+            instance.save()
+        return instance
+
+
+def _patient_form_setup(operations):
+    # The owners of every item in one query and one reference snapshot,
+    # instead of an owner query and two snapshot lookups per PatientForm
+    owner_ids = {_int_id(item['data'].get('owner')) for item in operations
+                 if isinstance(item, dict) and isinstance(item.get('data'), dict)}
+    owner_ids.discard(None)
+    owners = Owner.objects.in_bulk(list(owner_ids))
+    snapshot = reference.get_snapshot()
+
+    def setup(form):
+        form.fields['owner'].preloaded = owners
+        form.fields['species'].snapshot = snapshot
+        form.fields['breed'].snapshot = snapshot
+    return setup
+
+
+# kind -> (model, form, key field, form setup, identity, existing identities, set-based delete, duplicate message)
+KINDS = {
+    'owners': (Owner, OwnerForm, 'identity_key', _owner_form_setup, _owner_identity, _existing_owners,
+               _delete_owners, DUPLICATE_OWNER_ERROR),
+    'patients': (Patient, _PatientBatchForm, 'name_key', _patient_form_setup, _patient_identity, _existing_patients,
+                 _delete_patients, DUPLICATE_PATIENT_ERROR),
+}
+
+
+# --- Batch --- #
+
+def apply(kind, operations):
+    """
+    Validate and apply a batch of `kind` ('owners' or 'patients'). Returns the
+    result dict of the API: 'success', the per-item 'results' (in request
+    order: index, op, success, then id or errors) and, on success, the
+    'created' / 'updated' / 'deleted' counts. Raises ValueError if
+    `operations` isn't a list of 1 to MAX_OPERATIONS items.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('"operations" must be a non-empty list.')
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f'A batch can have at most {MAX_OPERATIONS} operations ({len(operations)} given).')
+    model, form_class, key_field, form_setup, identity_of, find_existing, delete_rows, duplicate_error = KINDS[kind]
+    label = model._meta.verbose_name
+
+    results = [{'index': index, 'op': item.get('op') if isinstance(item, dict) else None, 'success': True}
+               for index, item in enumerate(operations)]
+
+    def fail(index, errors):
+        results[index]['success'] = False
+        results[index]['errors'] = errors
+
+    # The write lock is taken up front (IMMEDIATE transactions), so the existence
+    # and duplicate checks below still hold when the batch is written
+    with transaction.atomic():
+        # 1. Shape of every item; each id at most once per batch
+        targets = {} # index -> row id (updates, deletes)
+        seen_ids = set()
+        for index, item in enumerate(operations):
+            if not isinstance(item, dict) or item.get('op') not in OPERATIONS:
+                fail(index, {'op': [f'Must be one of: {", ".join(OPERATIONS)}.']})
+                continue
+            if item['op'] != 'delete' and not isinstance(item.get('data'), dict):
+                fail(index, {'data': ['An object of field values is required.']})
+                continue
+            if item['op'] != 'create':
+                row_id = _int_id(item.get('id'))
+                if row_id is None:
+                    fail(index, {'id': [f'The {label} id is required.']})
+                elif row_id in seen_ids:
+                    fail(index, {'id': [f'{label.capitalize()} {row_id} appears more than once in this batch.']})
+                else:
+                    seen_ids.add(row_id)
+                    targets[index] = row_id
+
+        # 2. Rows to update (loaded for their forms) and to delete, one query each
+        update_ids = [row_id for index, row_id in targets.items() if operations[index]['op'] == 'update']
+        delete_ids = [row_id for index, row_id in targets.items() if operations[index]['op'] == 'delete']
+        instances = {}
+        for chunk in _chunks(update_ids):
+            instances.update(model.objects.in_bulk(chunk))
+        existing_deletes = set()
+        for chunk in _chunks(delete_ids):
+            existing_deletes.update(model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+
+        # 3. Form validation, exactly as the single-row endpoints
+        setup_form = form_setup(operations)
+        creates, updates = [], [] # (index, unsaved instance)
+        deletes = []
+        for index, item in enumerate(operations):
+            if not results[index]['success']:
+                continue
+            row_id = targets.get(index)
+            if item['op'] == 'delete':
+                if row_id in existing_deletes:
+                    deletes.append(row_id)
+                else:
+                    fail(index, {'id': [f'{label.capitalize()} {row_id} not found.']})
+                continue
+            if item['op'] == 'update' and row_id not in instances:
+                fail(index, {'id': [f'{label.capitalize()} {row_id} not found.']})
+                continue
+            form = form_class(item['data'], instance=instances.get(row_id))
+            setup_form(form)
+            if not form.is_valid():
+                fail(index, form.errors)
+                continue
+            instance = form.save(commit=False)
+            instance.set_keys() # save() isn't called: bulk_create/bulk_update write the keys as given
+            (creates if item['op'] == 'create' else updates).append((index, instance))
+
+        # 4. Identity keys against the database and within the batch. A row
+        # updated or deleted here gives up its current key, so another item may take it.
+        candidates = [(index, instance, identity_of(instance)) for index, instance in creates + updates]
+        existing = find_existing([instance for _, instance, identity in candidates if identity is not None])
+        released = set(update_ids) | set(deletes)
+        claimed = set()
+        for index, instance, identity in sorted(candidates, key=lambda candidate: candidate[0]):
+            if identity is None:
+                continue
+            holder = existing.get(identity)
+            if identity in claimed or (holder is not None and holder != instance.pk and holder not in released):
+                fail(index, {'__all__': [duplicate_error]})
+            claimed.add(identity)
+
+        failed = sum(1 for result in results if not result['success'])
+        if failed:
+            return {
+                'success': False,
+                'error': f'{failed} of {len(operations)} operations failed; nothing was written.',
+                'results': results,
+            }
+
+        # 5. Write: deletes, updates, creates; the derived tables follow in the same transaction
+        try:
+            with transaction.atomic(): # Savepoint: a constraint error leaves the outer transaction usable
+                delete_rows(deletes)
+                if updates:
+                    now = timezone.now()
+                    fields = [*form_class.base_fields, key_field, 'updated_at'] # Every field the form sets
+                    for _, instance in updates:
+                        instance.updated_at = now # auto_now isn't applied by bulk_update
+                    model.objects.bulk_update([instance for _, instance in updates], fields)
+                    notify_rows_changed(model, [instance.pk for _, instance in updates], 'updated')
+                if creates:
+                    # Primary keys come back from the INSERT (RETURNING on SQLite and PostgreSQL)
+                    model.objects.bulk_create([instance for _, instance in creates])
+                    notify_rows_changed(model, [instance.pk for _, instance in creates], 'created')
+        except IntegrityError:
+            return {'success': False, 'error': CONFLICT_ERROR, 'results': results}
+
+    for index, instance in creates + updates:
+        results[index]['id'] = instance.pk
+    for index, row_id in targets.items():
+        results[index].setdefault('id', row_id)
+    return {
+        'success': True,
+        'created': len(creates),
+        'updated': len(updates),
+        'deleted': len(deletes),
+        'results': results,
+    }
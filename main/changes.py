@@ -0,0 +1,189 @@
+"""
+Incremental sync of owners, patients and cases (GET /api/<kind>/changes/).
+
+A client pages through `?since=<token>` and gets the rows created or updated
+after its watermark, plus the ids deleted after it:
+
+    {"changes": [rows, as the list APIs return them], "deleted": [ids],
+     "next": "<token>", "has_more": false}
+
+It passes `next` back until `has_more` is false, keeps the last `next`, and
+polls with it later. Without `since`, the first pages are a full load. Deletes
+that happened before the load started are skipped, since the client has none
+of those rows. `since=latest` returns no rows, just a token for the current end
+of the feed. The list pages use it with the live events (main/live.py) to fetch
+only the rows that changed after they loaded.
+
+Rows are read in (updated_at, pk) order with a keyset seek on the updated_at
+index, and tombstones in (deleted_at, id) order. Each page therefore costs the
+same however far the table has grown. A row updated several times is sent once,
+at its latest position. Patient rows come from the PatientListEntry read model.
+An owner rename doesn't touch its patients' updated_at; it arrives in the owners
+feed.
+
+The watermark is only safe if a row's updated_at is set inside the transaction
+that writes it. SQLite writers are serialized (IMMEDIATE transactions), so no
+commit can then land behind a watermark a reader has already seen. Every write
+path stamps its rows that way, imports included (see importing.py).
+
+Tombstones are kept for settings.CHANGES_TOMBSTONE_DAYS. A token issued longer
+ago than that, less a day, is refused (TokenExpired) and the client must resync.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Owner, PatientListEntry, Patient, Case, Tombstone
+from .serializers import OWNER_ROW, PATIENT_ROW, CASE_ROW
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+LATEST = 'latest' # `since` value: start at the current end of the feed
+
+# kind -> (queryset of the rows, pk source of the serializer, serializer)
+FEEDS = {
+    'owners': (Owner.objects.all, 'id', OWNER_ROW),
+    'patients': (PatientListEntry.objects.all, 'pk', PATIENT_ROW),
+    'cases': (Case.objects.all, 'id', CASE_ROW),
+}
+# Deleted model -> the feed its tombstones belong to
+FEED_MODELS = {Owner: 'owners', Patient: 'patients', Case: 'cases'}
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class TokenExpired(InvalidToken):
+    pass
+
+
+# --- Tombstones --- #
+
+def record_deletes(model, ids):
+    """Tombstones for deleted rows of `model` (called from main.signals, in the deleting transaction)."""
+    kind = FEED_MODELS.get(model)
+    if kind is None:
+        return
+    now = timezone.now()
+    Tombstone.objects.bulk_create([Tombstone(kind=kind, row_id=pk, deleted_at=now) for pk in ids], batch_size=500)
+
+
+def prune_tombstones(days=None):
+    """Delete tombstones older than `days` (default settings.CHANGES_TOMBSTONE_DAYS); returns how many."""
+    days = settings.CHANGES_TOMBSTONE_DAYS if days is None else days
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - datetime.timedelta(days=days)).delete()
+    return deleted
+
+
+# --- Tokens --- #
+
+# Positions are (timestamp, pk) tuples, or None for "from the start"
+
+def _position_json(position):
+    return None if position is None else [position[0].isoformat(), position[1]]
+
+
+def _encode(kind, rows_after, deletes_after, issued):
+    payload = {'k': kind, 'r': _position_json(rows_after), 'd': _position_json(deletes_after),
+               'at': issued.isoformat()}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _parse_position(value):
+    # [ISO timestamp, pk] -> (aware datetime, int)
+    if value is None:
+        return None
+    stamp, pk = value
+    stamp = _parse_stamp(stamp)
+    if isinstance(pk, bool) or not isinstance(pk, int):
+        raise ValueError
+    return stamp, pk
+
+
+def _parse_stamp(value):
+    stamp = parse_datetime(value)
+    if stamp is None or timezone.is_naive(stamp):
+        raise ValueError
+    return stamp
+
+
+def _decode(kind, token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        rows_after = _parse_position(payload['r'])
+        deletes_after = _parse_position(payload['d'])
+        issued = _parse_stamp(payload['at'])
+        token_kind = payload['k']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidToken('Malformed sync token.')
+    if token_kind != kind:
+        raise InvalidToken(f'This sync token is not for {kind}.')
+    max_age = datetime.timedelta(days=settings.CHANGES_TOMBSTONE_DAYS - 1)
+    if issued < timezone.now() - max_age:
+        # Deletes since then may have been pruned
+        raise TokenExpired('Sync token expired; start again without "since" for a full resync.')
+    return rows_after, deletes_after
+
+
+# --- Feed --- #
+
+def _after(stamp_field, position):
+    # Strictly after (stamp, pk) in (stamp, pk) order, as a range on the stamp index
+    stamp, pk = position
+    return Q(**{f'{stamp_field}__gte': stamp}) & (Q(**{f'{stamp_field}__gt': stamp}) | Q(pk__gt=pk))
+
+
+def _last_tombstone(kind):
+    return Tombstone.objects.filter(kind=kind).order_by('-deleted_at', '-pk').values_list('deleted_at', 'pk').first()
+
+
+def changes_since(kind, token=None, limit=DEFAULT_LIMIT):
+    """
+    One page of the `kind` feed after `token` (None: a full load, LATEST: only a token). Returns the
+    response data: 'changes', 'deleted', 'next' and 'has_more'. Raises
+    InvalidToken (or TokenExpired) for a token that can't be used.
+    """
+    queryset, pk_source, serializer = FEEDS[kind]
+    issued = timezone.now()
+    if token == LATEST:
+        last_row = queryset().order_by('-updated_at', '-pk').values_list('updated_at', pk_source).first()
+        return {'changes': [], 'deleted': [], 'next': _encode(kind, last_row, _last_tombstone(kind), issued),
+                'has_more': False}
+    if token:
+        rows_after, deletes_after = _decode(kind, token)
+    else:
+        # Deletes before the load starts don't concern the client. Read before the rows:
+        # a delete committing after this point is after the newest committed tombstone.
+        rows_after, deletes_after = None, _last_tombstone(kind)
+
+    rows = queryset()
+    if rows_after is not None:
+        rows = rows.filter(_after('updated_at', rows_after))
+    rows = list(serializer.values(rows.order_by('updated_at', 'pk'))[:limit + 1])
+
+    tombstones = Tombstone.objects.filter(kind=kind)
+    if deletes_after is not None:
+        tombstones = tombstones.filter(_after('deleted_at', deletes_after))
+    tombstones = list(tombstones.order_by('deleted_at', 'pk').values_list('deleted_at', 'pk', 'row_id')[:limit + 1])
+
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    if rows:
+        rows_after = (rows[-1]['updated_at'], rows[-1][pk_source])
+    if tombstones:
+        deletes_after = tombstones[-1][:2]
+    return {
+        'changes': [serializer.from_dict(row) for row in rows],
+        'deleted': [row_id for _, _, row_id in tombstones],
+        'next': _encode(kind, rows_after, deletes_after, issued),
+        'has_more': has_more,
+    }
@@ -0,0 +1,121 @@
+"""
+Conditional GET support (ETag / Last-Modified -> 304 Not Modified).
+
+Validators are computed from data the views already keep cheap to read, so a
+304 is decided with one or two primary-key lookups and before any page query:
+
+* List APIs: the TableCounter versions/changed_at of every table the response
+  is built from (bumped by main.signals on every write, bulk paths included).
+  The validators don't depend on the query string; each URL is cached
+  separately by the browser anyway.
+* Detail APIs: the `updated_at` of the row (plus rows copied into the response).
+* Reference data (species/breeds): the reference version, which pages also put
+  in the URL so matching requests can be cached for a long time.
+
+Responses are marked `Cache-Control: private, no-cache` so browsers store them
+but always revalidate instead of reusing them heuristically.
+"""
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import counts
+
+
+def conditional_get(etag_func=None, last_modified_func=None):
+    """Like django.views.decorators.http.condition, plus the revalidation header."""
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(response, 'unvalidated', False):
+                # Body isn't fully determined by the validators (e.g. an estimated total)
+                del response['ETag']
+                del response['Last-Modified']
+            if response.status_code in (200, 304):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+# Responses requested with the current version in the URL never change
+VERSIONED_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def versioned_get(version_func, name):
+    """
+    Conditional GET on `version_func()`. Requests carrying `?v=<current version>`
+    get a long-lived, immutable Cache-Control; all others revalidate.
+    """
+    def _version(request):
+        if not hasattr(request, '_reference_version'):
+            request._reference_version = version_func()
+        return request._reference_version
+
+    def etag(request, *args, **kwargs):
+        return f"{name}-{_version(request)}"
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag)(view_func)
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(response, 'unvalidated', False):
+                del response['ETag']
+                patch_cache_control(response, private=True, no_cache=True)
+            elif response.status_code in (200, 304):
+                version = _version(request)
+                response['X-Reference-Version'] = version
+                if request.GET.get('v') == version:
+                    patch_cache_control(response, public=True, max_age=VERSIONED_MAX_AGE, immutable=True)
+                else:
+                    patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def unvalidated(response):
+    """Mark a response that must not be answered with a 304 later (see conditional_get)."""
+    response.unvalidated = True
+    return response
+
+
+def table_validators(*models, name):
+    """(etag_func, last_modified_func) for a list built from the tables of `models`."""
+    def etag(request, *args, **kwargs):
+        versions = '.'.join(str(version) for version in counts.get_versions(*models))
+        return f"{name}-{versions}"
+
+    def last_modified(request, *args, **kwargs):
+        return counts.last_changed(*models)
+
+    return etag, last_modified
+
+
+def row_validators(queryset, *timestamp_fields, name):
+    """(etag_func, last_modified_func) for a detail view of `queryset.get(pk=pk)`."""
+    def _timestamps(request, pk):
+        # Cached on the request: both validator functions need the same row
+        cache_attr = f'_{name}_timestamps'
+        if not hasattr(request, cache_attr):
+            row = queryset.filter(pk=pk).values_list(*timestamp_fields).first()
+            setattr(request, cache_attr, [ts for ts in row if ts is not None] if row else None)
+        return getattr(request, cache_attr)
+
+    def etag(request, pk, *args, **kwargs):
+        timestamps = _timestamps(request, pk)
+        if not timestamps:
+            return None # Missing row: let the view answer 404
+        return f"{name}-{pk}-" + '.'.join(str(int(ts.timestamp() * 1e6)) for ts in timestamps)
+
+    def last_modified(request, pk, *args, **kwargs):
+        timestamps = _timestamps(request, pk)
+        return max(timestamps) if timestamps else None
+
+    return etag, last_modified
@@ -0,0 +1,101 @@
+"""
+Row totals for the list APIs without a COUNT(*) per request.
+
+* Unfiltered totals come straight from TableCounter rows, which main.signals
+  keeps up to date in O(1) on every create/delete (including bulk imports).
+* Filtered totals are cached under the normalized filter parameters together
+  with the TableCounter versions of every table the filter touches. Any write
+  to one of those tables bumps its version, which invalidates the entry; since
+  the versions live in the database this holds across worker processes.
+* While writes are streaming in (e.g. during an import) an expensive count
+  (one that took longer than SLOW_COUNT_SECONDS) computed less than
+  COUNT_STALE_SECONDS ago is reused and reported as estimated, rather than
+  recounting on every request. Cheap counts are always redone exactly.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TableCounter
+
+COUNT_CACHE_SECONDS = 300
+COUNT_STALE_SECONDS = 30
+SLOW_COUNT_SECONDS = 0.25
+
+
+def _counter_name(model):
+    return model._meta.db_table
+
+
+def record_change(model, created=0, deleted=0):
+    """Adjust the row count of `model` and bump its version."""
+    TableCounter.objects.filter(name=_counter_name(model)).update(
+        row_count=F('row_count') + created - deleted,
+        version=F('version') + 1,
+        changed_at=timezone.now(),
+    )
+
+
+def _get_counters(models):
+    names = {_counter_name(model): model for model in models}
+    counters = {c.name: c for c in TableCounter.objects.filter(name__in=names)}
+    for name, model in names.items():
+        if name not in counters:
+            # First use on a database that wasn't seeded by migration 0009
+            counters[name], _ = TableCounter.objects.get_or_create(
+                name=name, defaults={'row_count': model.objects.count()})
+    return counters
+
+
+def get_versions(*models):
+    """Current change versions of `models`, in the order given."""
+    counters = _get_counters(models)
+    return tuple(counters[_counter_name(model)].version for model in models)
+
+
+def change_stamps(*models):
+    """(version, changed_at) of each of `models`, in the order given, from one query."""
+    counters = _get_counters(models)
+    return [(counters[_counter_name(model)].version, counters[_counter_name(model)].changed_at) for model in models]
+
+
+def last_changed(*models):
+    """Latest change time across `models` (None if no model given)."""
+    counters = _get_counters(models)
+    return max((counter.changed_at for counter in counters.values()), default=None)
+
+
+def total_count(model):
+    """Exact unfiltered row count of `model` from its counter row."""
+    return _get_counters([model])[_counter_name(model)].row_count
+
+
+def filtered_count(queryset, params, depends_on):
+    """
+    Count `queryset`, reusing a cached result for the same normalized `params`
+    while none of the `depends_on` models changed.
+
+    Returns (count, exact). `exact` is False only when a slightly stale count
+    was served instead of recounting.
+    """
+    key_source = json.dumps([queryset.model._meta.label, params], sort_keys=True, default=str)
+    cache_key = 'list-count:' + hashlib.sha1(key_source.encode()).hexdigest()
+    versions = get_versions(*depends_on)
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        cached_versions, count, computed_at, duration = cached
+        if cached_versions == versions:
+            return count, True
+        if duration > SLOW_COUNT_SECONDS and time.time() - computed_at < COUNT_STALE_SECONDS:
+            return count, False
+
+    started = time.time()
+    count = queryset.count()
+    duration = time.time() - started
+    cache.set(cache_key, (versions, count, started, duration), COUNT_CACHE_SECONDS)
+    return count, True
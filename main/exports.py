@@ -0,0 +1,185 @@
+"""
+Streaming exports of owners, patients and cases as CSV or NDJSON.
+
+Rows are read with `values_list(...).iterator(chunk_size=CHUNK_SIZE)`, a
+server-side cursor that fetches CHUNK_SIZE rows at a time, and are written out
+a chunk at a time. Memory use doesn't depend on the number of rows. The export
+views send the chunks with a StreamingHttpResponse; `manage.py export_data`
+writes them to a file or stdout.
+
+Owner and patient exports take the list APIs' filter and sort parameters
+(main/listing.py) and have exactly the columns of the import templates. An
+export can be imported again as it is: the importers skip rows that are
+already in the database (see the identity keys in main/models.py). Cases have
+no import. Their export identifies each case's owner and patient by the same
+columns the patient import uses.
+
+NDJSON lines are objects with the CSV column names as keys, with JSON types:
+null for blank values, true/false for intact, weights as strings (exact
+digits, like the list APIs).
+"""
+import csv
+import io
+import json
+
+from django.utils import timezone
+
+from . import listing
+from .serializers import orjson
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+# Rows fetched from the database cursor and written out per chunk
+CHUNK_SIZE = 2000
+
+
+# --- Column Converters (import formats, all None-safe) --- #
+
+def timestamp(value):
+    """datetime -> 'YYYY-MM-DD HH:MM:SS' in the current time zone (the owner import's created_at format)."""
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value is not None else None
+
+
+def date(value):
+    return value.isoformat() if value is not None else None
+
+
+def decimal(value):
+    return str(value) if value is not None else None
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return value
+
+
+# --- Export Definitions --- #
+
+# (column, source field or None for an always-blank column, converter)
+OWNER_COLUMNS = (
+    ('last_name', 'last_name', None),
+    ('first_name', 'first_name', None),
+    ('email', 'email', None),
+    ('telephone', 'telephone', None),
+    ('address', 'address', None),
+    ('comments', 'comments', None),
+    ('created_at', 'created_at', timestamp),
+)
+# From the PatientListEntry read model, joined to the owner for the contact columns
+PATIENT_COLUMNS = (
+    ('last_name', 'owner_last_name', None),
+    ('first_name', 'owner_first_name', None),
+    ('email', 'owner__email', None),
+    ('telephone', 'owner__telephone', None),
+    ('address', 'owner__address', None),
+    ('owner_comments', 'owner__comments', None),
+    ('patient_name', 'name', None),
+    ('species_code', 'species_code', None),
+    ('breed_name', 'breed_name', None),
+    ('sex', 'sex', None),
+    ('intact', 'intact', None),
+    ('date_of_birth', 'date_of_birth', date),
+    ('age_years', None, None), # Import alternative to date_of_birth
+    ('weight_kg', 'weight', decimal),
+)
+CASE_COLUMNS = (
+    ('case_date', 'case_date', date),
+    ('last_name', 'owner__last_name', None),
+    ('first_name', 'owner__first_name', None),
+    ('email', 'owner__email', None),
+    ('patient_name', 'patient__name', None),
+    ('species_code', 'patient__species__code', None),
+    ('breed_name', 'patient__breed__name', None),
+    ('date_of_birth', 'patient__date_of_birth', date),
+    ('complaint', 'complaint', None),
+    ('history', 'history', None),
+    ('created_at', 'created_at', timestamp),
+)
+
+
+def _owners(params):
+    return listing.owners(params)[0]
+
+
+def _patients(params):
+    return listing.patients(params)[0]
+
+
+# kind -> (columns, queryset from the list parameters)
+EXPORTS = {
+    'owners': (OWNER_COLUMNS, _owners),
+    'patients': (PATIENT_COLUMNS, _patients),
+    'cases': (CASE_COLUMNS, listing.cases),
+}
+
+
+class Export:
+    """
+    One export of `kind` ('owners', 'patients' or 'cases') in `fmt` ('csv' or
+    'ndjson'), filtered and sorted by `params` (a QueryDict of list API
+    parameters). Iterating it runs the query and yields the encoded output a
+    chunk at a time; `row_count` counts the rows written so far.
+    """
+
+    def __init__(self, kind, params, fmt='csv'):
+        if fmt not in FORMATS:
+            raise ValueError(f'Invalid format "{fmt}". Use {" or ".join(FORMATS)}.')
+        self.kind = kind
+        self.fmt = fmt
+        self.columns, queryset = EXPORTS[kind]
+        self.queryset = queryset(params)
+        self.row_count = 0
+
+    @property
+    def content_type(self):
+        return FORMATS[self.fmt]
+
+    def file_name(self):
+        return f"{self.kind}-{timezone.localtime():%Y%m%d-%H%M%S}.{self.fmt}"
+
+    def _rows(self):
+        # Converted values of every row, in column order, CHUNK_SIZE rows at a time
+        sources = list(dict.fromkeys(source for _, source, _ in self.columns if source))
+        getters = [(sources.index(source) if source else None, converter) for _, source, converter in self.columns]
+        chunk = []
+        for row in self.queryset.values_list(*sources).iterator(chunk_size=CHUNK_SIZE):
+            values = []
+            for position, converter in getters:
+                value = row[position] if position is not None else None
+                values.append(converter(value) if converter is not None else value)
+            chunk.append(values)
+            if len(chunk) >= CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def __iter__(self):
+        names = [name for name, _, _ in self.columns]
+        if self.fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            yield buffer.getvalue().encode('utf-8')
+            for chunk in self._rows():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_csv_cell(value) for value in values] for values in chunk)
+                self.row_count += len(chunk)
+                yield buffer.getvalue().encode('utf-8')
+        else:
+            if orjson is not None:
+                dumps = orjson.dumps
+            else:
+                def dumps(obj):
+                    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            for chunk in self._rows():
+                self.row_count += len(chunk)
+                yield b''.join(dumps(dict(zip(names, values))) + b'\n' for values in chunk)
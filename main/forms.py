@@ -1,6 +1,12 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Owner, Species, Breed, Patient, Case
+from . import reference
+
+# Unique identity keys (see main/models.py), reported as form-level errors
+DUPLICATE_OWNER_ERROR = 'An owner with the same last name, first name and email already exists.'
+DUPLICATE_PATIENT_ERROR = 'This owner already has a patient with the same name, species, breed and date of birth.'
 
 class OwnerForm(forms.ModelForm):
     class Meta:
@@ -8,17 +14,55 @@ class OwnerForm(forms.ModelForm):
         fields = ['last_name', 'first_name', 'email', 'telephone', 'address', 'comments']
         # You can add widgets here later if needed for styling 
 
+# --- Reference Data Fields --- #
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that resolves species/breeds from the shared reference snapshot instead of querying."""
+    snapshot = None # Set per form by batch writes: one snapshot for every item
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            return value
+        snapshot = self.snapshot or reference.get_snapshot()
+        if self.queryset.model is Species:
+            instance = snapshot.species(str(value))
+        else:
+            try:
+                instance = snapshot.breed(int(value))
+            except (TypeError, ValueError):
+                instance = None
+        if instance is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return instance
+
+
+class PreloadedChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that first looks the pk up in `preloaded` (pk -> instance), set per form by batch writes."""
+    preloaded = None
+
+    def to_python(self, value):
+        if self.preloaded is not None and value not in self.empty_values:
+            try:
+                instance = self.preloaded.get(int(value))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is not None:
+                return instance
+        return super().to_python(value) # Not preloaded: query (or invalid_choice)
+
 # --- New Patient Form --- #
 
 class PatientForm(forms.ModelForm):
     # We expect species to come as a Species instance from the view,
     # and breed/owner as IDs initially, but ModelChoiceField handles the conversion.
-    species = forms.ModelChoiceField(queryset=Species.objects.all(), to_field_name='code',
-                                     error_messages={'invalid_choice': 'Invalid species code.'})
-    breed = forms.ModelChoiceField(queryset=Breed.objects.all(),
-                                  error_messages={'invalid_choice': 'Invalid breed selection.'})
-    owner = forms.ModelChoiceField(queryset=Owner.objects.all(),
-                                  error_messages={'invalid_choice': 'Invalid owner selection.'})
+    species = ReferenceChoiceField(queryset=Species.objects.all(), to_field_name='code',
+                                   error_messages={'invalid_choice': 'Invalid species code.'})
+    breed = ReferenceChoiceField(queryset=Breed.objects.all(),
+                                 error_messages={'invalid_choice': 'Invalid breed selection.'})
+    owner = PreloadedChoiceField(queryset=Owner.objects.all(),
+                                 error_messages={'invalid_choice': 'Invalid owner selection.'})
 
     class Meta:
         model = Patient
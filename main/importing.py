@@ -0,0 +1,984 @@
+"""
+Streaming CSV import engine.
+
+Uploads are decoded line by line (Django's File iterator + an incremental
+UTF-8 decoder) instead of reading the whole file into one string, and rows go
+to the database in bounded bulk_create batches, so memory use doesn't grow
+with the file.
+
+On SQLite, inside the import transaction, batches are written with one
+executemany() of plain tuples (see insert_rows), which skips building model
+instances and compiling an INSERT per batch; other databases use bulk_create.
+
+Duplicates are left to the database: owners, patients and breeds have unique
+constraints on normalized key columns (see main/models.py), and the importers
+insert with insert_rows(..., ignore_conflicts=True), which skips rows that
+would duplicate an existing row or an earlier row of the same file and
+returns the keys of the inserted ones. Nothing is looked up first, so
+concurrent imports can't both insert the same owner.
+
+The patient import validates rows one by one but resolves them a chunk at a
+time (PatientImporter.resolve_chunk): existing owners of the whole chunk are
+looked up by their identity key with a few IN queries (their details are
+updated), then new owners, missing breeds and the patients are inserted per
+chunk.
+
+Both importers can also run rows validated earlier by a staged import session
+(run_staged, see main/staging.py): the CSV isn't decoded or validated again.
+
+Rows are validated a batch at a time, column by column (parse_columns):
+each column of a batch is parsed in one pass, with every distinct value
+(dates, weights, ages, species codes) parsed once per batch and sex/intact
+checked against lookup tables. The first failing check of each row is found
+for all rows at once, with NumPy when it is installed. Results and error
+messages are exactly those of the row-by-row parsers (parse_owner,
+parse_row), which remain the fallback.
+
+An import runs either in one transaction (all or nothing, the caller's
+import_transaction()) or in chunked mode (ChunkedCommit): every chunk of
+IMPORT_BATCH_SIZE rows commits on its own, with a checkpoint to resume from,
+so other writers get SQLite's write lock between chunks.
+
+Both importers take an optional `progress` callback, called with the importer
+every `batch_size` rows read (background jobs publish it, see main/jobs.py),
+and an optional `spool` that receives every row error (the downloadable error
+report, see main/reports.py), and build their JSON result with result().
+"""
+import codecs
+import csv
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError: # Optional speed-up for parse_columns, see NOTES.md
+    numpy = None
+
+from .models import Owner, Breed, Patient, ImportCheckpoint, name_key, owner_key
+from .signals import notify_rows_changed
+from . import reference
+
+# Rows per bulk_create / change notification
+IMPORT_BATCH_SIZE = 2000
+# Values per IN (...) list, well below SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+# Row errors kept for the response (the total is always counted)
+MAX_KEPT_ERRORS = 1000
+
+IMPORT_COMMENT = "<Added through bulk import>"
+PATIENT_IMPORT_COMMENT = "<Patient and Owner data added through bulk import>"
+
+
+def with_import_comment(comments, marker):
+    """
+    `comments` followed by the import `marker`, unless they already have an
+    import marker (e.g. an exported file imported again).
+    """
+    if comments and (IMPORT_COMMENT in comments or PATIENT_IMPORT_COMMENT in comments):
+        return comments
+    return f"{comments or ''}\n{marker}".strip()
+
+
+# --- Reading --- #
+
+def csv_dict_reader(uploaded_file):
+    """
+    DictReader over an uploaded file, decoded incrementally as UTF-8 (BOM
+    stripped), with header names stripped and lower-cased.
+    UnicodeDecodeError surfaces while iterating.
+    """
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    return reader
+
+
+class ErrorLog:
+    """
+    Row error messages: counts all of them, keeps the first MAX_KEPT_ERRORS
+    and hands every one to `spool` (see main/reports.py), if given.
+    """
+
+    def __init__(self, limit=MAX_KEPT_ERRORS, spool=None):
+        self.limit = limit
+        self.spool = spool
+        self.messages = []
+        self.count = 0
+
+    def add(self, message):
+        self.count += 1
+        if len(self.messages) < self.limit:
+            self.messages.append(message)
+        if self.spool is not None:
+            self.spool.add(message)
+
+    def __bool__(self):
+        return self.count > 0
+
+    def state(self):
+        """(count, kept messages), e.g. to carry staging errors into the import result."""
+        return self.count, list(self.messages)
+
+    def restore(self, count, messages):
+        self.count = count
+        self.messages = list(messages)[:self.limit]
+
+    def summary(self, shown=10):
+        text = "\n".join(self.messages[:shown])
+        if self.count > shown:
+            text += f"\n...and {self.count - shown} more errors."
+        return text
+
+
+def _in_chunks(values):
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[start:start + IN_CHUNK_SIZE]
+
+
+# --- Chunked Commits --- #
+
+COMMIT_CHUNKED = 'chunked'
+COMMIT_ATOMIC = 'atomic'
+COMMIT_MODES = (COMMIT_CHUNKED, COMMIT_ATOMIC)
+
+
+class ChunkedCommit:
+    """
+    Commit-per-chunk mode of one import. The rows of each chunk are written
+    and committed in a short transaction of their own, so other users' saves
+    wait for one chunk at most instead of the whole file. With a `key` (the
+    staged session token), the same transaction saves an ImportCheckpoint:
+    the last row done and the importer's counters.
+
+    An import that stops part-way (error, cancel, worker gone) keeps the
+    committed chunks. Run again with the same key, it skips the rows up to the
+    checkpoint and continues with the saved counters. Running it again from
+    the start would be harmless too (imported owners and patients are skipped
+    as duplicates); the checkpoint saves the work and keeps the counts right.
+    """
+
+    def __init__(self, kind, key=None):
+        self.kind = kind
+        self.key = key
+        self.resume_row = 1    # Rows up to here were committed by an earlier run (1: none)
+        self.committed_row = 1 # Rows up to here are committed, by this run or an earlier one
+        self._resume_counts = {}
+        if key:
+            checkpoint = ImportCheckpoint.objects.filter(key=key, kind=kind).first()
+            if checkpoint:
+                self.resume_row = self.committed_row = checkpoint.row
+                self._resume_counts = checkpoint.counts
+
+    def resume(self, importer):
+        """Give a new importer the counters of the committed chunks."""
+        for name, value in self._resume_counts.items():
+            setattr(importer, name, value)
+
+    @contextmanager
+    def commit(self, importer, last_row):
+        """
+        Context of one chunk: the rows handed to `importer` inside it (up to CSV
+        row `last_row`) are flushed and committed together with the checkpoint.
+        """
+        # durable: a chunk must really commit, not become a savepoint of an outer transaction
+        with transaction.atomic(durable=True):
+            yield
+            importer.flush()
+            if self.key:
+                ImportCheckpoint.objects.update_or_create(key=self.key, defaults={
+                    'kind': self.kind,
+                    'row': last_row,
+                    'counts': {name: getattr(importer, name) for name in importer.COUNTERS},
+                })
+        self.committed_row = last_row
+        if settings.IMPORT_CHUNK_PAUSE:
+            # SQLite has no queue for its lock: waiting writers poll, so leave them a moment to get it
+            time.sleep(settings.IMPORT_CHUNK_PAUSE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.key:
+            # Completed: nothing to resume
+            ImportCheckpoint.objects.filter(key=self.key).delete()
+        return False
+
+    def stopped_note(self):
+        """The end of the message for an import that stopped: what was kept."""
+        if self.committed_row <= 1:
+            return 'No changes were saved.'
+        note = f'Rows up to row {self.committed_row} were imported and kept.'
+        if self.key:
+            note += ' Run the import again to continue from there.'
+        return note
+
+
+def import_transaction(chunks):
+    """
+    Context for running a whole import: one transaction (all or nothing) if
+    `chunks` is None, else the ChunkedCommit, whose chunks commit themselves.
+    """
+    return transaction.atomic() if chunks is None else chunks
+
+
+def stopped_note(chunks):
+    """The end of the message for an import that stopped (see ChunkedCommit.stopped_note)."""
+    return 'No changes were saved.' if chunks is None else chunks.stopped_note()
+
+
+def _committing(importer, last_row):
+    # A chunk's transaction in chunked mode (not for rows committed by an earlier run)
+    chunks = importer.chunks
+    if chunks is None or last_row <= chunks.resume_row:
+        return nullcontext()
+    return chunks.commit(importer, last_row)
+
+
+def run_rows(importer, rows):
+    """Import an iterable of CSV dict rows (row numbers start at 2, after the header)."""
+    resume_row = importer.chunks.resume_row if importer.chunks else 1
+    for row_nums, columns in column_batches(rows, importer.COLUMNS, importer.batch_size):
+        # Rows committed by an earlier run are validated again (for the errors) but not imported
+        results = parse_batch(importer, row_nums, columns)
+        with _committing(importer, row_nums[-1]):
+            for row_num, parsed in zip(row_nums, results):
+                if parsed is not None and row_num > resume_row:
+                    importer.add(parsed)
+        importer.rows_read = row_nums[-1] - 1
+        if importer.progress is not None and importer.rows_read % importer.batch_size == 0:
+            importer.progress(importer)
+    importer.flush()
+
+
+def run_staged_rows(importer, rows):
+    """Import the (row_num, parsed row) pairs of a staged session, in chunks of batch_size rows."""
+    resume_row = importer.chunks.resume_row if importer.chunks else 1
+    chunk = []
+    for row_num, parsed in rows:
+        if row_num > resume_row:
+            chunk.append(parsed)
+        importer.rows_read = row_num - 1
+        if len(chunk) >= importer.batch_size:
+            with _committing(importer, row_num):
+                for parsed in chunk:
+                    importer.add(parsed)
+            chunk = []
+        if importer.progress is not None and importer.rows_read % importer.batch_size == 0:
+            importer.progress(importer)
+    with _committing(importer, importer.rows_read + 1):
+        for parsed in chunk:
+            importer.add(parsed)
+    importer.flush()
+
+
+# --- Column Batches --- #
+
+INTACT_VALUES = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+SEX_VALUES = frozenset(('M', 'F', 'U')) # Assuming U for Unknown/Unspecified
+
+
+def column_batches(rows, names, size):
+    """
+    (row numbers, {name: values}) for consecutive batches of `size` CSV dict
+    rows (row numbers start at 2, after the header), transposed to the
+    columns `names`; a missing column is a list of None.
+    """
+    batch = []
+    row_num = 1
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield list(range(row_num + 1, row_num + 1 + len(batch))), {name: [r.get(name) for r in batch] for name in names}
+            row_num += len(batch)
+            batch = []
+    if batch:
+        yield list(range(row_num + 1, row_num + 1 + len(batch))), {name: [r.get(name) for r in batch] for name in names}
+
+
+def cell_columns(rows, header_map, names):
+    """{name: values} of CSV cell lists (as from csv.reader) with the header positions `header_map`."""
+    columns = {}
+    for name in names:
+        index = header_map.get(name)
+        if index is None:
+            columns[name] = [None] * len(rows)
+        else:
+            # Short rows miss trailing cells, like dict(zip(headers, cells))
+            columns[name] = [cells[index] if index < len(cells) else None for cells in rows]
+    return columns
+
+
+def _stripped(columns, name, length):
+    values = columns.get(name)
+    if values is None:
+        return [''] * length
+    return [(value or '').strip() for value in values]
+
+
+def _first_failures(checks):
+    """Per row, 1 + the index of the first check (list of booleans, True = failed) it fails, or 0."""
+    if numpy is not None:
+        # bytes() of a bool list is one C loop; frombuffer doesn't copy (numpy.array(list) is slower than no NumPy)
+        return numpy.select([numpy.frombuffer(bytes(check), dtype=numpy.bool_) for check in checks],
+                            range(1, len(checks) + 1), 0).tolist()
+    return [failed.index(True) + 1 if True in failed else 0 for failed in zip(*checks)]
+
+
+def _float_or_none(text):
+    # float() like the row parser (also "1e3", "nan"); negative values are invalid
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return None if value < 0 else value
+
+
+def parse_batch(importer, row_nums, columns):
+    """
+    importer.parse_columns(), falling back to row-by-row parsing (which
+    reports the failing row as an unexpected error) if the batch fails.
+    """
+    try:
+        return importer.parse_columns(row_nums, columns)
+    except Exception as e:
+        print(f"Column batch validation failed ({e}); validating rows {row_nums[0]}-{row_nums[-1]} one by one")
+    parse = importer.parse_owner if isinstance(importer, OwnerImporter) else importer.parse_row
+    results = []
+    for i, row_num in enumerate(row_nums):
+        try:
+            results.append(parse(row_num, {name: values[i] for name, values in columns.items()}))
+        except Exception as e:
+            # Catch unexpected errors during row processing
+            importer.errors.add(f"Row {row_num}: Unexpected error processing row: {e}")
+            results.append(None)
+    return results
+
+
+# --- Writing --- #
+
+def insert_rows(model, fields, rows, ignore_conflicts=False):
+    """
+    Insert `rows` (tuples of Python values, one per name in `fields`) into
+    `model`'s table and return the new primary keys in order. Like bulk_create,
+    no signals are sent.
+
+    With ignore_conflicts, rows that violate a unique constraint (duplicates
+    of existing rows or of earlier rows) are skipped, and only the keys of the
+    inserted rows are returned.
+    """
+    if not rows:
+        return []
+    if connection.vendor != 'sqlite' or not connection.in_atomic_block:
+        objs = [model(**dict(zip(fields, row))) for row in rows]
+        if not ignore_conflicts:
+            model.objects.bulk_create(objs)
+            return [obj.pk for obj in objs]
+        # No keys are returned for ignored conflicts: new rows are the ones above the previous maximum
+        # (exact on SQLite, which has a single writer; on other databases concurrent inserts may show up)
+        with transaction.atomic():
+            last_pk = model.objects.aggregate(last=models.Max('pk'))['last'] or 0
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+            return list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+
+    model_fields = [model._meta.get_field(name) for name in fields]
+    # Only these need converting for the driver; consecutive equal values are converted once
+    converted = [
+        (i, field) for i, field in enumerate(model_fields)
+        if isinstance(field, (models.DateField, models.DecimalField))  # DateTimeField is a DateField
+    ]
+    if converted:
+        db = connections[DEFAULT_DB_ALIAS]  # The wrapper itself: `connection` is a proxy, slow per value
+        memo = {}
+        prepared = []
+        for row in rows:
+            row = list(row)
+            for i, field in converted:
+                value = row[i]
+                last = memo.get(i)
+                if last is not None and last[0] is value:
+                    row[i] = last[1]
+                else:
+                    row[i] = field.get_db_prep_save(value, db)
+                    memo[i] = (value, row[i])
+            prepared.append(row)
+        rows = prepared
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in model_fields)
+    marks = ', '.join(['%s'] * len(fields))
+    pk_column = connection.ops.quote_name(model._meta.pk.column)
+    on_conflict = ' ON CONFLICT DO NOTHING' if ignore_conflicts else ''
+    with connection.cursor() as cursor:
+        if ignore_conflicts:
+            cursor.execute(f"SELECT MAX({pk_column}) FROM {table}")
+            first_pk = (cursor.fetchone()[0] or 0) + 1
+        cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({marks}){on_conflict}", rows)
+        inserted = cursor.rowcount
+        if ignore_conflicts and inserted != len(rows):
+            # Skipped rows still use up AUTOINCREMENT values: read the new keys back
+            cursor.execute(f"SELECT {pk_column} FROM {table} WHERE {pk_column} >= %s ORDER BY {pk_column}", [first_pk])
+            return [pk for pk, in cursor.fetchall()]
+        # AUTOINCREMENT keys are consecutive while this transaction holds the write lock
+        cursor.execute(f"SELECT MAX({pk_column}) FROM {table}")
+        last_pk = cursor.fetchone()[0]
+    return list(range(last_pk - inserted + 1, last_pk + 1))
+
+
+# --- Owner Import --- #
+
+class OwnerImporter:
+    """Validate owner CSV rows and bulk-insert them in batches; the unique identity key skips duplicates."""
+
+    EXTRA_FIELDS = ('telephone', 'address', 'comments')
+    # Saved with each chunk's checkpoint (see ChunkedCommit)
+    COUNTERS = ('created_count', 'skipped_duplicates')
+    # CSV columns read by parse_owner / parse_columns
+    COLUMNS = ('last_name', 'first_name', 'email', *EXTRA_FIELDS, 'created_at')
+    # Column order of the rows inserted by flush()
+    FIELDS = ('identity_key', 'last_name', 'first_name', 'email', 'telephone', 'address', 'comments',
+              'created_at', 'updated_at')
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, progress=None, spool=None, chunks=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.rows_read = 0
+        self.created_count = 0
+        self.skipped_duplicates = 0
+        self.errors = ErrorLog(spool=spool)
+        self.chunks = chunks # ChunkedCommit, or None: the caller's transaction covers the whole import
+        if chunks is not None:
+            chunks.resume(self)
+        self._batch = []
+        self._now = timezone.now()
+
+    @staticmethod
+    def missing_headers_error(headers):
+        """Error message if `headers` can't be imported, else None."""
+        if 'last_name' not in headers:
+            return 'Missing required column: last_name'
+        return None
+
+    def run(self, rows):
+        """Import an iterable of CSV dict rows (row numbers start at 2, after the header)."""
+        run_rows(self, rows)
+
+    def run_staged(self, rows):
+        """Import (row_num, parse_owner() result) pairs of a staged session."""
+        run_staged_rows(self, rows)
+
+    def result(self):
+        """JSON response data for the finished import (success is False if any row failed)."""
+        response_message = f"Import finished. Imported: {self.created_count} new owners."
+        if self.skipped_duplicates > 0:
+            response_message += f" Skipped: {self.skipped_duplicates} duplicate owners."
+        if self.chunks is not None and self.chunks.resume_row > 1:
+            response_message += f" Resumed after row {self.chunks.resume_row}."
+        counts = {'imported_count': self.created_count, 'skipped_count': self.skipped_duplicates}
+        if self.errors:
+            # success=False if there were validation errors, even if some were imported
+            return {'success': False, 'error': f'{response_message}\n\nErrors found:\n{self.errors.summary()}', **counts}
+        return {'success': True, 'message': response_message, **counts}
+
+    def parse_owner(self, row_num, row):
+        """
+        Validated owner values (last_name, first_name, email, telephone, address,
+        comments, created_at or None) for one row, or None if the row is invalid.
+        No queries: duplicates are skipped when inserted.
+        """
+        ln = (row.get('last_name') or '').strip()
+        fn = (row.get('first_name') or '').strip()
+        em = (row.get('email') or '').strip()
+
+        # Required field check
+        if not ln:
+            self.errors.add(f"Row {row_num}: Missing required value for last_name.")
+            return None
+
+        # Blank optional values are stored as NULL
+        telephone, address, comments = ((row.get(header) or '').strip() or None for header in self.EXTRA_FIELDS)
+
+        # Comments handling
+        comments = with_import_comment(comments, IMPORT_COMMENT)
+
+        # created_at handling
+        created_at_str = (row.get('created_at') or '').strip()
+        parsed_created_at = None
+        if created_at_str:
+            parsed_created_at = self._parse_created_at(created_at_str)
+            if parsed_created_at is None:
+                self.errors.add(f"Row {row_num}: Invalid format for created_at '{created_at_str}'. Expected YYYY-MM-DD HH:MM:SS.")
+                return None
+
+        return (ln, fn or None, em or None, telephone, address, comments, parsed_created_at)
+
+    def _parse_created_at(self, text):
+        """created_at cell as a datetime (aware if USE_TZ), or None if it isn't YYYY-MM-DD HH:MM:SS."""
+        try:
+            parsed = datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+        if timezone.is_aware(self._now):
+            parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+        return parsed
+
+    def parse_columns(self, row_nums, columns):
+        """
+        parse_owner() for a batch of rows given as columns ({name: values}, see
+        column_batches): same results and error messages, in row order.
+        """
+        n = len(row_nums)
+        last_names, first_names, emails, telephones, addresses, comments, created = (
+            _stripped(columns, name, n) for name in self.COLUMNS)
+        # Each distinct timestamp is parsed once
+        created_at = {text: self._parse_created_at(text) for text in set(created) if text}
+        failures = _first_failures([
+            [not ln for ln in last_names],
+            [bool(text) and created_at[text] is None for text in created],
+        ])
+
+        results = []
+        messages = []
+        for failure, row_num, ln, fn, em, telephone, address, comment, text in zip(
+                failures, row_nums, last_names, first_names, emails, telephones, addresses, comments, created):
+            if failure == 0:
+                results.append((ln, fn or None, em or None, telephone or None, address or None,
+                                with_import_comment(comment, IMPORT_COMMENT), created_at.get(text)))
+                continue
+            results.append(None)
+            if failure == 1:
+                messages.append(f"Row {row_num}: Missing required value for last_name.")
+            else:
+                messages.append(f"Row {row_num}: Invalid format for created_at '{text}'. Expected YYYY-MM-DD HH:MM:SS.")
+        for message in messages:
+            self.errors.add(message)
+        return results
+
+    def add(self, parsed):
+        """Queue a parse_owner() result."""
+        ln, fn, em, telephone, address, comments, created_at = parsed
+        self._batch.append((owner_key(ln, fn, em), ln, fn, em, telephone, address, comments, created_at))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued owners; duplicates of existing owners or earlier rows are skipped by the identity key."""
+        if not self._batch:
+            return
+        # updated_at is when the row is written (inside the chunk's transaction), not the file's
+        # created_at: the changes feed (main/changes.py) reads rows in updated_at order
+        now = timezone.now()
+        rows = [(*row[:-1], row[-1] or now, now) for row in self._batch]
+        pks = insert_rows(Owner, self.FIELDS, rows, ignore_conflicts=True)
+        # No post_save for bulk inserts, so update the indexes/counters explicitly
+        notify_rows_changed(Owner, pks, 'created')
+        self.created_count += len(pks)
+        self.skipped_duplicates += len(self._batch) - len(pks)
+        self._batch = []
+
+
+# --- Patient Import --- #
+
+# One validated CSV row of the patient import
+PatientRow = namedtuple('PatientRow', [
+    'row_num', 'owner_key', 'last_name', 'first_name', 'email', 'telephone', 'address', 'owner_comments',
+    'name', 'species_id', 'species_code', 'breed_name', 'sex', 'intact', 'date_of_birth', 'weight',
+])
+
+# Existing owner as loaded by the resolver (mutable: updates are applied in place)
+class _OwnerState:
+    __slots__ = ('pk', 'telephone', 'address', 'comments')
+
+    def __init__(self, pk, telephone, address, comments):
+        self.pk, self.telephone, self.address, self.comments = pk, telephone, address, comments
+
+
+class PatientImporter:
+    """
+    Patient CSV import with set-based resolution: rows are validated one by
+    one, then each chunk of IMPORT_BATCH_SIZE valid rows is resolved with a
+    few queries (existing owners, missing breeds) and inserted, skipping
+    existing patients by their unique key.
+    """
+
+    REQUIRED_HEADERS = {'last_name', 'patient_name', 'species_code', 'breed_name', 'sex', 'intact', 'weight_kg'}
+    # CSV columns read by parse_row / parse_columns
+    COLUMNS = ('last_name', 'first_name', 'email', 'telephone', 'address', 'owner_comments', 'patient_name',
+               'species_code', 'breed_name', 'sex', 'intact', 'date_of_birth', 'age_years', 'weight_kg')
+    # Saved with each chunk's checkpoint (see ChunkedCommit)
+    COUNTERS = ('created_owners', 'updated_owners', 'created_patients', 'skipped_patients')
+    OWNER_FIELDS = ('identity_key', 'last_name', 'first_name', 'email', 'telephone', 'address', 'comments',
+                    'created_at', 'updated_at')
+    PATIENT_FIELDS = ('owner_id', 'name', 'name_key', 'species_id', 'breed_id', 'sex', 'intact', 'date_of_birth',
+                      'weight', 'created_at', 'updated_at')
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, progress=None, snapshot=None, spool=None, chunks=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.rows_read = 0
+        self.created_owners = 0
+        self.updated_owners = 0
+        self.created_patients = 0
+        self.skipped_patients = 0
+        self.errors = ErrorLog(spool=spool)
+        self.chunks = chunks # ChunkedCommit, or None: the caller's transaction covers the whole import
+        if chunks is not None:
+            chunks.resume(self)
+        # Given by staging's validation workers, which don't use the database
+        self.snapshot = snapshot or reference.get_snapshot()
+        self._today = timezone.localdate()
+        self._now = timezone.now()
+        self._owners = {}        # owner key -> owner id (resolved or created in this import)
+        self._breeds = {}        # (species code, name key) -> breed id found/created in this import
+        self._chunk = []
+
+    @classmethod
+    def missing_headers_error(cls, headers):
+        """Error message if `headers` can't be imported, else None."""
+        headers = set(headers)
+        if not cls.REQUIRED_HEADERS.issubset(headers):
+            missing = cls.REQUIRED_HEADERS - headers
+            return f'Execution failed: Missing required columns: {", ".join(missing)}.'
+        if not ('date_of_birth' in headers or 'age_years' in headers):
+            return 'Execution failed: Missing required column (date_of_birth or age_years).'
+        return None
+
+    def run(self, rows):
+        """Import an iterable of CSV dict rows (row numbers start at 2, after the header)."""
+        run_rows(self, rows)
+
+    def run_staged(self, rows):
+        """Import (row_num, PatientRow) pairs of a staged session."""
+        run_staged_rows(self, rows)
+
+    def add(self, parsed):
+        """Queue a parse_row() result; full chunks are resolved and inserted."""
+        self._chunk.append(parsed)
+        if len(self._chunk) >= self.batch_size:
+            self.resolve_chunk()
+
+    def flush(self):
+        """Resolve and insert the queued rows."""
+        self.resolve_chunk()
+
+    def result(self):
+        """JSON response data for the finished import (success is False if any row failed)."""
+        response_message = f"Import finished. Created: {self.created_patients} patients."
+        if self.created_owners > 0:
+            response_message += f" Created {self.created_owners} new owners."
+        if self.updated_owners > 0:
+             response_message += f" Updated {self.updated_owners} existing owners."
+        if self.skipped_patients > 0:
+            response_message += f" Skipped: {self.skipped_patients} duplicate/existing patients."
+        if self.chunks is not None and self.chunks.resume_row > 1:
+            response_message += f" Resumed after row {self.chunks.resume_row}."
+        counts = {
+            'created_patients': self.created_patients,
+            'created_owners': self.created_owners,
+            'updated_owners': self.updated_owners,
+            'skipped_patients': self.skipped_patients,
+        }
+        if self.errors:
+            error_summary = self.errors.summary(shown=20) # Show more errors for patient import
+            # Consider success=False if *any* errors occurred, even if some imports succeeded.
+            return {'success': False, 'error': f'{response_message}\n\nErrors/Warnings found:\n{error_summary}', **counts}
+        return {'success': True, 'message': response_message, **counts}
+
+    # --- Row validation (no queries) --- #
+
+    def parse_row(self, row_num, row):
+        """PatientRow for a valid row, or None (the error is recorded)."""
+        def value(name):
+            return (row.get(name) or '').strip()
+
+        # --- 1. Owner Data ---
+        owner_ln, owner_fn, owner_em = value('last_name'), value('first_name'), value('email')
+        if not owner_ln:
+            self.errors.add(f"Row {row_num}: Missing required owner field: last_name.")
+            return None
+
+        # --- 2. Patient Data ---
+        patient_name = value('patient_name')
+        species_code = value('species_code').upper()
+        breed_name = value('breed_name')
+        sex = value('sex').upper()
+        intact_str = value('intact').lower()
+        dob_str = value('date_of_birth')
+        age_str = value('age_years')
+        weight_str = value('weight_kg')
+
+        # Required patient fields check
+        if not all([patient_name, species_code, breed_name, sex, intact_str, weight_str]):
+            self.errors.add(f"Row {row_num}: Missing required patient field(s) (name, species, breed, sex, intact, weight).")
+            return None
+        if not dob_str and not age_str:
+            self.errors.add(f"Row {row_num}: Missing required patient field (date_of_birth or age_years).")
+            return None
+
+        # Species
+        species = self.snapshot.species(species_code)
+        if not species:
+            self.errors.add(f"Row {row_num}: Species code '{species_code}' not found in database.")
+            return None
+
+        # Sex
+        if sex not in SEX_VALUES:
+            self.errors.add(f"Row {row_num}: Invalid value for sex '{sex}'. Use M, F, or U.")
+            return None
+
+        # Intact (Handle variations: true/false, yes/no, 1/0)
+        intact = INTACT_VALUES.get(intact_str)
+        if intact is None:
+            self.errors.add(f"Row {row_num}: Invalid value for intact '{intact_str}'. Use true/false, yes/no, or 1/0.")
+            return None
+
+        # Weight
+        weight_kg = _float_or_none(weight_str)
+        if weight_kg is None:
+            self.errors.add(f"Row {row_num}: Invalid numeric value for weight_kg '{weight_str}'.")
+            return None
+
+        # Date of Birth / Age (age is the fallback for a missing or invalid date)
+        dob = self._birth_date(dob_str, age_str)
+        if isinstance(dob, str):
+            self.errors.add(f"Row {row_num}: {dob}")
+            return None
+
+        return PatientRow(
+            row_num, owner_key(owner_ln, owner_fn, owner_em), owner_ln, owner_fn, owner_em,
+            value('telephone'), value('address'), value('owner_comments'),
+            patient_name, species.pk, species_code, breed_name, sex, intact, dob, weight_kg,
+        )
+
+    def _birth_date(self, dob_str, age_str):
+        """Date of birth from the date_of_birth / age_years cells, or the error message (without the row number)."""
+        if dob_str:
+            try:
+                return datetime.strptime(dob_str, '%Y-%m-%d').date()
+            except ValueError:
+                if not age_str:
+                    return f"Invalid format for date_of_birth '{dob_str}'. Expected YYYY-MM-DD."
+        try:
+            age_years = float(age_str)
+            if age_years < 0: raise ValueError("Age cannot be negative")
+            return self._today - timezone.timedelta(days=age_years * 365.25)
+        except ValueError:
+            if dob_str:
+                return f"Invalid date_of_birth '{dob_str}' AND invalid numeric age_years '{age_str}'."
+            return f"Invalid numeric value for age_years '{age_str}'."
+        except OverflowError as e: # Absurd ages
+            return f"Unexpected error processing row: {e}"
+
+    def parse_columns(self, row_nums, columns):
+        """
+        parse_row() for a batch of rows given as columns ({name: values}, see
+        column_batches): same results and error messages, in row order.
+        """
+        n = len(row_nums)
+        (last_names, first_names, emails, telephones, addresses, owner_comments, names,
+         species_codes, breed_names, sexes, intacts, dobs, ages, weights) = (
+            _stripped(columns, name, n) for name in self.COLUMNS)
+        species_codes = [code.upper() for code in species_codes]
+        sexes = [sex.upper() for sex in sexes]
+        intacts = [intact.lower() for intact in intacts]
+
+        # Lookup tables: each distinct value is parsed once per batch
+        species_ids = {}
+        for code in set(species_codes):
+            species = self.snapshot.species(code)
+            species_ids[code] = species.pk if species else None
+        weight_values = {text: _float_or_none(text) for text in set(weights)}
+        birth_dates = {pair: self._birth_date(*pair) for pair in set(zip(dobs, ages))}
+
+        # Same checks, in the same order, as parse_row
+        failures = _first_failures([
+            [not ln for ln in last_names],
+            [not (name and code and breed and sex and intact and weight) for name, code, breed, sex, intact, weight
+             in zip(names, species_codes, breed_names, sexes, intacts, weights)],
+            [not dob and not age for dob, age in zip(dobs, ages)],
+            [species_ids[code] is None for code in species_codes],
+            [sex not in SEX_VALUES for sex in sexes],
+            [intact not in INTACT_VALUES for intact in intacts],
+            [weight_values[weight] is None for weight in weights],
+            [isinstance(birth_dates[pair], str) for pair in zip(dobs, ages)],
+        ])
+
+        results = []
+        messages = []
+        for i, failure in enumerate(failures):
+            if failure == 0:
+                code = species_codes[i]
+                results.append(PatientRow(
+                    row_nums[i], owner_key(last_names[i], first_names[i], emails[i]), last_names[i], first_names[i],
+                    emails[i], telephones[i], addresses[i], owner_comments[i], names[i], species_ids[code], code,
+                    breed_names[i], sexes[i], INTACT_VALUES[intacts[i]], birth_dates[dobs[i], ages[i]],
+                    weight_values[weights[i]],
+                ))
+                continue
+            results.append(None)
+            row_num = row_nums[i]
+            if failure == 1:
+                messages.append(f"Row {row_num}: Missing required owner field: last_name.")
+            elif failure == 2:
+                messages.append(f"Row {row_num}: Missing required patient field(s) (name, species, breed, sex, intact, weight).")
+            elif failure == 3:
+                messages.append(f"Row {row_num}: Missing required patient field (date_of_birth or age_years).")
+            elif failure == 4:
+                messages.append(f"Row {row_num}: Species code '{species_codes[i]}' not found in database.")
+            elif failure == 5:
+                messages.append(f"Row {row_num}: Invalid value for sex '{sexes[i]}'. Use M, F, or U.")
+            elif failure == 6:
+                messages.append(f"Row {row_num}: Invalid value for intact '{intacts[i]}'. Use true/false, yes/no, or 1/0.")
+            elif failure == 7:
+                messages.append(f"Row {row_num}: Invalid numeric value for weight_kg '{weights[i]}'.")
+            else:
+                messages.append(f"Row {row_num}: {birth_dates[dobs[i], ages[i]]}")
+        for message in messages:
+            self.errors.add(message)
+        return results
+
+    # --- Chunk resolution (set-based queries) --- #
+
+    def resolve_chunk(self):
+        rows, self._chunk = self._chunk, []
+        if not rows:
+            return
+        self._now = timezone.now() # Rows are stamped when their chunk is written (see OwnerImporter.flush)
+        self._resolve_owners(rows)
+        breed_ids = self._resolve_breeds(rows)
+        self._create_patients(rows, breed_ids)
+
+    def _resolve_owners(self, rows):
+        """Map every row to an owner id (existing, updated or new)."""
+        unseen = {}
+        for row in rows:
+            if row.owner_key not in self._owners:
+                unseen.setdefault(row.owner_key, row)
+
+        # Existing owners: by the unique identity key
+        found = {}
+        for chunk in _in_chunks(unseen):
+            for pk, key, telephone, address, comments in Owner.objects.filter(identity_key__in=chunk).values_list(
+                    'pk', 'identity_key', 'telephone', 'address', 'comments'):
+                found[key] = _OwnerState(pk, telephone, address, comments or '')
+
+        updated = []
+        new_owners = []
+        for key, row in unseen.items():
+            owner = found.get(key)
+            if owner is not None:
+                self._owners[key] = owner.pk
+                if self._apply_owner_update(owner, row):
+                    updated.append(owner)
+            else:
+                new_owners.append(row)
+
+        # New owners, in file order
+        if new_owners:
+            owner_rows = [
+                (row.owner_key, row.last_name, row.first_name or None, row.email or None, row.telephone or None,
+                 row.address or None, with_import_comment(row.owner_comments, PATIENT_IMPORT_COMMENT),
+                 self._now, self._now)
+                for row in new_owners
+            ]
+            pks = insert_rows(Owner, self.OWNER_FIELDS, owner_rows, ignore_conflicts=True)
+            if len(pks) == len(new_owners):
+                for row, pk in zip(new_owners, pks):
+                    self._owners[row.owner_key] = pk
+            else:
+                # Some were created by someone else since the lookup (chunked imports): use theirs
+                for chunk in _in_chunks([row.owner_key for row in new_owners]):
+                    self._owners.update(Owner.objects.filter(identity_key__in=chunk).values_list('identity_key', 'pk'))
+            notify_rows_changed(Owner, pks, 'created')
+            self.created_owners += len(pks)
+
+        # Updates of existing owners, one bulk_update per chunk (no re-fetch)
+        if updated:
+            Owner.objects.bulk_update(
+                [Owner(pk=o.pk, telephone=o.telephone, address=o.address, comments=o.comments, updated_at=self._now)
+                 for o in updated],
+                ['telephone', 'address', 'comments', 'updated_at'], batch_size=IN_CHUNK_SIZE)
+            notify_rows_changed(Owner, [o.pk for o in updated], 'updated')
+            self.updated_owners += len(updated)
+
+    @staticmethod
+    def _apply_owner_update(owner, row):
+        """Apply the row's owner details to an existing owner; True if anything changed."""
+        changed = False
+        if row.telephone and owner.telephone != row.telephone:
+            owner.telephone = row.telephone
+            changed = True
+        if row.address and owner.address != row.address:
+            owner.address = row.address
+            changed = True
+        # Append the import comment (and the file's owner comments) once
+        if PATIENT_IMPORT_COMMENT not in owner.comments:
+            owner.comments = f"{owner.comments}\n{PATIENT_IMPORT_COMMENT}\n{row.owner_comments}".strip()
+            changed = True
+        return changed
+
+    def _resolve_breeds(self, rows):
+        """(species code, breed name key) -> breed id for the chunk, creating missing breeds."""
+        breed_ids = {}
+        missing = {}
+        for row in rows:
+            key = (row.species_code, name_key(row.breed_name))
+            if key in breed_ids or key in missing:
+                continue
+            pk = self._breeds.get(key)
+            if pk is None:
+                breed = self.snapshot.breed_by_name(row.species_code, row.breed_name)
+                pk = breed.pk if breed else None
+            if pk is None:
+                missing[key] = row
+            else:
+                breed_ids[key] = pk
+
+        if missing:
+            # Insert the missing ones; breeds created since the snapshot was taken are skipped by the
+            # unique (species, name key), then every id is read back
+            pks = insert_rows(Breed, ('species_id', 'name', 'name_key'),
+                              [(row.species_id, row.breed_name, name) for (_, name), row in missing.items()],
+                              ignore_conflicts=True)
+            if pks:
+                # Bumps the reference version (species/breed caches) and the Breed counter
+                notify_rows_changed(Breed, pks, 'created')
+            species_codes = {row.species_id: row.species_code for row in missing.values()}
+            for chunk in _in_chunks({name for _, name in missing}):
+                found = Breed.objects.filter(species_id__in=species_codes, name_key__in=chunk).values_list(
+                    'pk', 'species_id', 'name_key')
+                for pk, species_id, name in found:
+                    key = (species_codes[species_id], name)
+                    if key in missing:
+                        breed_ids[key] = pk
+
+        self._breeds.update(breed_ids)
+        return breed_ids
+
+    def _create_patients(self, rows, breed_ids):
+        # Existing patients and repeats within the file are skipped by the unique
+        # (owner, name key, species, breed, date of birth)
+        patient_rows = [
+            (self._owners[row.owner_key], row.name, name_key(row.name), row.species_id,
+             breed_ids[(row.species_code, name_key(row.breed_name))], row.sex, row.intact, row.date_of_birth,
+             row.weight, self._now, self._now)
+            for row in rows
+        ]
+        if patient_rows:
+            pks = insert_rows(Patient, self.PATIENT_FIELDS, patient_rows, ignore_conflicts=True)
+            notify_rows_changed(Patient, pks, 'created')
+            self.created_patients += len(pks)
+            self.skipped_patients += len(patient_rows) - len(pks)
+
+
+# Importer per ImportJob/staged session kind
+IMPORTERS = {
+    'owners': OwnerImporter,
+    'patients': PatientImporter,
+}
@@ -0,0 +1,382 @@
+"""
+Background owner/patient imports.
+
+An upload is copied to IMPORT_JOB_DIR and recorded as a queued ImportJob; the
+HTTP request returns right away. Jobs are run by a small thread pool inside
+the web process (IMPORT_WORKER_THREADS, default 1) and/or by
+`python manage.py run_import_worker` processes, which claim the oldest queued
+job with a conditional UPDATE, so each job runs exactly once.
+
+A job can also run a staged session (main/staging.py) instead of an upload:
+the rows validated by the preview step are imported without re-parsing the
+CSV, and the session is removed once the import succeeds.
+
+Each job runs the normal importer (main/importing.py), either in one
+transaction (commit_mode 'atomic', the default: a cancelled or failed job
+leaves nothing behind) or committing every chunk ('chunked', opt-in: other
+users can save between chunks, and a failed staged job can be run again from
+its checkpoint, but the chunks committed before a cancel are kept). While it runs, the import may hold SQLite's
+write lock, so nothing about the running job is written to the database until
+it finishes:
+* Progress (rows, errors, bytes read) is published as a small JSON file next
+  to the upload (atomic rename), which job_status() reads. It doubles as the
+  worker's heartbeat (see fail_stale_jobs), so it is also refreshed while a
+  staged session is being validated.
+* Cancelling drops a marker file; the importer's progress callback sees it
+  and raises ImportCancelled, which rolls the import (or the current chunk)
+  back.
+The final status, counts and result JSON are saved after the transaction.
+Row errors are spooled to an error report (main/reports.py) as they happen;
+the result links the report CSV of every failed row.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, close_old_connections, connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ImportJob
+from . import importing, reports, staging
+
+# Seconds between progress file writes
+PROGRESS_INTERVAL = 0.5
+# A running job whose progress file is older than this was abandoned by its worker
+STALE_AFTER = 10 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+# --- Job Files --- #
+
+def _job_path(name):
+    return os.path.join(settings.IMPORT_JOB_DIR, name)
+
+
+def _progress_path(job):
+    return _job_path(f'job-{job.pk}.progress.json')
+
+
+def _cancel_path(job):
+    return _job_path(f'job-{job.pk}.cancel')
+
+
+def _write_progress(job, progress):
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=settings.IMPORT_JOB_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, _progress_path(job)) # Atomic: readers never see a partial file
+    except OSError as e:
+        print(f"Import job {job.pk}: could not write progress: {e}")
+
+
+def _read_progress(job):
+    try:
+        with open(_progress_path(job)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _CountingFile:
+    """Line iterator over a binary file that counts the bytes handed out (for the ETA)."""
+
+    def __init__(self, f):
+        self._f = f
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for line in self._f:
+            self.bytes_read += len(line)
+            yield line
+
+
+# --- Creating / Cancelling --- #
+
+def create_job(kind, uploaded_file, commit_mode=importing.COMMIT_ATOMIC):
+    """Store the upload, queue an ImportJob and hand it to the local worker threads."""
+    os.makedirs(settings.IMPORT_JOB_DIR, mode=0o700, exist_ok=True)
+    path = _job_path(f'upload-{uuid.uuid4().hex}.csv')
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    try:
+        job = ImportJob.objects.create(
+            kind=kind, file_name=uploaded_file.name, file_path=path, file_size=os.path.getsize(path),
+            commit_mode=commit_mode)
+    except DatabaseError:
+        _remove(path)
+        raise
+    _submit()
+    return job
+
+
+def create_staged_job(session, commit_mode=importing.COMMIT_ATOMIC):
+    """Queue an ImportJob that imports the validated rows of a staged session."""
+    # Not validated yet (large upload): the job validates it first and then sets the rows file size
+    file_size = os.path.getsize(session.rows_path) if session.meta['validated'] else session.meta['file_size']
+    job = ImportJob.objects.create(
+        kind=session.kind, file_name=session.meta['file_name'], file_path=session.rows_path,
+        file_size=file_size, session=session.token, commit_mode=commit_mode)
+    _submit()
+    return job
+
+
+def _job_files(job):
+    # The rows file of a staged session belongs to the session (kept for a retry if the job fails)
+    uploads = () if job.session else (job.file_path,)
+    return (*uploads, _progress_path(job), _cancel_path(job))
+
+
+def request_cancel(job):
+    """Ask a queued or running job to stop; its changes are rolled back."""
+    if job.status in ImportJob.FINISHED_STATUSES:
+        return job
+    # The running worker checks this file every batch
+    open(_cancel_path(job), 'w').close()
+    if job.status == ImportJob.STATUS_QUEUED:
+        try:
+            cancelled = ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_QUEUED).update(
+                status=ImportJob.STATUS_CANCELLED, finished_at=timezone.now(),
+                result={'success': False, 'error': 'Import cancelled before it started.'})
+        except OperationalError:
+            cancelled = 0 # Database busy; the worker honours the marker when it claims the job
+        if cancelled:
+            for path in _job_files(job):
+                _remove(path)
+        job.refresh_from_db()
+    return job
+
+
+# --- Status --- #
+
+def job_status(job):
+    """JSON-ready status of a job, with live progress while it runs."""
+    rows, errors, bytes_done, elapsed = job.rows_processed, job.error_count, 0, None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+    if job.status in ImportJob.FINISHED_STATUSES:
+        bytes_done = job.file_size if job.status == ImportJob.STATUS_SUCCEEDED else 0
+    else:
+        progress = _read_progress(job)
+        if progress:
+            rows, errors, bytes_done = progress['rows'], progress['errors'], progress['bytes']
+
+    rows_per_second = rows / elapsed if elapsed and rows else None
+    eta_seconds = None
+    if job.status == ImportJob.STATUS_RUNNING and elapsed and bytes_done:
+        # Bytes, not rows: the row count of the file isn't known up front
+        eta_seconds = round(elapsed * (job.file_size - bytes_done) / bytes_done, 1)
+
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'commit_mode': job.commit_mode, # 'chunked': stopping keeps the rows imported so far
+        'file_name': job.file_name,
+        'file_size': job.file_size,
+        'bytes_processed': bytes_done,
+        'rows_processed': rows,
+        'errors': errors,
+        'rows_per_second': round(rows_per_second, 1) if rows_per_second else None,
+        'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+        'eta_seconds': eta_seconds,
+        'result': job.result,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('import-job-detail', args=[job.pk]),
+        'cancel_url': reverse('import-job-cancel', args=[job.pk]),
+    }
+
+
+# --- Running --- #
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it, or None if there is none."""
+    while True:
+        pk = ImportJob.objects.filter(status=ImportJob.STATUS_QUEUED).order_by('created_at', 'pk').values_list(
+            'pk', flat=True).first()
+        if pk is None:
+            return None
+        # Only one worker wins the UPDATE
+        if ImportJob.objects.filter(pk=pk, status=ImportJob.STATUS_QUEUED).update(
+                status=ImportJob.STATUS_RUNNING, started_at=timezone.now()):
+            return ImportJob.objects.get(pk=pk)
+
+
+def _open_source(job, stack, heartbeat):
+    """(source, reader) of a job: the staged session and None, or the counting upload file and its DictReader."""
+    if job.session:
+        session = staging.load(job.session, job.kind)
+        if not session.meta['validated']:
+            # Can take minutes on a large upload: keep the progress file fresh so the job doesn't look abandoned
+            session.validate(heartbeat=heartbeat)
+            # The ETA is measured against the rows file from here on
+            job.file_size = os.path.getsize(session.rows_path)
+            ImportJob.objects.filter(pk=job.pk).update(file_size=job.file_size)
+        return session, None
+    counting_file = _CountingFile(stack.enter_context(open(job.file_path, 'rb')))
+    reader = importing.csv_dict_reader(counting_file)
+    header_error = importing.IMPORTERS[job.kind].missing_headers_error(reader.fieldnames)
+    if header_error:
+        raise staging.StagingError(header_error)
+    return counting_file, reader
+
+
+def run_job(job):
+    """Run a claimed job to completion and record the outcome."""
+    importer = None
+    source = None # Has bytes_read: the counting upload file or the staged session
+    last_write = [0.0]
+
+    def progress(importer):
+        if os.path.exists(_cancel_path(job)):
+            raise ImportCancelled()
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            _write_progress(job, {
+                'rows': importer.rows_read, 'errors': importer.errors.count, 'bytes': source.bytes_read})
+
+    def heartbeat():
+        # Validation of a staged session, before any row is imported
+        if os.path.exists(_cancel_path(job)):
+            raise ImportCancelled()
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            _write_progress(job, {'rows': 0, 'errors': 0, 'bytes': 0})
+
+    _write_progress(job, {'rows': 0, 'errors': 0, 'bytes': 0}) # Also the worker's heartbeat
+    status = ImportJob.STATUS_FAILED
+    report = None
+    chunks = None
+    try:
+        if os.path.exists(_cancel_path(job)):
+            raise ImportCancelled()
+        # Every row error, downloadable once the job is done (see main/reports.py)
+        report = reports.create(job.file_name)
+        with ExitStack() as stack:
+            source, reader = _open_source(job, stack, heartbeat)
+            if job.commit_mode == importing.COMMIT_CHUNKED:
+                # Resumable from the checkpoint of an earlier run of the same session
+                chunks = importing.ChunkedCommit(job.kind, key=job.session or None)
+            # Created before the transaction (the patient importer takes the reference snapshot)
+            importer = importing.IMPORTERS[job.kind](progress=progress, spool=report, chunks=chunks)
+            with importing.import_transaction(chunks):
+                if reader is None:
+                    source.run(importer) # Staged session: rows validated by the preview step
+                else:
+                    importer.run(reader)
+        result = importer.result()
+        result.update(report.finish(source.csv_path if job.session else job.file_path))
+        status = ImportJob.STATUS_SUCCEEDED
+        if job.session:
+            source.discard()
+    except ImportCancelled:
+        status = ImportJob.STATUS_CANCELLED
+        result = {'success': False, 'error': f'Import cancelled. {importing.stopped_note(chunks)}'}
+    except staging.StagingError as e:
+        result = {'success': False, 'error': str(e)}
+    except UnicodeDecodeError:
+        result = {'success': False, 'error': f'File encoding error. Please ensure the file is UTF-8 encoded. {importing.stopped_note(chunks)}'}
+    except DatabaseError as db_error:
+        print(f"Import job {job.pk} database error: {db_error}")
+        result = {'success': False, 'error': f'Database error during import: {db_error}. {importing.stopped_note(chunks)}'}
+    except Exception as e:
+        print(f"Error during import job {job.pk}: {e}")
+        traceback.print_exc() # Print full traceback for debugging
+        result = {'success': False, 'error': f'An unexpected server error occurred: {e}. {importing.stopped_note(chunks)}'}
+
+    if report is not None:
+        report.close()
+    rows = importer.rows_read if importer else 0
+    errors = importer.errors.count if importer else 0
+    for attempt in range(3):
+        try:
+            # Only while still running: fail_stale_jobs() may have given up on this job meanwhile
+            saved = ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING).update(
+                status=status, result=result, rows_processed=rows, error_count=errors, finished_at=timezone.now())
+            if not saved:
+                print(f"Import job {job.pk}: already marked finished; outcome {status} not saved")
+            break
+        except OperationalError as e: # e.g. "database is locked" by another writer
+            print(f"Import job {job.pk}: could not save the outcome (attempt {attempt + 1}): {e}")
+            time.sleep(1)
+    for path in _job_files(job):
+        _remove(path)
+    print(f"Import job {job.pk} ({job.kind}) {status}: {rows} rows, {errors} row errors")
+
+
+def run_pending_jobs():
+    """Run queued jobs until there are none left."""
+    try:
+        while True:
+            job = claim_next_job()
+            if job is None:
+                return
+            run_job(job)
+    except DatabaseError as e:
+        # Pool threads have nobody to report to; the job stays queued for the next run
+        print(f"Import worker error: {e}")
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close() # Pool threads get their own connection per task
+        else:
+            close_old_connections()
+
+
+def fail_stale_jobs():
+    """Mark running jobs whose worker stopped publishing progress as failed (their transaction is gone)."""
+    cutoff = time.time() - STALE_AFTER
+    for job in ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING):
+        try:
+            alive = os.path.getmtime(_progress_path(job)) >= cutoff
+        except OSError:
+            alive = False
+        if not alive:
+            if job.commit_mode == importing.COMMIT_CHUNKED:
+                # The chunks committed before the worker stopped are kept (and the checkpoint, to resume)
+                note = 'The rows imported until then were kept.'
+                if job.session:
+                    note += ' Run the import again to continue from there.'
+            else:
+                note = 'No changes were saved.'
+            ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING).update(
+                status=ImportJob.STATUS_FAILED, finished_at=timezone.now(),
+                result={'success': False, 'error': f'The import worker stopped before the import finished. {note}'})
+            for path in _job_files(job):
+                _remove(path)
+
+
+def _submit():
+    global _executor
+    if settings.IMPORT_WORKER_THREADS <= 0:
+        return # Left to `manage.py run_import_worker`
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_WORKER_THREADS, thread_name_prefix='import-job')
+            fail_stale_jobs()
+    _executor.submit(run_pending_jobs)
@@ -0,0 +1,142 @@
+"""
+Filtering and sorting of the owner and patient list APIs.
+
+Both build their queryset from the same query parameters: `query` and
+`filter_fields` (full-text search, see main/search.py), `sort` and
+`direction`, and `owner_id` for patients. The list views and the exports
+(main/exports.py) share these functions, so an export of a list has the same
+rows in the same order as paging through it. Cases have no list API; their
+export takes `owner_id`, `patient_id` and `direction` (by case date).
+"""
+from . import search
+from .models import Owner, PatientListEntry, Case
+
+OWNER_FILTER_FIELDS = ['last_name', 'first_name', 'email', 'telephone', 'address', 'comments'] # Default fields to search
+OWNER_SORT_FIELDS = {'last_name', 'first_name', 'email', 'telephone', 'updated_at'} # Add any other sortable fields
+OWNER_DEFAULT_SORT = 'updated_at'
+
+PATIENT_FILTER_FIELDS = ['name', 'owner__last_name', 'owner__first_name', 'species__code', 'breed__name']
+PATIENT_SORT_FIELDS = {
+    'name', 'owner__last_name', 'species__code', 'breed__name',
+    'sex', 'intact', 'date_of_birth', 'updated_at',
+    # Add aliases if needed, e.g., 'owner' : 'owner__last_name'
+}
+PATIENT_DEFAULT_SORT = 'updated_at'
+# API sort names -> columns of the PatientListEntry read model
+PATIENT_READ_MODEL_SORT_FIELDS = {
+    'owner__last_name': ['owner_last_name', 'owner_first_name', 'name'], # Owner name, then patient name
+    'species__code': ['species_code'],
+    'breed__name': ['breed_name'],
+}
+
+
+def _search_params(params, allowed):
+    """(query, valid filter fields) from `params`."""
+    query = params.get('query', '').strip()
+    filter_fields = params.getlist('filter_fields') or allowed
+    # Validate filter_fields against allowed fields
+    valid_filter_fields = [f for f in filter_fields if f in allowed]
+    if not valid_filter_fields and query:
+        # Default back to all searchable fields if query present
+        valid_filter_fields = allowed
+    return query, valid_filter_fields
+
+
+def _sort_params(params, allowed, default):
+    """(sort field, '-' or '') from `params`; invalid values fall back to the default, descending."""
+    sort_field = params.get('sort', default).lower()
+    sort_direction = params.get('direction', 'desc').lower()
+    if sort_field not in allowed:
+        sort_field = default
+    if sort_direction not in ['asc', 'desc']:
+        sort_direction = 'desc'
+    return sort_field, '-' if sort_direction == 'desc' else ''
+
+
+def owners(params):
+    """
+    Owners matching the list parameters in `params` (a QueryDict), sorted.
+    Returns (queryset, ordering, search key): `ordering` is the ORDER BY list
+    (ending in pk, for keyset pagination); the search key identifies a
+    filtered list in the count cache, None if the list isn't filtered.
+    """
+    query, valid_filter_fields = _search_params(params, OWNER_FILTER_FIELDS)
+    sort_field, sort_prefix = _sort_params(params, OWNER_SORT_FIELDS, OWNER_DEFAULT_SORT)
+
+    # Get base queryset
+    owner_queryset = Owner.objects.all()
+
+    # Apply filters if query and valid fields are provided (full-text index, see main/search.py)
+    search_key = None
+    if query and valid_filter_fields:
+        owner_queryset = search.filter_owners(owner_queryset, query, valid_filter_fields)
+        search_key = {'query': query.lower(), 'fields': sorted(valid_filter_fields)}
+
+    # Add a secondary sort key (pk) for stable sorting if primary keys are equal.
+    # It follows the sort direction so a single index on sort_field (which ends in
+    # the rowid on SQLite) can serve the whole ORDER BY in both directions.
+    ordering = [f"{sort_prefix}{sort_field}", f"{sort_prefix}pk"]
+    return owner_queryset.order_by(*ordering), ordering, search_key
+
+
+def patients(params):
+    """
+    Patients (PatientListEntry rows, no joins, see main/readmodel.py) matching
+    the list parameters in `params` (a QueryDict), sorted. Returns (queryset,
+    ordering, sort columns, search key) like owners(); the sort columns are the
+    read model columns of the sort (selected too in cursor mode).
+    """
+    query, valid_filter_fields = _search_params(params, PATIENT_FILTER_FIELDS)
+    sort_field, sort_prefix = _sort_params(params, PATIENT_SORT_FIELDS, PATIENT_DEFAULT_SORT)
+
+    patient_queryset = PatientListEntry.objects.all()
+
+    is_searching = bool(query and valid_filter_fields)
+    if is_searching:
+        patient_queryset = search.filter_patients(patient_queryset, query, valid_filter_fields)
+
+    # Filter by owner if owner_id is provided (an invalid ID is ignored)
+    owner_id_int = None
+    owner_id_filter = params.get('owner_id')
+    if owner_id_filter:
+        try:
+            owner_id_int = int(owner_id_filter)
+            patient_queryset = patient_queryset.filter(owner_id=owner_id_int)
+        except ValueError:
+            pass
+
+    search_key = None
+    if is_searching or owner_id_int is not None:
+        search_key = {
+            'query': query.lower() if is_searching else '',
+            'fields': sorted(valid_filter_fields) if is_searching else [],
+            'owner_id': owner_id_int,
+        }
+
+    # Related-name sorts map to the copied columns (owner__last_name also sorts on first_name, then name);
+    # pk last for stable pagination (same direction, so the sort index covers it)
+    sort_columns = PATIENT_READ_MODEL_SORT_FIELDS.get(sort_field, [sort_field])
+    ordering = [f"{sort_prefix}{column}" for column in sort_columns] + [f"{sort_prefix}pk"]
+    return patient_queryset.order_by(*ordering), ordering, sort_columns, search_key
+
+
+def _int_param(params, name):
+    # Integer filter value, or None if missing or invalid (ignored, like owner_id above)
+    try:
+        return int(params.get(name) or '')
+    except ValueError:
+        return None
+
+
+def cases(params):
+    """Cases filtered by `owner_id` / `patient_id`, by case date (`direction`, newest first by default)."""
+    case_queryset = Case.objects.all()
+    owner_id = _int_param(params, 'owner_id')
+    if owner_id is not None:
+        case_queryset = case_queryset.filter(owner_id=owner_id)
+    patient_id = _int_param(params, 'patient_id')
+    if patient_id is not None:
+        case_queryset = case_queryset.filter(patient_id=patient_id)
+    # Same order as the default Case ordering, with pk as the tie-breaker; asc/desc flips all of it
+    sort_prefix = '' if params.get('direction', 'desc').lower() == 'asc' else '-'
+    return case_queryset.order_by(f"{sort_prefix}case_date", f"{sort_prefix}updated_at", f"{sort_prefix}pk")
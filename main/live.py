@@ -0,0 +1,215 @@
+"""
+Live change events for the list pages (Server-Sent Events, GET /api/live/).
+
+Every committed write of owners, patients or cases becomes one compact event:
+
+    {"kind": "owners", "action": "updated", "ids": [12, 15], "count": 2}
+
+`ids` is null when more than MAX_EVENT_IDS rows changed at once, e.g. an
+import chunk. Clients then reload their page instead of patching rows. Events
+are published by a rows_changed receiver (main/signals.py) after the
+transaction commits, so every write path is covered: views, the bulk
+endpoints, imports and their worker threads. The pages use an event to decide
+whether anything they show changed. If so they fetch just those rows from the
+changes feed (main/changes.py).
+
+Delivery:
+
+* `broker` fans events out to the SSE streams of this process. Publishing is
+  thread-safe: each stream has an asyncio queue on the server's event loop.
+* A stream that falls QUEUE_SIZE events behind, or reconnects with a
+  Last-Event-ID this process no longer has, gets a `resync` event and reloads.
+  Event ids are '<process boot id>-<sequence>', so a reconnect to another
+  worker process also resyncs.
+* With settings.LIVE_SOCKET_DIR set, events are also relayed between processes
+  on one host (several ASGI workers, `manage.py run_import_worker`). Each
+  process serving streams binds a Unix datagram socket in that directory, and
+  every publisher sends each event to all of them. Without it, only writes
+  made in the serving process are seen.
+
+Streams need the ASGI server (pulsar/asgi.py, e.g. `uvicorn pulsar.asgi:application`).
+Under WSGI every open stream would hold a worker thread, so the view refuses.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+
+from .changes import FEED_MODELS
+
+MAX_EVENT_IDS = 200
+QUEUE_SIZE = 256 # Events buffered per stream before it is told to resync
+REPLAY_SIZE = 1000 # Recent events kept for reconnects (Last-Event-ID)
+HEARTBEAT_SECONDS = 15 # Comment line sent on idle streams (proxies, disconnect detection)
+RETRY_MS = 3000 # Reconnect delay suggested to EventSource
+SOCKET_SEND_TIMEOUT = 0.1 # Seconds a publisher waits for a busy process's socket before dropping the event
+
+RESYNC = object() # Queue marker: the stream missed events
+
+
+# --- Per-Process Broker --- #
+
+class Subscription:
+    """One SSE stream: its queue on the server's event loop and the kinds it wants."""
+
+    def __init__(self, loop, kinds):
+        self.loop = loop
+        self.kinds = kinds
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, item):
+        # Any thread; the queue itself is only touched on its loop
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog, the client reloads instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._recent = collections.deque(maxlen=REPLAY_SIZE) # (sequence, kind, SSE message)
+        self._subscriptions = set()
+
+    def deliver(self, event):
+        """Number `event`, keep it for replays and queue it on every interested stream of this process."""
+        with self._lock:
+            sequence = next(self._sequence)
+            message = (f"id: {self.boot_id}-{sequence}\nevent: change\n"
+                       f"data: {json.dumps(event, separators=(',', ':'))}\n\n")
+            self._recent.append((sequence, event['kind'], message))
+            subscriptions = [s for s in self._subscriptions if event['kind'] in s.kinds]
+        for subscription in subscriptions:
+            try:
+                subscription.push(message)
+            except RuntimeError: # Its event loop is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, kinds, last_event_id=None):
+        """A new stream for `kinds`, on the running event loop, with the events missed since `last_event_id`."""
+        subscription = Subscription(asyncio.get_running_loop(), frozenset(kinds))
+        with self._lock:
+            if last_event_id:
+                boot_id, _, sequence = last_event_id.partition('-')
+                missed = None
+                if boot_id == self.boot_id and sequence.isdigit() and self._recent:
+                    sequence = int(sequence)
+                    if sequence >= self._recent[0][0] - 1: # Nothing dropped from the replay buffer since
+                        missed = [m for seq, kind, m in self._recent if seq > sequence and kind in kinds]
+                for message in (missed if missed is not None else [RESYNC])[-QUEUE_SIZE:]:
+                    subscription.queue.put_nowait(message)
+            self._subscriptions.add(subscription)
+        if fanout is not None:
+            fanout.listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+broker = Broker()
+
+
+# --- Cross-Process Fan-Out (optional) --- #
+
+class SocketFanout:
+    """Relays events to the other processes through Unix datagram sockets in `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{broker.boot_id}.sock")
+        self._listening = False
+        self._lock = threading.Lock()
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.settimeout(SOCKET_SEND_TIMEOUT)
+
+    def listen(self):
+        """Bind this process's socket and start receiving (first stream only; pure publishers never bind)."""
+        with self._lock:
+            if self._listening:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(self.path)
+            self._listening = True
+        threading.Thread(target=self._receive, args=(receiver,), name='live-fanout', daemon=True).start()
+
+    def _receive(self, receiver):
+        while True:
+            data = receiver.recv(65536)
+            try:
+                broker.deliver(json.loads(data))
+            except (ValueError, KeyError, TypeError):
+                print(f"Live fan-out: ignored a malformed event from {self.directory}")
+
+    def send(self, event):
+        data = json.dumps(event, separators=(',', ':')).encode()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError: # No process is serving streams yet
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.sock') or path == self.path:
+                continue
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket of a process that has exited
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError as e: # Timeout (receiver busy) or too large: its streams miss this event
+                print(f"Live fan-out: event not delivered to {name}: {e}")
+
+
+fanout = SocketFanout(settings.LIVE_SOCKET_DIR) if settings.LIVE_SOCKET_DIR else None
+
+
+# --- Publishing --- #
+
+def publish(model, ids, action):
+    """Send the event for `ids` of `model` (called after commit, see main/signals.py)."""
+    kind = FEED_MODELS.get(model)
+    if kind is None:
+        return
+    event = {'kind': kind, 'action': action, 'ids': ids if len(ids) <= MAX_EVENT_IDS else None, 'count': len(ids)}
+    broker.deliver(event)
+    if fanout is not None:
+        fanout.send(event)
+
+
+# --- SSE Stream --- #
+
+async def stream(subscription):
+    """SSE body of one subscription: events, `resync` markers and heartbeats until the client goes away."""
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is RESYNC:
+                yield "event: resync\ndata: {}\n\n"
+            else:
+                yield message
+    finally:
+        broker.unsubscribe(subscription)
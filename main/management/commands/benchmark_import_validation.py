@@ -0,0 +1,77 @@
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main import staging
+from main.models import Species
+from .benchmark_patient_import import _synthetic_csv
+
+
+def _process_counts(value):
+    try:
+        counts = sorted({int(count) for count in value.split(',')})
+    except ValueError:
+        raise CommandError("--processes must be a comma-separated list of integers, e.g. 1,2,4,8")
+    if not counts or counts[0] < 1:
+        raise CommandError("--processes values must be at least 1.")
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate a staged CSV (synthetic patients, or --file) with 1 to N "
+        "processes and report rows/s and speedup per process count. Nothing is "
+        "written to the database."
+    )
+
+    def add_arguments(self, parser):
+        cores = os.cpu_count() or 1
+        default = ','.join(str(2 ** i) for i in range(cores.bit_length()) if 2 ** i <= cores)
+        if cores & (cores - 1):
+            default += f',{cores}'
+        parser.add_argument('--rows', type=int, default=2000000, help="Rows of the synthetic patient CSV.")
+        parser.add_argument('--file', help="Validate this CSV instead of a synthetic one.")
+        parser.add_argument('--kind', choices=['owners', 'patients'], default='patients')
+        parser.add_argument('--processes', default=default, help=f"Process counts to compare (default {default}).")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        counts = _process_counts(options['processes'])
+        os.makedirs(settings.IMPORT_JOB_DIR, mode=0o700, exist_ok=True)
+        token = uuid.uuid4().hex
+        csv_path = staging._path(token, '.csv')
+        try:
+            if options['file']:
+                shutil.copyfile(options['file'], csv_path)
+            else:
+                if options['kind'] != 'patients':
+                    raise CommandError("The synthetic CSV is a patient import; use --file for owners.")
+                species_codes = list(Species.objects.values_list('code', flat=True))
+                if not species_codes:
+                    raise CommandError("Benchmark needs at least one species in the database.")
+                with open(csv_path, 'wb') as f:
+                    f.write(_synthetic_csv(options['rows'], species_codes, options['seed']))
+            size = os.path.getsize(csv_path)
+            self.stdout.write(f"{options['kind']} CSV: {size / 1e6:.1f} MB, {os.cpu_count()} cores, "
+                              f"sharded from {staging.SHARD_MIN_BYTES / 1e6:.0f} MB")
+
+            baseline = None
+            for processes in counts:
+                started = time.perf_counter()
+                meta = staging._validate(options['kind'], token, processes=processes)
+                elapsed = time.perf_counter() - started
+                rows = meta['total_records']
+                if baseline is None:
+                    baseline = (elapsed, meta)
+                elif (meta['total_records'], meta['invalid_records'], meta['errors']) != (
+                        baseline[1]['total_records'], baseline[1]['invalid_records'], baseline[1]['errors']):
+                    raise CommandError(f"{processes} processes gave a different result than {counts[0]}.")
+                self.stdout.write(
+                    f"{processes:>3} processes: {elapsed:7.2f} s  {rows / elapsed:>10,.0f} rows/s  "
+                    f"speedup {baseline[0] / elapsed:4.2f}x  ({rows} rows, {meta['invalid_records']} invalid)")
+        finally:
+            staging._discard(token)
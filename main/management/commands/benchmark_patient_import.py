@@ -0,0 +1,96 @@
+import io
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from main import importing, reference
+from main.models import Species
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def _count_queries():
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def _synthetic_csv(rows, species_codes, seed):
+    """
+    Patient CSV with a realistic mix: owners with several pets, repeat rows
+    (skipped as duplicates), ~50 breeds per species and some invalid rows.
+    """
+    rng = random.Random(seed)
+    out = io.StringIO()
+    out.write("last_name,first_name,email,telephone,address,owner_comments,"
+              "patient_name,species_code,breed_name,sex,intact,date_of_birth,age_years,weight_kg\n")
+    owners = max(rows // 3, 1)
+    for i in range(rows):
+        owner = rng.randrange(owners)
+        pet = rng.randrange(4)
+        dob = f"{2005 + pet * 4 + owner % 4}-{1 + owner % 12:02d}-{1 + pet * 7:02d}"
+        weight = f"{1 + (owner * 7 + pet) % 60}.{pet}"
+        if i % 200 == 0:
+            weight = "heavy"  # Invalid row
+        out.write(f"Bench{owner},Owner{owner % 97},owner{owner}@bench.test,555-{owner % 10000:04d},,,"
+                  f"Pet{pet},{rng.choice(species_codes)},Breed {owner % 50},{'MFU'[pet % 3]},"
+                  f"{'yes' if pet % 2 else 'no'},{dob},,{weight}\n")
+    return out.getvalue().encode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a synthetic patient CSV through PatientImporter and report the "
+        "time and database queries per row. Rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=importing.IMPORT_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help="Commit the imported rows.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        species_codes = list(Species.objects.values_list('code', flat=True))
+        if not species_codes:
+            raise CommandError("Benchmark needs at least one species in the database.")
+
+        data = _synthetic_csv(rows, species_codes, options['seed'])
+        self.stdout.write(f"{rows} rows ({len(data) / 1e6:.1f} MB), batch size {options['batch_size']}, "
+                          f"{len(species_codes)} species")
+
+        reference.get_snapshot()  # Warm: the view also takes it before the transaction
+        with _count_queries() as counter:
+            started = time.perf_counter()
+            importer = importing.PatientImporter(batch_size=options['batch_size'])
+            try:
+                with transaction.atomic():
+                    importer.run(importing.csv_dict_reader(io.BytesIO(data)))
+                    elapsed = time.perf_counter() - started
+                    if not options['keep']:
+                        raise _Rollback()
+            except _Rollback:
+                pass
+
+        queries = counter['queries']
+        self.stdout.write(
+            f"created {importer.created_patients} patients, {importer.created_owners} owners, "
+            f"updated {importer.updated_owners} owners, skipped {importer.skipped_patients}, "
+            f"{importer.errors.count} row errors")
+        self.stdout.write(
+            f"{elapsed:.2f} s ({rows / elapsed:,.0f} rows/s), {queries} queries "
+            f"({queries / rows:.4f} per row)")
+        if not options['keep']:
+            self.stdout.write("Rolled back (use --keep to commit).")
@@ -0,0 +1,87 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from main import serializers
+from main.models import Owner, Patient, PatientListEntry
+
+
+def _legacy_patient_row(patient):
+    # What PatientListAPIView did per row before main/serializers.py
+    return {
+        'id': patient.id,
+        'name': patient.name,
+        'owner_id': patient.owner.id,
+        'owner_name': f"{patient.owner.first_name or ''} {patient.owner.last_name}".strip(),
+        'species_code': patient.species.code,
+        'breed_id': patient.breed.id,
+        'breed_name': patient.breed.name,
+        'sex': patient.sex,
+        'intact': patient.intact,
+        'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
+        'weight': str(patient.weight) if patient.weight is not None else None,
+        'created_at': patient.created_at.isoformat() if patient.created_at else None,
+        'updated_at': patient.updated_at.isoformat() if patient.updated_at else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-row cost of building and encoding one list page "
+        "(fetch + serialize + JSON) with the old instance/dict path and the "
+        "values_list serializers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-page', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200, help="Pages rendered per measurement.")
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+        repeat = options['repeat']
+        if not Patient.objects.exists() or not Owner.objects.exists():
+            raise CommandError("Benchmark needs some owners and patients in the database.")
+
+        encoder = 'orjson' if serializers.orjson is not None else 'json (orjson not installed)'
+        self.stdout.write(f"per_page={per_page}, {repeat} pages per case, fast encoder: {encoder}")
+
+        def owners_before():
+            rows = list(Owner.objects.order_by('-updated_at', '-pk')[:per_page].values(
+                *serializers.OWNER_ROW.sources))
+            return json.dumps({'results': rows}, cls=DjangoJSONEncoder).encode(), len(rows)
+
+        def owners_after():
+            rows = serializers.OWNER_ROW.rows(Owner.objects.order_by('-updated_at', '-pk')[:per_page])
+            return serializers.dumps({'results': rows}), len(rows)
+
+        def patients_before():
+            queryset = Patient.objects.select_related('owner', 'species', 'breed').order_by('-updated_at', '-pk')
+            rows = [_legacy_patient_row(patient) for patient in queryset[:per_page]]
+            return json.dumps({'results': rows}, cls=DjangoJSONEncoder).encode(), len(rows)
+
+        def patients_after():
+            rows = serializers.PATIENT_ROW.rows(PatientListEntry.objects.order_by('-updated_at', '-pk')[:per_page])
+            return serializers.dumps({'results': rows}), len(rows)
+
+        for label, before, after in (('owners', owners_before, owners_after),
+                                     ('patients', patients_before, patients_after)):
+            old_body, _ = before()
+            new_body, _ = after()
+            if json.loads(old_body) != json.loads(new_body):
+                raise CommandError(f"{label}: serializer output differs from the old response body.")
+            old_cost = self._per_row(before, repeat)
+            new_cost = self._per_row(after, repeat)
+            self.stdout.write(
+                f"{label:<9} before {old_cost:7.2f} us/row   after {new_cost:7.2f} us/row   "
+                f"({old_cost / new_cost:.1f}x)")
+
+    @staticmethod
+    def _per_row(render, repeat):
+        render() # Warm up query compilation and caches
+        rows = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows += render()[1]
+        return (time.perf_counter() - started) * 1e6 / max(rows, 1)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main import readmodel, counts
+from main.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the PatientListEntry read model with the Patient/Owner/Species/Breed "
+        "tables and report missing, orphaned and stale entries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the inconsistent entries.")
+
+    def handle(self, *args, **options):
+        missing, orphaned, stale = readmodel.find_inconsistencies()
+        for label, ids in (('missing', missing), ('orphaned', orphaned), ('stale', stale)):
+            sample = ', '.join(str(pk) for pk in ids[:20]) + (' ...' if len(ids) > 20 else '')
+            self.stdout.write(f"{label}: {len(ids)}" + (f" ({sample})" if ids else ''))
+
+        if not (missing or orphaned or stale):
+            self.stdout.write(self.style.SUCCESS("Patient read model is consistent."))
+            return
+        if not options['fix']:
+            raise CommandError("Patient read model is out of sync. Re-run with --fix to repair it.")
+
+        with transaction.atomic():
+            readmodel.remove_patients(orphaned)
+            readmodel.refresh_patients(missing + stale)
+            counts.record_change(Patient) # Invalidate cached filtered counts
+        self.stdout.write(self.style.SUCCESS(f"Repaired {len(missing) + len(orphaned) + len(stale)} entries."))
@@ -0,0 +1,104 @@
+import itertools
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from main import views
+from main.models import Owner, Species
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every list/sort/filter combination of the list APIs and print the "
+        "EXPLAIN QUERY PLAN of each SQL statement they issue, flagging full table "
+        "scans and temporary sort B-trees. SQLite only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print the full plan of every statement.")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any full scan is found.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("EXPLAIN QUERY PLAN checks are only implemented for SQLite.")
+
+        owner = Owner.objects.first()
+        species = Species.objects.order_by('code').first()
+        scans = 0
+        sorts = 0
+        checked = 0
+
+        for label, view, params in self._combinations(owner, species):
+            cache.clear() # Make sure count queries run instead of hitting the count cache
+            request = RequestFactory().get('/', params)
+            with CaptureQueriesContext(connection) as ctx:
+                view(request)
+
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                if 'main_tablecounter' in sql or 'sqlite_master' in sql: # Bookkeeping/introspection
+                    continue
+                checked += 1
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = [row[-1] for row in cursor.fetchall()]
+
+                temp_sorts = [d for d in plan if 'TEMP B-TREE' in d]
+                full_scans = [d for d in plan if self._is_full_scan(d)]
+                if 'USE TEMP B-TREE FOR ORDER BY' in plan:
+                    # Walking a whole index only to sort it afterwards is a full scan too
+                    full_scans += [d for d in plan if self._is_table_scan(d)]
+                scans += bool(full_scans)
+                sorts += bool(temp_sorts)
+
+                if full_scans:
+                    status = self.style.ERROR('FULL SCAN')
+                elif temp_sorts:
+                    status = self.style.WARNING('TEMP SORT')
+                else:
+                    status = self.style.SUCCESS('OK')
+                self.stdout.write(f"[{status}] {label}: {sql[:90]}...")
+                if options['verbose_plans'] or full_scans or temp_sorts:
+                    for detail in plan:
+                        self.stdout.write(f"      {detail}")
+
+        self.stdout.write(f"\n{checked} statements checked: {scans} with full scans, {sorts} with temp sorts.")
+        if scans and options['strict']:
+            raise CommandError(f"{scans} statements still do a full table scan.")
+
+    @staticmethod
+    def _is_table_scan(detail):
+        return detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail and 'CONSTANT ROW' not in detail
+
+    @classmethod
+    def _is_full_scan(cls, detail):
+        return cls._is_table_scan(detail) and ' USING ' not in detail
+
+    def _combinations(self, owner, species):
+        owner_view = views.OwnerListCreateAPIView.as_view()
+        patient_view = views.PatientListAPIView.as_view()
+        breed_view = views.BreedListCreateView.as_view()
+        modes = [{}, {'cursor': ''}]
+
+        owner_sorts = ['updated_at', 'last_name', 'first_name', 'email', 'telephone']
+        for sort, direction, filters, mode in itertools.product(
+                owner_sorts, ['asc', 'desc'], [{}, {'query': 'smith'}], modes):
+            params = {'sort': sort, 'direction': direction, **filters, **mode}
+            yield f"owners {params}", owner_view, params
+
+        owner_filter = {'owner_id': owner.pk} if owner else {'owner_id': 1}
+        for sort, direction, filters, mode in itertools.product(
+                sorted(views.PatientListAPIView.ALLOWED_SORT_FIELDS), ['asc', 'desc'],
+                [{}, {'query': 'rex'}, owner_filter], modes):
+            params = {'sort': sort, 'direction': direction, **filters, **mode}
+            yield f"patients {params}", patient_view, params
+
+        species_code = species.code if species else 'DOG'
+        for filters, mode in itertools.product([{}, {'search': 'ret'}], modes):
+            params = {'species_code': species_code, **filters, **mode}
+            yield f"breeds {params}", breed_view, params
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete changes-feed tombstones older than CHANGES_TOMBSTONE_DAYS (run daily). "
+        "Sync tokens that old are refused anyway, so no client still needs them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGES_TOMBSTONE_DAYS,
+                            help="Keep tombstones this many days (default: %(default)s).")
+
+    def handle(self, *args, **options):
+        deleted = changes.prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones older than {options['days']} days."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import readmodel, counts
+from main.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Rebuild the PatientListEntry read model (used by the patient list API) from the base tables."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            entries = readmodel.rebuild()
+            counts.record_change(Patient) # Invalidate cached filtered counts
+
+        self.stdout.write(self.style.SUCCESS(f"Patient read model rebuilt: {entries} entries."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Owner/Patient full-text search index from the database tables."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search tables not found. Run `manage.py migrate` on a SQLite database first.")
+
+        with transaction.atomic():
+            owners, patients = search.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt: {owners} owners, {patients} patients."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Owner, Species, Breed, Patient, Case, TableCounter
+
+
+class Command(BaseCommand):
+    help = "Recompute the TableCounter row counts used for list totals (e.g. after manual SQL changes)."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model in (Owner, Species, Breed, Patient, Case):
+                row_count = model.objects.count()
+                counter, created = TableCounter.objects.select_for_update().get_or_create(
+                    name=model._meta.db_table, defaults={'row_count': row_count})
+                if not created:
+                    counter.row_count = row_count
+                    counter.version += 1 # Invalidate any cached filtered counts
+                    counter.save()
+                self.stdout.write(f"{counter.name}: {row_count}")
+
+        self.stdout.write(self.style.SUCCESS("Table counters updated."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background imports (owner/patient CSV). Use with "
+        "IMPORT_WORKER_THREADS=0 to keep imports out of the web processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when no job is queued.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks for new jobs.")
+
+    def handle(self, *args, **options):
+        jobs.fail_stale_jobs()
+        self.stdout.write("Import worker started.")
+        try:
+            while True:
+                jobs.run_pending_jobs()
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Import worker stopped.")
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# FTS5 tables backing main.search. SQLite only; other backends fall back to icontains.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS main_owner_search USING fts5(
+        last_name, first_name, email, telephone, address, comments,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS main_patient_search USING fts5(
+        name, owner_last_name, owner_first_name, species_code, breed_name,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO main_owner_search(rowid, last_name, first_name, email, telephone, address, comments)
+    SELECT id, last_name, first_name, email, telephone, address, comments FROM main_owner
+    """,
+    """
+    INSERT INTO main_patient_search(rowid, name, owner_last_name, owner_first_name, species_code, breed_name)
+    SELECT p.id, p.name, o.last_name, o.first_name, s.code, b.name
+    FROM main_patient p
+    JOIN main_owner o ON o.id = p.owner_id
+    JOIN main_species s ON s.id = p.species_id
+    JOIN main_breed b ON b.id = p.breed_id
+    """,
+]
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS main_owner_search",
+    "DROP TABLE IF EXISTS main_patient_search",
+]
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_case'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+COUNTED_MODELS = ('Owner', 'Species', 'Breed', 'Patient', 'Case')
+
+
+def seed_counters(apps, schema_editor):
+    TableCounter = apps.get_model('main', 'TableCounter')
+    db_alias = schema_editor.connection.alias
+    for model_name in COUNTED_MODELS:
+        model = apps.get_model('main', model_name)
+        TableCounter.objects.using(db_alias).update_or_create(
+            name=model._meta.db_table,
+            defaults={'row_count': model.objects.using(db_alias).count()},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('row_count', models.BigIntegerField(default=0)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
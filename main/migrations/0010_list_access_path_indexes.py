@@ -0,0 +1,82 @@
+# Generated by Django 5.2 on 2026-10-18 03:32
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_table_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='breed',
+            index=models.Index(models.F('species'), django.db.models.functions.text.Lower('name'), name='breed_species_lower_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['case_date', 'updated_at'], name='case_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['owner', 'case_date'], name='case_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['patient', 'case_date'], name='case_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['updated_at'], name='owner_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['last_name'], name='owner_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['first_name'], name='owner_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['email'], name='owner_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['telephone'], name='owner_telephone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), django.db.models.functions.text.Lower('first_name'), django.db.models.functions.text.Lower('email'), name='owner_identity_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at'], name='patient_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name'], name='patient_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_of_birth'], name='patient_dob_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['sex'], name='patient_sex_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['intact'], name='patient_intact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['owner', 'updated_at'], name='patient_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(models.F('owner'), django.db.models.functions.text.Lower('name'), name='patient_owner_lower_name_idx'),
+        ),
+    ]
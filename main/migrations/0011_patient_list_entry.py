@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POPULATE_SQL = """
+    INSERT INTO main_patientlistentry (
+        patient_id, owner_id, owner_last_name, owner_first_name, owner_name,
+        species_id, species_code, breed_id, breed_name,
+        name, sex, intact, date_of_birth, weight, created_at, updated_at
+    )
+    SELECT p.id, p.owner_id, o.last_name, o.first_name,
+           TRIM(COALESCE(o.first_name, '') || ' ' || o.last_name),
+           p.species_id, s.code, p.breed_id, b.name,
+           p.name, p.sex, p.intact, p.date_of_birth, p.weight, p.created_at, p.updated_at
+    FROM main_patient p
+    JOIN main_owner o ON o.id = p.owner_id
+    JOIN main_species s ON s.id = p.species_id
+    JOIN main_breed b ON b.id = p.breed_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_list_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientListEntry',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='list_entry', serialize=False, to='main.patient')),
+                ('owner_last_name', models.CharField(max_length=100)),
+                ('owner_first_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('owner_name', models.CharField(max_length=201)),
+                ('species_code', models.CharField(max_length=50)),
+                ('breed_name', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('sex', models.CharField(max_length=1)),
+                ('intact', models.BooleanField()),
+                ('date_of_birth', models.DateField()),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('breed', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main.breed')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.owner')),
+                ('species', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main.species')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at', 'patient'], name='entry_updated_at_idx'), models.Index(fields=['name', 'patient'], name='entry_name_idx'), models.Index(fields=['owner_last_name', 'owner_first_name', 'name', 'patient'], name='entry_owner_name_idx'), models.Index(fields=['species_code', 'patient'], name='entry_species_code_idx'), models.Index(fields=['breed_name', 'patient'], name='entry_breed_name_idx'), models.Index(fields=['sex', 'patient'], name='entry_sex_idx'), models.Index(fields=['intact', 'patient'], name='entry_intact_idx'), models.Index(fields=['date_of_birth', 'patient'], name='entry_dob_idx'), models.Index(fields=['owner', 'updated_at', 'patient'], name='entry_owner_updated_idx')],
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 03:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_patient_list_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablecounter',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
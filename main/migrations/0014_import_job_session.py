@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='session',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
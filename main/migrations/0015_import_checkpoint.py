@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_import_job_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('row', models.BigIntegerField(default=1)),
+                ('counts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='commit_mode',
+            field=models.CharField(choices=[('chunked', 'Commit every chunk'), ('atomic', 'All or nothing')], default='chunked', max_length=10),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+# Frozen copies of main.models.name_key / owner_key
+def _name_key(value):
+    return (value or '').strip().lower()
+
+
+def _owner_key(last_name, first_name, email):
+    return f"{_name_key(last_name)}\x1f{_name_key(first_name)}\x1f{_name_key(email)}"
+
+
+def _fill_keys(model, key_field, key, fields, db_alias):
+    """
+    Set `key_field` of every row, oldest first. Rows whose full identity
+    (key(row)) repeats an older row keep NULL: the unique constraints skip
+    NULLs, so existing duplicates don't block the migration.
+    """
+    seen = set()
+    duplicates = 0
+    batch = []
+    rows = model.objects.using(db_alias).order_by('pk').values_list('pk', *fields).iterator(chunk_size=BATCH_SIZE)
+    for pk, *values in rows:
+        value, identity = key(*values)
+        if identity in seen:
+            duplicates += 1
+            continue
+        seen.add(identity)
+        batch.append(model(pk=pk, **{key_field: value}))
+        if len(batch) >= BATCH_SIZE:
+            model.objects.using(db_alias).bulk_update(batch, [key_field])
+            batch = []
+    model.objects.using(db_alias).bulk_update(batch, [key_field])
+    if duplicates:
+        print(f"\n  {duplicates} duplicate {model._meta.verbose_name_plural} left without {key_field}", end='')
+
+
+def fill_identity_keys(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    def owner(last_name, first_name, email):
+        value = _owner_key(last_name, first_name, email)
+        return value, value
+
+    def breed(species_id, name):
+        value = _name_key(name)
+        return value, (species_id, value)
+
+    def patient(owner_id, name, species_id, breed_id, date_of_birth):
+        value = _name_key(name)
+        return value, (owner_id, value, species_id, breed_id, date_of_birth)
+
+    _fill_keys(apps.get_model('main', 'Owner'), 'identity_key', owner,
+               ('last_name', 'first_name', 'email'), db_alias)
+    _fill_keys(apps.get_model('main', 'Breed'), 'name_key', breed,
+               ('species_id', 'name'), db_alias)
+    _fill_keys(apps.get_model('main', 'Patient'), 'name_key', patient,
+               ('owner_id', 'name', 'species_id', 'breed_id', 'date_of_birth'), db_alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_import_checkpoint'),
+    ]
+
+    operations = [
+        # Replaced by the unique constraints below
+        migrations.RemoveIndex(
+            model_name='breed',
+            name='breed_species_lower_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='owner',
+            name='owner_identity_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_owner_lower_name_idx',
+        ),
+        migrations.AddField(
+            model_name='breed',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='owner',
+            name='identity_key',
+            field=models.CharField(editable=False, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_identity_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='owner',
+            name='identity_key',
+            field=models.CharField(editable=False, max_length=500, null=True, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='breed',
+            constraint=models.UniqueConstraint(fields=('species', 'name_key'), name='breed_species_name_key_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='patient',
+            constraint=models.UniqueConstraint(fields=('owner', 'name_key', 'species', 'breed', 'date_of_birth'), name='patient_identity_unique'),
+        ),
+    ]
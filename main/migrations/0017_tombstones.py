@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_identity_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('row_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['updated_at'], name='case_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_deleted_idx'),
+        ),
+    ]
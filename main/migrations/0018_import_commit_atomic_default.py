@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_tombstones'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='commit_mode',
+            field=models.CharField(choices=[('atomic', 'All or nothing'), ('chunked', 'Commit every chunk')], default='atomic', max_length=10),
+        ),
+    ]
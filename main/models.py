@@ -1,6 +1,31 @@
 from django.db import models
 from django.utils import timezone
 
+# --- Identity Keys --- #
+
+# Duplicates are prevented by unique constraints on normalized key columns
+# (trimmed, lower-cased in Python, blank == NULL), set by save() and written
+# directly by the bulk import paths. Python's lower() also folds non-ASCII
+# letters, which SQLite's lower() doesn't, so the keys are columns rather than
+# lower(...) expression indexes.
+
+def name_key(value):
+    """Normalized name for the key columns: trimmed and case-insensitive."""
+    return (value or '').strip().lower()
+
+
+def owner_key(last_name, first_name, email):
+    """Normalized identity of an owner: case-insensitive, blank and NULL are the same."""
+    return f"{name_key(last_name)}\x1f{name_key(first_name)}\x1f{name_key(email)}"
+
+
+def _with_key_field(kwargs, key_field, source_fields):
+    # save(update_fields=...) must also write the key if one of its source fields is saved
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) & set(source_fields):
+        kwargs['update_fields'] = {*update_fields, key_field}
+    return kwargs
+
 # Create your models here.
 
 class Owner(models.Model):
@@ -12,10 +37,33 @@ class Owner(models.Model):
     comments = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # owner_key(last_name, first_name, email). NULL only for duplicates that existed before
+    # the constraint (see migration 0016); saving one of those fails until it is changed.
+    identity_key = models.CharField(max_length=500, unique=True, null=True, editable=False)
+
+    IDENTITY_FIELDS = ('last_name', 'first_name', 'email')
+
+    class Meta:
+        indexes = [
+            # Sort columns of the owner list API (pk is implicit in every SQLite index)
+            models.Index(fields=['updated_at'], name='owner_updated_at_idx'),
+            models.Index(fields=['last_name'], name='owner_last_name_idx'),
+            models.Index(fields=['first_name'], name='owner_first_name_idx'),
+            models.Index(fields=['email'], name='owner_email_idx'),
+            models.Index(fields=['telephone'], name='owner_telephone_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name or ''} {self.last_name}".strip()
 
+    def set_keys(self):
+        """Compute identity_key; save() calls this, bulk writes must call it themselves."""
+        self.identity_key = owner_key(self.last_name, self.first_name, self.email)
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        super().save(*args, **_with_key_field(kwargs, 'identity_key', self.IDENTITY_FIELDS))
+
 # --- New Models --- #
 
 class Species(models.Model):
@@ -32,14 +80,26 @@ class Species(models.Model):
 class Breed(models.Model):
     species = models.ForeignKey(Species, on_delete=models.CASCADE, related_name="breeds")
     name = models.CharField(max_length=100, help_text="Name of the breed")
+    name_key = models.CharField(max_length=100, null=True, editable=False) # name_key(name); NULL: pre-constraint duplicate
 
     class Meta:
         unique_together = ('species', 'name') # Ensure breed names are unique within a species
         ordering = ['species__code', 'name'] # Default ordering
+        constraints = [
+            # Also case-insensitively (imports and the breed API rely on it instead of checking first)
+            models.UniqueConstraint(fields=['species', 'name_key'], name='breed_species_name_key_unique'),
+        ]
 
     def __str__(self):
         return f"{self.species.code} - {self.name}"
 
+    def set_keys(self):
+        self.name_key = name_key(self.name)
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        super().save(*args, **_with_key_field(kwargs, 'name_key', ['name']))
+
 # --- Patient Model --- #
 
 class Patient(models.Model):
@@ -58,12 +118,78 @@ class Patient(models.Model):
     weight = models.DecimalField(max_digits=5, decimal_places=2, help_text="Weight in kilograms") # e.g., 999.99 kg
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    name_key = models.CharField(max_length=100, null=True, editable=False) # name_key(name); NULL: pre-constraint duplicate
 
     def __str__(self):
         return f"{self.name} ({self.species.code} - {self.breed.name})"
 
+    def set_keys(self):
+        self.name_key = name_key(self.name)
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        super().save(*args, **_with_key_field(kwargs, 'name_key', ['name']))
+
     class Meta:
         ordering = ['owner__last_name', 'owner__first_name', 'name'] # Default ordering
+        indexes = [
+            # Sort columns of the patient list API
+            models.Index(fields=['updated_at'], name='patient_updated_at_idx'),
+            models.Index(fields=['name'], name='patient_name_idx'),
+            models.Index(fields=['date_of_birth'], name='patient_dob_idx'),
+            models.Index(fields=['sex'], name='patient_sex_idx'),
+            models.Index(fields=['intact'], name='patient_intact_idx'),
+            # owner_id filter (case page, owner detail) combined with the default sort
+            models.Index(fields=['owner', 'updated_at'], name='patient_owner_updated_idx'),
+        ]
+        constraints = [
+            # One patient per owner, name (case-insensitive), species, breed and date of birth
+            models.UniqueConstraint(fields=['owner', 'name_key', 'species', 'breed', 'date_of_birth'],
+                                    name='patient_identity_unique'),
+        ]
+
+# --- Patient Read Model --- #
+
+class PatientListEntry(models.Model):
+    """
+    Flat, indexed copy of each Patient with its owner/species/breed names, used by
+    the patient list and search APIs so they neither join nor sort across tables.
+    Maintained from every write path through main.signals (see main/readmodel.py).
+    """
+    patient = models.OneToOneField(Patient, primary_key=True, on_delete=models.CASCADE, related_name="list_entry")
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name="+")
+    owner_last_name = models.CharField(max_length=100)
+    owner_first_name = models.CharField(max_length=100, null=True, blank=True)
+    owner_name = models.CharField(max_length=201)
+    species = models.ForeignKey(Species, on_delete=models.DO_NOTHING, related_name="+")
+    species_code = models.CharField(max_length=50)
+    breed = models.ForeignKey(Breed, on_delete=models.DO_NOTHING, related_name="+")
+    breed_name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100)
+    sex = models.CharField(max_length=1)
+    intact = models.BooleanField()
+    date_of_birth = models.DateField()
+    weight = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # One index per sort of the patient list API. The OneToOne pk is a bigint,
+            # not SQLite's rowid alias, so it is listed explicitly as the tie-breaker.
+            models.Index(fields=['updated_at', 'patient'], name='entry_updated_at_idx'),
+            models.Index(fields=['name', 'patient'], name='entry_name_idx'),
+            models.Index(fields=['owner_last_name', 'owner_first_name', 'name', 'patient'], name='entry_owner_name_idx'),
+            models.Index(fields=['species_code', 'patient'], name='entry_species_code_idx'),
+            models.Index(fields=['breed_name', 'patient'], name='entry_breed_name_idx'),
+            models.Index(fields=['sex', 'patient'], name='entry_sex_idx'),
+            models.Index(fields=['intact', 'patient'], name='entry_intact_idx'),
+            models.Index(fields=['date_of_birth', 'patient'], name='entry_dob_idx'),
+            models.Index(fields=['owner', 'updated_at', 'patient'], name='entry_owner_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.owner_name})"
 
 # --- Case Model --- #
 
@@ -81,5 +207,120 @@ class Case(models.Model):
 
     class Meta:
         ordering = ['-case_date', '-updated_at'] # Order by case date first, then updated_at
+        indexes = [
+            models.Index(fields=['case_date', 'updated_at'], name='case_date_idx'),
+            models.Index(fields=['owner', 'case_date'], name='case_owner_date_idx'),
+            models.Index(fields=['patient', 'case_date'], name='case_patient_date_idx'),
+            # Keyset order of the changes feed (main/changes.py)
+            models.Index(fields=['updated_at'], name='case_updated_at_idx'),
+        ]
+
+
+# --- Tombstones (deleted rows, for the changes feed) --- #
+
+class Tombstone(models.Model):
+    """
+    Id of a deleted Owner, Patient or Case, recorded by main.signals in the
+    deleting transaction so the changes feed (main/changes.py) can report
+    deletes. Kept for settings.CHANGES_TOMBSTONE_DAYS (manage.py prune_tombstones).
+    """
+    kind = models.CharField(max_length=20) # Feed name: 'owners', 'patients' or 'cases'
+    row_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Keyset order of the feed: (deleted_at, id) within a kind (the rowid ends every SQLite index)
+            models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.row_id} deleted at {self.deleted_at}"
 
 # Make sure to run makemigrations and migrate after adding the model
+
+# --- Import Job Model --- #
+
+class ImportJob(models.Model):
+    """
+    One owner/patient CSV import run in the background (see main/jobs.py).
+    Live progress and cancel requests go through files next to the upload,
+    not this row: the import's own transaction may hold the database write lock.
+    """
+    KIND_CHOICES = [
+        ('owners', 'Owners'),
+        ('patients', 'Patients'),
+    ]
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'), # Committed; the result may still list row errors
+        (STATUS_FAILED, 'Failed'),       # Rolled back (chunked: the committed chunks are kept)
+        (STATUS_CANCELLED, 'Cancelled'), # Rolled back (chunked: the committed chunks are kept)
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+    COMMIT_CHOICES = [
+        ('atomic', 'All or nothing'),      # One transaction for the whole file
+        ('chunked', 'Commit every chunk'), # Other writers get the database between chunks
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    file_name = models.CharField(max_length=255) # Name of the uploaded file
+    file_path = models.CharField(max_length=500) # Stored copy of the upload, removed when the job finishes
+    session = models.CharField(max_length=32, blank=True) # Staged session token (main/staging.py) instead of an upload
+    commit_mode = models.CharField(max_length=10, choices=COMMIT_CHOICES, default='atomic')
+    file_size = models.BigIntegerField(default=0)
+    rows_processed = models.BigIntegerField(default=0) # Final values; see jobs.job_status() for live ones
+    error_count = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True) # Same JSON the synchronous execute views return
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='import_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} import #{self.pk} ({self.status})"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    How far a chunked import got (see importing.ChunkedCommit): the last row
+    handled and the importer's counters, saved in the same transaction as each
+    committed chunk. Importing the same staged session again resumes after
+    `row`. Deleted once the import completes.
+    """
+    key = models.CharField(max_length=64, primary_key=True) # Staged session token
+    kind = models.CharField(max_length=20)
+    row = models.BigIntegerField(default=1) # Rows up to this CSV row number are done (1: none)
+    counts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} import {self.key} after row {self.row}"
+
+# --- Bookkeeping Models --- #
+
+class TableCounter(models.Model):
+    """
+    One row per tracked table holding its total row count and a change version.
+    Kept up to date in O(1) by main.signals (see main/counts.py), so list views
+    can report unfiltered totals and validate cached counts without a COUNT(*).
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    row_count = models.BigIntegerField(default=0)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now) # Time of the last version bump (Last-Modified)
+
+    def __str__(self):
+        return f"{self.name}: {self.row_count} rows (v{self.version})"
@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination for the list APIs.
+
+Django's Paginator uses OFFSET (slower the deeper you page) and runs a COUNT(*)
+per request. KeysetPaginator instead seeks past the last row of the previous
+page on the same `(sort fields..., pk)` ordering the views already use, so every
+page costs the same and no count is needed.
+
+Cursors are opaque URL-safe strings holding the boundary row's sort key, the
+direction ('n'ext / 'p'revious) and a signature of the ordering they belong to.
+NULLs always sort as the smallest value (SQLite's default), on every backend.
+"""
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    has_next: bool
+    has_previous: bool
+    next_cursor: str = None
+    prev_cursor: str = None
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _model_field(model, path):
+    """Resolve 'owner__last_name' style paths to the final model field."""
+    parts = path.split('__')
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    name = parts[-1]
+    return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+
+def _row_value(row, path):
+    """Read a sort key from either a .values() dict or a model instance."""
+    if isinstance(row, dict):
+        if path == 'pk':
+            return row['pk'] if 'pk' in row else row['id']
+        return row[path]
+    value = row
+    for part in path.split('__'):
+        if value is None:
+            return None
+        value = getattr(value, part)
+    return value
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page):
+        """
+        `ordering` is an order_by() style list (e.g. ['-updated_at', 'pk']). It must
+        end in a unique field ('pk') so every row has a distinct position.
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [(f.lstrip('-'), f.startswith('-')) for f in ordering]
+        self.signature = ','.join(ordering)
+        self.fields = [_model_field(queryset.model, name) for name, _ in self.ordering]
+
+    # --- Cursor encoding --- #
+
+    def _encode(self, row, direction):
+        payload = {
+            'k': [_to_json(_row_value(row, name)) for name, _ in self.ordering],
+            'd': direction,
+            'o': self.signature,
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(raw)
+            values, direction = payload['k'], payload['d']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor('Malformed cursor.')
+        if payload.get('o') != self.signature or direction not in ('n', 'p') or len(values) != len(self.fields):
+            raise InvalidCursor('Cursor does not match the requested sort order.')
+        try:
+            values = [None if v is None else field.to_python(v) for field, v in zip(self.fields, values)]
+        except ValidationError:
+            raise InvalidCursor('Malformed cursor.')
+        return values, direction
+
+    # --- Query building --- #
+
+    @staticmethod
+    def _order_expressions(ordering):
+        return [
+            F(name).desc(nulls_last=True) if desc else F(name).asc(nulls_first=True)
+            for name, desc in ordering
+        ]
+
+    @staticmethod
+    def _after(ordering, values):
+        """Q matching rows strictly after `values` in `ordering` (NULL = smallest)."""
+        condition = Q(pk__in=[])
+        equal_so_far = Q()
+        for (name, desc), value in zip(ordering, values):
+            if value is None:
+                beyond = Q(pk__in=[]) if desc else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                if desc:
+                    beyond = Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+                else:
+                    beyond = Q(**{f'{name}__gt': value})
+                same = Q(**{name: value})
+            condition |= equal_so_far & beyond
+            equal_so_far &= same
+        return condition
+
+    def page(self, cursor=None):
+        if not cursor:
+            values, direction = None, 'n'
+        else:
+            values, direction = self._decode(cursor)
+
+        ordering = self.ordering
+        if direction == 'p':
+            ordering = [(name, not desc) for name, desc in ordering]
+
+        queryset = self.queryset.order_by(*self._order_expressions(ordering))
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            object_list=rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._encode(rows[-1], 'n') if has_next and rows else None,
+            prev_cursor=self._encode(rows[0], 'p') if has_previous and rows else None,
+        )
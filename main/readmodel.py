@@ -0,0 +1,103 @@
+"""
+Maintenance of the PatientListEntry read model.
+
+Each entry is a denormalized copy of one Patient plus its owner, species and
+breed names. Entries are rewritten with set-based INSERT ... SELECT statements
+from main.signals whenever a Patient, Owner, Species or Breed changes, inside
+the same transaction as the write, so the list API never sees them diverge.
+"""
+from django.db import connection
+
+from .models import Owner, Species, Breed, Patient, PatientListEntry
+
+ENTRY_TABLE = PatientListEntry._meta.db_table
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+ENTRY_COLUMNS = (
+    'patient_id', 'owner_id', 'owner_last_name', 'owner_first_name', 'owner_name',
+    'species_id', 'species_code', 'breed_id', 'breed_name',
+    'name', 'sex', 'intact', 'date_of_birth', 'weight', 'created_at', 'updated_at',
+)
+
+# owner_name matches what the API used to build in Python: "first last", stripped
+_ENTRY_SELECT = f"""
+    SELECT p.id, p.owner_id, o.last_name, o.first_name,
+           TRIM(COALESCE(o.first_name, '') || ' ' || o.last_name),
+           p.species_id, s.code, p.breed_id, b.name,
+           p.name, p.sex, p.intact, p.date_of_birth, p.weight, p.created_at, p.updated_at
+    FROM {Patient._meta.db_table} p
+    JOIN {Owner._meta.db_table} o ON o.id = p.owner_id
+    JOIN {Species._meta.db_table} s ON s.id = p.species_id
+    JOIN {Breed._meta.db_table} b ON b.id = p.breed_id
+"""
+_ENTRY_INSERT = f"INSERT INTO {ENTRY_TABLE} ({', '.join(ENTRY_COLUMNS)})"
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+
+def refresh_patients(ids):
+    """Rewrite the entries of the given patients (missing patients just lose their entry)."""
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {ENTRY_TABLE} WHERE patient_id IN ({marks})", chunk)
+            cursor.execute(f"{_ENTRY_INSERT} {_ENTRY_SELECT} WHERE p.id IN ({marks})", chunk)
+
+
+def remove_patients(ids):
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {ENTRY_TABLE} WHERE patient_id IN ({marks})", chunk)
+
+
+def refresh_for(field, ids):
+    """Rewrite the entries of every patient whose `field` (owner/species/breed) is in `ids`."""
+    refresh_patients(Patient.objects.filter(**{f'{field}__in': list(ids)}).values_list('pk', flat=True))
+
+
+def rebuild():
+    """Repopulate the whole read model from the base tables. Returns the number of entries."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {ENTRY_TABLE}")
+        cursor.execute(f"{_ENTRY_INSERT} {_ENTRY_SELECT}")
+    return PatientListEntry.objects.count()
+
+
+def find_inconsistencies():
+    """
+    Compare the read model with the base tables.
+    Returns (missing, orphaned, stale) lists of patient ids.
+    """
+    columns = ', '.join(ENTRY_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT p.id FROM {Patient._meta.db_table} p
+            LEFT JOIN {ENTRY_TABLE} e ON e.patient_id = p.id
+            WHERE e.patient_id IS NULL
+        """)
+        missing = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+            SELECT e.patient_id FROM {ENTRY_TABLE} e
+            LEFT JOIN {Patient._meta.db_table} p ON p.id = e.patient_id
+            WHERE p.id IS NULL
+        """)
+        orphaned = [row[0] for row in cursor.fetchall()]
+
+        # Rows present on both sides whose copied values differ
+        cursor.execute(f"""
+            SELECT patient_id FROM (
+                SELECT {columns} FROM {ENTRY_TABLE}
+                EXCEPT
+                {_ENTRY_SELECT}
+            )
+        """)
+        stale = sorted(set(row[0] for row in cursor.fetchall()) - set(orphaned))
+    return missing, orphaned, stale
@@ -0,0 +1,196 @@
+"""
+Species/breed reference data: version stamp, shared snapshot cache and catalog.
+
+The reference version combines the TableCounter versions of Species and Breed.
+main.signals bumps those on every create/update/delete, including the breeds
+PatientImportExecuteView creates on the fly, so the stamp changes exactly when
+the reference data does.
+
+HTTP: pages put the version in the URLs of the reference endpoints (`?v=...`).
+A request whose `v` matches the current version may be cached by the browser
+for a year (the URL changes with the data); any other request gets the
+current data with `no-cache` + ETag (see main.conditional.versioned_get).
+
+Server side, every reader (forms, import views, reference APIs) goes through
+get_snapshot():
+* The current version is read from the database (one primary-key lookup), so
+  every worker process agrees on it.
+* A process that already holds the snapshot of that version uses it (hit).
+* Otherwise it reads the snapshot file of that version, written by whichever
+  worker built it first, from REFERENCE_CACHE_DIR (shared hit). Each process
+  still builds its own lookup dicts from it; what is shared is the database
+  work, not memory.
+* Only if no worker has built it yet is it loaded from the database (miss) and
+  published with an atomic rename.
+Inside a transaction a changed version is served from a private, uncached
+load: the transaction could still roll back the writes behind the bump.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Species, Breed
+from . import counts
+
+_lock = threading.Lock()
+_local = None  # Snapshot held by this process
+_stats_lock = threading.Lock()  # Separate from _lock, which is held while loading
+_stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'uncached': 0}
+
+
+def _count(name):
+    # `+=` on a dict entry isn't atomic: threaded workers would lose increments
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def reference_version():
+    """Opaque stamp that changes whenever a species or breed is written."""
+    (species_version, species_changed), (breed_version, breed_changed) = counts.change_stamps(Species, Breed)
+    # The change time tells apart databases recreated at the same path (versions restart at 0)
+    changed_ms = int(max(species_changed, breed_changed).timestamp() * 1000)
+    return '%d.%d.%x' % (species_version, breed_version, changed_ms)
+
+
+class ReferenceSnapshot:
+    """Immutable species/breed lookup tables for one reference version."""
+
+    def __init__(self, version, species, breeds):
+        self.version = version
+        self._rows = {'version': version, 'species': species, 'breeds': breeds}  # What gets shared
+        self._species_by_code = {code: pk for pk, code in species}  # code -> id
+        self._species_by_id = {pk: code for pk, code in species}    # id -> code
+        self._breeds = {pk: (species_id, name) for pk, species_id, name in breeds}
+        self._breeds_by_name = {  # (species code, lower-case name) -> id
+            (self._species_by_id[species_id], name.lower()): pk for pk, species_id, name in breeds}
+
+    def __reduce__(self):
+        # Pickled by its rows, e.g. for staging's validation worker processes
+        return ReferenceSnapshot, (self.version, self._rows['species'], self._rows['breeds'])
+
+    # Instances are created per call (callers may modify or cache them) and
+    # marked as loaded from the database, with breed.species pre-populated.
+
+    def species_codes(self):
+        return sorted(self._species_by_code)
+
+    def species(self, code):
+        """Species with this code, or None."""
+        pk = self._species_by_code.get(code)
+        return Species.from_db('default', ['id', 'code'], [pk, code]) if pk is not None else None
+
+    def species_by_id(self, pk):
+        code = self._species_by_id.get(pk)
+        return Species.from_db('default', ['id', 'code'], [pk, code]) if code is not None else None
+
+    def breed(self, pk):
+        """Breed with this id (species attached), or None."""
+        row = self._breeds.get(pk)
+        if row is None:
+            return None
+        species_id, name = row
+        breed = Breed.from_db('default', ['id', 'species_id', 'name'], [pk, species_id, name])
+        Breed.species.field.set_cached_value(breed, self.species_by_id(species_id))
+        return breed
+
+    def breed_by_name(self, species_code, name):
+        """Breed of `species_code` whose name matches case-insensitively, or None."""
+        pk = self._breeds_by_name.get((species_code, name.lower()))
+        return self.breed(pk) if pk is not None else None
+
+    def catalog(self):
+        """
+        Whole species -> breeds mapping in one compact payload:
+        {"version": "...", "species": {"DOG": [[breed_id, "Breed name"], ...], ...}}
+        Breeds are sorted by name, species by code.
+        """
+        species = {code: [] for code in self.species_codes()}
+        for pk, (species_id, name) in sorted(self._breeds.items(), key=lambda item: (item[1][1], item[0])):
+            species[self._species_by_id[species_id]].append([pk, name])
+        return {'version': self.version, 'species': species}
+
+
+# --- Shared Snapshot Files --- #
+
+def _snapshot_path(version):
+    # One file per database and version; several projects/databases may share the directory
+    database = hashlib.sha1(str(settings.DATABASES['default']['NAME']).encode()).hexdigest()[:12]
+    return os.path.join(settings.REFERENCE_CACHE_DIR, f'reference-{database}-{version}.json')
+
+
+def _read_shared(version):
+    try:
+        with open(_snapshot_path(version), 'rb') as f:
+            rows = json.loads(f.read())
+        return ReferenceSnapshot(version, rows['species'], rows['breeds'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None  # Not built yet (or unreadable): fall back to the database
+
+
+def _publish(snapshot):
+    path = _snapshot_path(snapshot.version)
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot._rows, f, separators=(',', ':'))
+        os.replace(tmp_path, path)  # Atomic: readers see the old file or the complete new one
+    except OSError as e:
+        print(f"Reference cache: could not write snapshot {path}: {e}")
+        return
+    # Drop older versions of this database's snapshot
+    prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(prefix) and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass
+
+
+def _load(version):
+    species = [list(row) for row in Species.objects.values_list('id', 'code')]
+    breeds = [list(row) for row in Breed.objects.values_list('id', 'species_id', 'name')]
+    return ReferenceSnapshot(version, species, breeds)
+
+
+def get_snapshot():
+    """Reference snapshot for the current version (see module docstring)."""
+    global _local
+    version = reference_version()  # Read before the data: a racing write can only make the data newer
+    snapshot = _local
+    if snapshot is not None and snapshot.version == version:
+        _count('hits')
+        return snapshot
+
+    if connection.in_atomic_block:
+        # Uncommitted reference writes may be visible here; don't share them
+        _count('uncached')
+        return _load(version)
+
+    with _lock:
+        snapshot = _read_shared(version)
+        if snapshot is not None:
+            _count('shared_hits')
+        else:
+            _count('misses')
+            snapshot = _load(version)
+            _publish(snapshot)
+        _local = snapshot
+    return snapshot
+
+
+def stats():
+    """Hit/miss counters of this worker process."""
+    with _stats_lock:
+        counters = dict(_stats)
+    return {'pid': os.getpid(), 'version': _local.version if _local else None, **counters}
+
+
+def catalog():
+    return get_snapshot().catalog()
@@ -0,0 +1,241 @@
+"""
+Import error reports: every row error of an import, as a CSV to download.
+
+The import response only lists the first few errors (ErrorLog keeps
+MAX_KEPT_ERRORS messages for it). With a report, the importer's ErrorLog also
+spools every error to disk as it happens, one JSON line [row number, message]
+each, so memory use doesn't grow with the number of errors. Staging's
+validation pass spools its errors the same way (stage-<token>.errors.jsonl),
+and they are copied into the report of the import that executes the session.
+
+When the import finishes, finish() reads the source CSV once more (only if
+there were errors) and writes the failed rows, with all their original cells,
+to the report, followed by two columns: import_row (row number, 2 = first
+data row) and import_error (the row's messages). The importers ignore unknown
+columns, so the report can be fixed and imported again as it is. The import
+response carries the report id and its download URL (ImportReportView,
+streamed from disk).
+
+Files in IMPORT_JOB_DIR:
+
+* report-<id>.errors.jsonl  the spool, while the import runs
+* report-<id>.csv           the finished report
+* report-<id>.json          file name and error count (written last)
+"""
+import array
+import codecs
+import contextlib
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.urls import reverse
+
+# Seconds a finished report can be downloaded
+REPORT_TTL = 24 * 60 * 60
+ROW_COLUMN = 'import_row'
+ERROR_COLUMN = 'import_error'
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+# Every row error message starts like this (see importing.py)
+_ROW_RE = re.compile(r'^Row (\d+): ')
+_SUFFIXES = ('.errors.jsonl', '.csv', '.json')
+
+
+class ReportError(Exception):
+    """Unknown or expired report; the message is shown to the user."""
+
+
+def _path(report_id, suffix):
+    return os.path.join(settings.IMPORT_JOB_DIR, f'report-{report_id}{suffix}')
+
+
+class ErrorSpool:
+    """Appends every error message added to `path`, as [row number, message] JSON lines (row 0: none)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'a', encoding='utf-8')
+
+    def add(self, message):
+        match = _ROW_RE.match(message)
+        if match:
+            entry = [int(match[1]), message[match.end():]]
+        else:
+            entry = [0, message]
+        self._f.write(json.dumps(entry) + '\n')
+
+    def extend(self, path):
+        """Append the errors spooled to `path` (e.g. by a staged session's validation), if it exists."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                shutil.copyfileobj(f, self._f)
+        except FileNotFoundError:
+            pass # Session staged before error spooling existed
+
+    def close(self):
+        self._f.close()
+
+
+def create(file_name):
+    """Start the error report of an import of `file_name` (pass it to the importer as `spool`)."""
+    cleanup_expired()
+    os.makedirs(settings.IMPORT_JOB_DIR, mode=0o700, exist_ok=True)
+    return ErrorReport(uuid.uuid4().hex, file_name)
+
+
+def load(report_id):
+    """(path of the report CSV, metadata) of a finished report (raises ReportError if unknown or expired)."""
+    if not _ID_RE.match(report_id or ''):
+        raise ReportError('Invalid error report.')
+    try:
+        with open(_path(report_id, '.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise ReportError('Error report not found or expired. Please run the import again.')
+    if meta['created_at'] < time.time() - REPORT_TTL:
+        _discard(report_id)
+        raise ReportError('Error report not found or expired. Please run the import again.')
+    return _path(report_id, '.csv'), meta
+
+
+def _discard(report_id):
+    for suffix in _SUFFIXES:
+        try:
+            os.remove(_path(report_id, suffix))
+        except OSError:
+            pass
+
+
+def cleanup_expired():
+    """Remove reports (and spools left by interrupted imports) older than REPORT_TTL."""
+    cutoff = time.time() - REPORT_TTL
+    try:
+        names = os.listdir(settings.IMPORT_JOB_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith('report-'):
+            path = os.path.join(settings.IMPORT_JOB_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+class ErrorReport(ErrorSpool):
+    def __init__(self, report_id, file_name):
+        super().__init__(_path(report_id, '.errors.jsonl'))
+        self.id = report_id
+        self.file_name = file_name
+        self.finished = False
+
+    def finish(self, source):
+        """
+        Write the report CSV from `source`, the import's CSV (a path or a binary
+        file), and return its response fields ({} if there were no errors, or
+        if the report couldn't be written: the import itself is done by then).
+        """
+        self._f.close()
+        try:
+            return self._finish(source)
+        except (OSError, ValueError, csv.Error) as e:
+            print(f"Could not write import error report {self.id}: {e}")
+            return {}
+
+    def _finish(self, source):
+        # Row number and spool offset of every error, sorted by row (the messages stay on disk)
+        rows = array.array('q')
+        offsets = array.array('q')
+        position = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                rows.append(int(line[1:line.index(b',')])) # Line: [row, "message"]
+                offsets.append(position)
+                position += len(line)
+        if not rows:
+            return {}
+        order = sorted(range(len(rows)), key=rows.__getitem__) # Stable: a row's messages stay in order
+
+        fd, tmp_path = tempfile.mkstemp(dir=settings.IMPORT_JOB_DIR, suffix='.tmp')
+        try:
+            self._write(source, os.fdopen(fd, 'w', encoding='utf-8', newline=''), rows, offsets, order)
+            os.replace(tmp_path, _path(self.id, '.csv'))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        meta = {
+            'file_name': self.file_name,
+            'error_count': len(rows),
+            'created_at': time.time(),
+        }
+        with open(_path(self.id, '.json'), 'w') as f:
+            json.dump(meta, f)
+        self.finished = True
+        return {
+            'error_count': len(rows),
+            'error_report_id': self.id,
+            'error_report_url': reverse('import-report-download', args=[self.id]),
+        }
+
+    def _write(self, source, out, rows, offsets, order):
+        # The failed rows of `source` in file order, each with its messages from the spool
+        with contextlib.ExitStack() as stack:
+            if isinstance(source, str):
+                source = stack.enter_context(open(source, 'rb'))
+            else:
+                source.seek(0)
+            spool = stack.enter_context(open(self.path, 'rb'))
+            stack.enter_context(out)
+
+            def messages(row_num):
+                # Messages of `row_num` at order[next_error:], joined; advances next_error
+                nonlocal next_error
+                texts = []
+                while next_error < len(order) and rows[order[next_error]] == row_num:
+                    spool.seek(offsets[order[next_error]])
+                    texts.append(json.loads(spool.readline())[1])
+                    next_error += 1
+                return '; '.join(texts)
+
+            reader = csv.reader(codecs.iterdecode(source, 'utf-8-sig'))
+            headers = next(reader, [])
+            writer = csv.writer(out)
+            writer.writerow([*headers, ROW_COLUMN, ERROR_COLUMN])
+            blank = [''] * len(headers)
+            next_error = 0
+            # Errors that aren't about one row come first
+            while next_error < len(order) and rows[order[next_error]] < 2:
+                writer.writerow([*blank, '', messages(rows[order[next_error]])])
+            row_num = 1
+            for cells in reader:
+                if next_error >= len(order):
+                    break
+                if not cells:
+                    continue # Blank line, not numbered (like the importers' DictReader)
+                row_num += 1
+                if rows[order[next_error]] == row_num:
+                    # Same columns as the header, so the report can be imported again
+                    writer.writerow([*(cells + blank)[:len(headers)], row_num, messages(row_num)])
+            while next_error < len(order): # Not in the file (shouldn't happen)
+                row = rows[order[next_error]]
+                writer.writerow([*blank, row, messages(row)])
+
+    def close(self):
+        """Remove the spool (and everything, if the report wasn't finished)."""
+        self._f.close()
+        if self.finished:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        else:
+            _discard(self.id)
@@ -0,0 +1,173 @@
+"""
+Full-text search index for Owners and Patients.
+
+On SQLite the list APIs search through two FTS5 tables instead of OR-ing
+`icontains` over every text column (which is a full table scan per keystroke).
+The FTS rowid is the Owner/Patient pk, so a search becomes a `pk IN (...)`
+subquery that still composes with the views' filtering, sorting and pagination.
+
+The tables are created by migration 0008 and kept in sync from `main.signals`.
+On other databases (or if FTS5 is missing) the views fall back to `icontains`.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Owner, Species, Breed, Patient
+
+OWNER_TABLE = 'main_owner_search'
+PATIENT_TABLE = 'main_patient_search'
+
+# filter_fields value (as sent by the list pages) -> FTS column
+OWNER_COLUMNS = {
+    'last_name': 'last_name',
+    'first_name': 'first_name',
+    'email': 'email',
+    'telephone': 'telephone',
+    'address': 'address',
+    'comments': 'comments',
+}
+PATIENT_COLUMNS = {
+    'name': 'name',
+    'owner__last_name': 'owner_last_name',
+    'owner__first_name': 'owner_first_name',
+    'species__code': 'species_code',
+    'breed__name': 'breed_name',
+}
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_available = None
+
+
+def is_available():
+    """True if the FTS tables exist on the default database (checked once per process)."""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and OWNER_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def build_match_expression(query, columns):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must prefix-match
+    somewhere in `columns`. Returns None if the query has nothing indexable.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens or not columns:
+        return None
+    terms = ' AND '.join(f'"{token}"*' for token in tokens)
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+
+def _filter(queryset, table, column_map, query, fields):
+    columns = [column_map[f] for f in fields if f in column_map]
+    expression = build_match_expression(query, columns) if is_available() else None
+    if expression is None:
+        # Fallback: substring scan (non-SQLite databases or punctuation-only queries).
+        # The FTS column names are also the field names on the queried model.
+        q_objects = Q()
+        for column in columns:
+            q_objects |= Q(**{f'{column}__icontains': query})
+        return queryset.filter(q_objects)
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+
+
+def filter_owners(queryset, query, fields):
+    """Filter an Owner queryset."""
+    return _filter(queryset, OWNER_TABLE, OWNER_COLUMNS, query, fields)
+
+
+def filter_patients(queryset, query, fields):
+    """Filter a PatientListEntry queryset (pk = patient id)."""
+    return _filter(queryset, PATIENT_TABLE, PATIENT_COLUMNS, query, fields)
+
+
+# --- Index Maintenance --- #
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+
+def _placeholders(chunk):
+    return ', '.join(['%s'] * len(chunk))
+
+
+_OWNER_SELECT = f"""
+    SELECT id, last_name, first_name, email, telephone, address, comments
+    FROM {Owner._meta.db_table}
+"""
+_PATIENT_SELECT = f"""
+    SELECT p.id, p.name, o.last_name, o.first_name, s.code, b.name
+    FROM {Patient._meta.db_table} p
+    JOIN {Owner._meta.db_table} o ON o.id = p.owner_id
+    JOIN {Species._meta.db_table} s ON s.id = p.species_id
+    JOIN {Breed._meta.db_table} b ON b.id = p.breed_id
+"""
+_OWNER_INSERT = f"INSERT INTO {OWNER_TABLE}(rowid, last_name, first_name, email, telephone, address, comments)"
+_PATIENT_INSERT = f"INSERT INTO {PATIENT_TABLE}(rowid, name, owner_last_name, owner_first_name, species_code, breed_name)"
+
+
+def index_owners(ids):
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = _placeholders(chunk)
+            cursor.execute(f"DELETE FROM {OWNER_TABLE} WHERE rowid IN ({marks})", chunk)
+            cursor.execute(f"{_OWNER_INSERT} {_OWNER_SELECT} WHERE id IN ({marks})", chunk)
+
+
+def remove_owners(ids):
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(f"DELETE FROM {OWNER_TABLE} WHERE rowid IN ({_placeholders(chunk)})", chunk)
+
+
+def index_patients(ids):
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = _placeholders(chunk)
+            cursor.execute(f"DELETE FROM {PATIENT_TABLE} WHERE rowid IN ({marks})", chunk)
+            cursor.execute(f"{_PATIENT_INSERT} {_PATIENT_SELECT} WHERE p.id IN ({marks})", chunk)
+
+
+def remove_patients(ids):
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            cursor.execute(f"DELETE FROM {PATIENT_TABLE} WHERE rowid IN ({_placeholders(chunk)})", chunk)
+
+
+def index_patients_for_owners(owner_ids):
+    index_patients(Patient.objects.filter(owner_id__in=list(owner_ids)).values_list('pk', flat=True))
+
+
+def index_patients_for_breeds(breed_ids):
+    index_patients(Patient.objects.filter(breed_id__in=list(breed_ids)).values_list('pk', flat=True))
+
+
+def index_patients_for_species(species_ids):
+    index_patients(Patient.objects.filter(species_id__in=list(species_ids)).values_list('pk', flat=True))
+
+
+def rebuild():
+    """Drop and repopulate both indexes from the base tables. Returns (owners, patients) indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {OWNER_TABLE}")
+        cursor.execute(f"DELETE FROM {PATIENT_TABLE}")
+        cursor.execute(f"{_OWNER_INSERT} {_OWNER_SELECT}")
+        cursor.execute(f"{_PATIENT_INSERT} {_PATIENT_SELECT}")
+        cursor.execute(f"INSERT INTO {OWNER_TABLE}({OWNER_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"INSERT INTO {PATIENT_TABLE}({PATIENT_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {OWNER_TABLE}")
+        owners = cursor.fetchone()[0]
+        cursor.execute(f"SELECT count(*) FROM {PATIENT_TABLE}")
+        patients = cursor.fetchone()[0]
+    return owners, patients
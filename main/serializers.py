@@ -0,0 +1,142 @@
+"""
+Response serialization without building model instances.
+
+A RowSerializer is declared once per response shape as (output key, source
+field, converter) triples. List views fetch `values_list(*serializer.sources)`
+tuples and turn each tuple into a dict with the converters resolved up front,
+so no Model.__init__, related-object caches or per-row attribute lookups are
+involved. The same serializer also accepts `.values()` dicts (cursor mode,
+where the keyset paginator needs named columns) and saved instances (create /
+update responses, which already hold the row).
+
+JSON bodies are rendered by FastJsonResponse: orjson when it is installed,
+otherwise the stdlib encoder with DjangoJSONEncoder semantics.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError: # Optional speed-up, see NOTES.md
+    orjson = None
+
+_django_default = DjangoJSONEncoder().default
+
+
+# --- Field Converters (all None-safe) --- #
+
+def iso(value):
+    """date/datetime -> full ISO 8601 string (the format the patient APIs always used)."""
+    return value.isoformat() if value is not None else None
+
+
+def js_datetime(value):
+    """datetime -> DjangoJSONEncoder format (milliseconds, 'Z' for UTC), as the owner APIs return."""
+    return _django_default(value) if value is not None else None
+
+
+def decimal_str(value):
+    """Decimal -> string, so weights keep their exact digits in JavaScript."""
+    return str(value) if value is not None else None
+
+
+# --- Serializers --- #
+
+class RowSerializer:
+    def __init__(self, *fields):
+        # fields: (key, source) or (key, source, converter); a source may feed several keys
+        self.keys = tuple(field[0] for field in fields)
+        self.sources = tuple(dict.fromkeys(field[1] for field in fields))
+        positions = [self.sources.index(field[1]) for field in fields]
+        # Only needed when a source is repeated; otherwise tuples line up with keys
+        self._positions = None if len(positions) == len(self.sources) else tuple(positions)
+        # Positions that need converting; everything else is copied as-is
+        self._converted = tuple(
+            (i, field[2]) for i, field in enumerate(fields) if len(field) > 2 and field[2] is not None)
+
+    def _from_tuple(self, row):
+        if self._positions is not None:
+            row = [row[p] for p in self._positions]
+        if self._converted:
+            row = list(row)
+            for i, fn in self._converted:
+                row[i] = fn(row[i])
+        return dict(zip(self.keys, row))
+
+    def rows(self, queryset):
+        """Serialize every row of `queryset` (ordering/slicing already applied)."""
+        from_tuple = self._from_tuple
+        return [from_tuple(row) for row in queryset.values_list(*self.sources)]
+
+    def first(self, queryset):
+        """Serialize the first row of `queryset`, or return None if it is empty."""
+        row = queryset.values_list(*self.sources).first()
+        return self._from_tuple(row) if row is not None else None
+
+    def values(self, queryset):
+        """`queryset.values(...)` with the source fields, for cursor pagination."""
+        return queryset.values(*self.sources)
+
+    def from_dict(self, row):
+        return self._from_tuple([row[source] for source in self.sources])
+
+    def from_instance(self, instance):
+        # Only for shapes whose sources are plain attributes of the instance
+        return self._from_tuple([getattr(instance, source) for source in self.sources])
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in for JsonResponse (dict or list data) with a faster encoder."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def dumps(data):
+    if orjson is not None:
+        # Datetimes/Decimals that weren't converted keep DjangoJSONEncoder formatting
+        return orjson.dumps(data, default=_django_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+# --- Response Shapes --- #
+
+# Owner list rows (values() + DjangoJSONEncoder before)
+OWNER_ROW = RowSerializer(
+    ('id', 'id'), ('last_name', 'last_name'), ('first_name', 'first_name'), ('email', 'email'),
+    ('telephone', 'telephone'), ('address', 'address'), ('comments', 'comments'),
+    ('created_at', 'created_at', js_datetime), ('updated_at', 'updated_at', js_datetime),
+)
+
+# Owner detail/create/update: the editable fields, as model_to_dict() returned them
+OWNER_FORM = RowSerializer(
+    ('id', 'id'), ('last_name', 'last_name'), ('first_name', 'first_name'), ('email', 'email'),
+    ('telephone', 'telephone'), ('address', 'address'), ('comments', 'comments'),
+)
+
+# Patient list rows, from the PatientListEntry read model
+PATIENT_ROW = RowSerializer(
+    ('id', 'pk'), ('name', 'name'), ('owner_id', 'owner_id'), ('owner_name', 'owner_name'),
+    ('species_code', 'species_code'), ('breed_id', 'breed_id'), ('breed_name', 'breed_name'),
+    ('sex', 'sex'), ('intact', 'intact'), ('date_of_birth', 'date_of_birth', iso),
+    ('weight', 'weight', decimal_str), ('created_at', 'created_at', iso), ('updated_at', 'updated_at', iso),
+)
+
+# Patient detail (edit form); `owner_name` is annotated by the view
+PATIENT_DETAIL = RowSerializer(
+    ('id', 'id'), ('owner', 'owner_id'), ('name', 'name'), ('species', 'species__code'),
+    ('breed', 'breed_id'), ('sex', 'sex'), ('intact', 'intact'),
+    ('date_of_birth', 'date_of_birth', iso), ('weight', 'weight', decimal_str),
+    ('owner_name', 'owner_name'), ('species_code', 'species__code'), ('breed_name', 'breed__name'),
+    ('created_at', 'created_at', iso), ('updated_at', 'updated_at', iso),
+)
+
+# Case rows of the changes feed
+CASE_ROW = RowSerializer(
+    ('id', 'id'), ('owner_id', 'owner_id'), ('patient_id', 'patient_id'), ('case_date', 'case_date', iso),
+    ('complaint', 'complaint'), ('history', 'history'),
+    ('created_at', 'created_at', iso), ('updated_at', 'updated_at', iso),
+)
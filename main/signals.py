@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Owner, Species, Breed, Patient, Case
+from . import search, counts, readmodel, changes, live
+from .typeahead import owner_index
+
+# --- Change Notifications --- #
+
+# Sent whenever rows of one of our models are written. post_save/post_delete are
+# forwarded here automatically; bulk paths (bulk_create, bulk_update, queryset
+# updates) don't fire those, so they must call notify_rows_changed() themselves.
+# Receivers get: sender (model class), ids (list of pks), action ('created',
+# 'updated' or 'deleted').
+rows_changed = Signal()
+
+TRACKED_MODELS = (Owner, Species, Breed, Patient, Case)
+
+
+def notify_rows_changed(model, ids, action='updated'):
+    """Tell every index/cache that `ids` of `model` were created, updated or deleted."""
+    ids = [pk for pk in ids if pk is not None]
+    if ids:
+        rows_changed.send(sender=model, ids=ids, action=action)
+
+
+@receiver(post_save)
+def _forward_post_save(sender, instance, created, raw=False, **kwargs):
+    if sender in TRACKED_MODELS and not raw:
+        notify_rows_changed(sender, [instance.pk], 'created' if created else 'updated')
+
+
+@receiver(post_delete)
+def _forward_post_delete(sender, instance, **kwargs):
+    if sender in TRACKED_MODELS:
+        notify_rows_changed(sender, [instance.pk], 'deleted')
+
+
+# --- Full-Text Search Index --- #
+
+@receiver(rows_changed)
+def _update_search_index(sender, ids, action, **kwargs):
+    if not search.is_available():
+        return
+    if sender is Owner:
+        if action == 'deleted':
+            search.remove_owners(ids)  # Patients are removed by their own cascade signals
+        else:
+            search.index_owners(ids)
+            if action == 'updated':
+                search.index_patients_for_owners(ids)  # Owner names are copied into the patient index
+    elif sender is Patient:
+        if action == 'deleted':
+            search.remove_patients(ids)
+        else:
+            search.index_patients(ids)
+    elif sender is Species and action == 'updated':
+        search.index_patients_for_species(ids)  # Species codes are copied into the patient index
+    elif sender is Breed and action == 'updated':
+        search.index_patients_for_breeds(ids)
+
+
+# --- Patient Read Model (same transaction as the write) --- #
+
+@receiver(rows_changed)
+def _update_patient_read_model(sender, ids, action, **kwargs):
+    if sender is Patient:
+        if action == 'deleted':
+            readmodel.remove_patients(ids)
+        else:
+            readmodel.refresh_patients(ids)
+    elif action == 'updated':
+        # Names copied into the entries; creates have no patients yet and
+        # deletes cascade (owners) or are protected (species, breeds)
+        if sender is Owner:
+            readmodel.refresh_for('owner', ids)
+        elif sender is Species:
+            readmodel.refresh_for('species', ids)
+        elif sender is Breed:
+            readmodel.refresh_for('breed', ids)
+
+
+# --- Row Counters / Count Cache Invalidation --- #
+
+@receiver(rows_changed)
+def _update_table_counter(sender, ids, action, **kwargs):
+    if action == 'created':
+        counts.record_change(sender, created=len(ids))
+    elif action == 'deleted':
+        counts.record_change(sender, deleted=len(ids))
+    else:
+        counts.record_change(sender)
+
+
+# --- Tombstones for the Changes Feed (same transaction as the delete) --- #
+
+@receiver(rows_changed)
+def _record_tombstones(sender, ids, action, **kwargs):
+    if action == 'deleted':
+        changes.record_deletes(sender, ids)
+
+
+# --- Owner Autocomplete Index (per process, after commit) --- #
+
+@receiver(rows_changed)
+def _update_owner_typeahead(sender, ids, action, **kwargs):
+    if sender is Owner:
+        transaction.on_commit(lambda: owner_index.apply_changes(ids, deleted=(action == 'deleted')))
+
+
+# --- Live Change Events for the List Pages (after commit, see main/live.py) --- #
+
+@receiver(rows_changed)
+def _publish_live_event(sender, ids, action, **kwargs):
+    if sender in changes.FEED_MODELS:
+        transaction.on_commit(lambda: live.publish(sender, ids, action))
@@ -0,0 +1,751 @@
+"""
+Staged import sessions: the CSV is uploaded, decoded and validated once.
+
+The preview step (Owner/PatientImportPreviewView) stores the upload in
+IMPORT_JOB_DIR and answers from the head of the file: the sample rows come
+from the first few KB, and the record count from a chunked, quote-aware byte
+scan (exact up to EXACT_COUNT_MAX_BYTES, estimated from the first
+APPROX_SAMPLE_BYTES above that). Small uploads are also validated right away;
+larger ones when first needed (execute, background job or row index). The
+validation pass walks the file a single time with the importer's own row
+validation (OwnerImporter.parse_owner / PatientImporter.parse_row), writing:
+
+* stage-<token>.csv        the upload, for the row index endpoint
+* stage-<token>.rows.jsonl validated rows, typed, one JSON array per batch
+* stage-<token>.offsets    byte offset of every data row (int64 array)
+* stage-<token>.status     one byte per data row: 0 valid, 1 invalid
+* stage-<token>.errors.jsonl every row error (see main/reports.py)
+* stage-<token>.json       metadata: headers, header map, counts, row errors
+
+Execute (synchronous view or background job) then takes the session token
+instead of the file and feeds the validated rows to importer.run_staged():
+no second upload, no CSV decoding, no re-validation. Validation errors found
+while staging are carried into the import result and its error report. Checks that depend on the
+database at execute time (duplicates, existing owners, breeds) still run then.
+
+Sessions are removed after a successful import and expire after STAGE_TTL.
+"""
+import array
+import codecs
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from datetime import date, datetime
+
+import django
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.urls import reverse
+
+from . import importing, reference, reports
+
+# Seconds a staged session is kept (it is removed earlier once imported)
+STAGE_TTL = 6 * 60 * 60
+PREVIEW_ROW_COUNT = 10
+# Row errors listed in the session summary (all are kept for the index)
+SUMMARY_ERRORS = 20
+# Uploads up to this size are validated by the preview request itself
+INLINE_VALIDATE_MAX_BYTES = 4 * 1024 * 1024
+# Record count: exact scan up to this size, estimate from a sample above it
+EXACT_COUNT_MAX_BYTES = 128 * 1024 * 1024
+APPROX_SAMPLE_BYTES = 8 * 1024 * 1024
+SCAN_CHUNK_BYTES = 4 * 1024 * 1024
+HEAD_BYTES = 64 * 1024
+# Smaller files are validated in one process even if IMPORT_VALIDATION_PROCESSES > 1
+SHARD_MIN_BYTES = 32 * 1024 * 1024
+# Seconds between heartbeat calls while waiting for the validation processes
+HEARTBEAT_SECONDS = 5
+
+_TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+_SUFFIXES = ('.csv', '.rows.jsonl', '.offsets', '.status', '.errors.jsonl', '.json')
+_DOB_INDEX = importing.PatientRow._fields.index('date_of_birth')
+# A newline followed by another line ending: a blank line (skipped by csv.reader)
+_BLANK_LINE_RE = re.compile(rb'\n(?=\r?\n)')
+
+
+class StagingError(Exception):
+    """Problem with the uploaded file or session; the message is shown to the user."""
+
+
+def _path(token, suffix):
+    return os.path.join(settings.IMPORT_JOB_DIR, f'stage-{token}{suffix}')
+
+
+class _CountingLines:
+    """Line iterator over a binary file that counts the bytes handed out (up to `limit` bytes)."""
+
+    def __init__(self, f, limit=None):
+        self._f = f
+        self.limit = limit
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for line in self._f:
+            self.bytes_read += len(line)
+            yield line
+            if self.limit is not None and self.bytes_read >= self.limit:
+                return
+
+
+def _header_error(kind, headers):
+    # Same messages the preview views always returned
+    required = {'last_name'} if kind == 'owners' else importing.PatientImporter.REQUIRED_HEADERS
+    missing = required - set(headers)
+    if missing:
+        return f'Missing required columns: {", ".join(missing)}.'
+    if kind == 'patients' and not ('date_of_birth' in headers or 'age_years' in headers):
+        return 'Missing required column: Must include either "date_of_birth" or "age_years".'
+    return None
+
+
+# --- Row Encoding (rows file) --- #
+
+def _encode(kind, row_num, parsed):
+    if kind == 'owners':
+        created_at = parsed[6]
+        return [row_num, *parsed[:6], created_at.isoformat() if created_at else None]
+    row = list(parsed)
+    row[_DOB_INDEX] = row[_DOB_INDEX].isoformat()
+    return row
+
+
+def _decode(kind, row):
+    if kind == 'owners':
+        created_at = row[7]
+        return row[0], (*row[1:7], datetime.fromisoformat(created_at) if created_at else None)
+    row[_DOB_INDEX] = date.fromisoformat(row[_DOB_INDEX])
+    return row[0], importing.PatientRow._make(row)
+
+
+# --- Record Count --- #
+
+class _LineScanner:
+    """
+    Counts CSV lines in binary chunks fed in file order, without decoding.
+    Newlines inside quoted fields are not line ends: the quote state is
+    carried from chunk to chunk. Safe on UTF-8 bytes, where '"' and '\\n'
+    never occur inside a multi-byte character.
+    """
+
+    def __init__(self, at_line_start=False):
+        self.in_quotes = False
+        self.newlines = 0
+        self.blank = 0 # Blank lines (skipped by csv.reader)
+        # Line ending at the end of the previous chunk's unquoted text
+        self._tail = b'\n' if at_line_start else b''
+
+    def feed(self, chunk):
+        if b'"' not in chunk:
+            if self.in_quotes: # Whole chunk is inside one quoted field
+                return
+            text = chunk
+        else:
+            # Alternating unquoted/quoted text, starting in the current state.
+            # An escaped quote ("") just flips the state twice.
+            parts = chunk.split(b'"')
+            text = b'"'.join(parts[1 if self.in_quotes else 0::2])
+            if len(parts) % 2 == 0:
+                self.in_quotes = not self.in_quotes
+        self.newlines += text.count(b'\n')
+        tail = self._tail
+        if tail:
+            text = tail + text
+        if tail or b'\n\n' in text or b'\n\r\n' in text:
+            self.blank += len(_BLANK_LINE_RE.findall(text))
+        self._tail = b''
+        if not self.in_quotes:
+            if text.endswith(b'\n'):
+                self._tail = b'\n'
+            elif text.endswith(b'\n\r'):
+                self._tail = b'\n\r'
+
+    def row_end(self, block):
+        """Index just past the first line end outside quotes in `block` (read from the current state), or -1."""
+        in_quotes = self.in_quotes
+        position = 0
+        while True:
+            if in_quotes:
+                quote = block.find(b'"', position)
+                if quote == -1:
+                    return -1
+                position, in_quotes = quote + 1, False
+                continue
+            newline = block.find(b'\n', position)
+            quote = block.find(b'"', position)
+            if quote != -1 and (newline == -1 or quote < newline):
+                position, in_quotes = quote + 1, True
+            elif newline != -1:
+                return newline + 1
+            else:
+                return -1
+
+
+def _scan_lines(f, limit=None):
+    """(lines, blank lines, bytes scanned) of a binary CSV file, read in SCAN_CHUNK_BYTES chunks."""
+    scanner = _LineScanner()
+    scanned = 0
+    last = b''
+    while limit is None or scanned < limit:
+        chunk = f.read(SCAN_CHUNK_BYTES)
+        if not chunk:
+            break
+        scanned += len(chunk)
+        last = chunk[-1:]
+        scanner.feed(chunk)
+    # A last line without a line ending is a line too
+    lines = scanner.newlines + (1 if last and last != b'\n' else 0)
+    return lines, scanner.blank, scanned
+
+
+def count_records(path, mode='auto'):
+    """
+    (data records, exact) of the CSV at `path`, without decoding it. `mode`:
+    'exact', 'approx' (extrapolated from the first APPROX_SAMPLE_BYTES) or
+    'auto' (exact up to EXACT_COUNT_MAX_BYTES).
+    """
+    size = os.path.getsize(path)
+    if mode == 'auto':
+        mode = 'exact' if size <= EXACT_COUNT_MAX_BYTES else 'approx'
+    limit = APPROX_SAMPLE_BYTES if mode == 'approx' else None
+    with open(path, 'rb') as f:
+        lines, blank, scanned = _scan_lines(f, limit)
+    records = lines - blank - 1 # Minus the header
+    if scanned < size:
+        # Estimate from the sample's bytes per line (the header counts as a line)
+        return max(round((lines - blank) * size / scanned) - 1, 0), False
+    return max(records, 0), True
+
+
+# --- Preview (head of the file) --- #
+
+def _read_head(kind, path):
+    """
+    (headers, sample rows) from the start of the file, reading only as much
+    as the first PREVIEW_ROW_COUNT rows need. Raises StagingError with the
+    messages the full validation pass would give for the header and sample.
+    """
+    size = os.path.getsize(path)
+    head_bytes = HEAD_BYTES
+    with open(path, 'rb') as f:
+        while True:
+            f.seek(0)
+            data = f.read(head_bytes)
+            at_end = len(data) >= size
+            # final=False: a multi-byte character cut at the end is held back
+            text = codecs.getincrementaldecoder('utf-8-sig')().decode(data, final=at_end)
+            rows = []
+            try:
+                for cells in csv.reader(io.StringIO(text)):
+                    rows.append(cells)
+            except csv.Error:
+                if at_end:
+                    raise
+            if not at_end:
+                rows = rows[:-1] # The last one may be cut off
+            data_rows = [cells for cells in rows[1:] if cells] # Blank lines are skipped
+            if at_end or len(data_rows) >= PREVIEW_ROW_COUNT:
+                break
+            head_bytes *= 4
+
+    if not rows:
+        raise StagingError('CSV file is empty or contains only a header.')
+    headers = [h.strip().lower() for h in rows[0]]
+    header_error = _header_error(kind, headers)
+    if header_error:
+        raise StagingError(header_error)
+    if not data_rows:
+        raise StagingError('CSV file contains only a header row.')
+
+    preview_rows = data_rows[:PREVIEW_ROW_COUNT]
+    row_num = 1
+    for cells in preview_rows:
+        row_num += 1
+        # Basic validation: check column count
+        if len(cells) != len(headers):
+            raise StagingError(f'Row {row_num} has incorrect number of columns ({len(cells)}). Expected {len(headers)}.')
+    return headers, preview_rows
+
+
+# --- Staging --- #
+
+def _store_upload(uploaded_file, path):
+    temporary_path = getattr(uploaded_file, 'temporary_file_path', None)
+    if temporary_path:
+        # Large uploads are already on disk: move instead of copying
+        file_move_safe(temporary_path(), path, allow_overwrite=True)
+        return
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+
+
+def _write_meta(token, meta):
+    # Atomic: a reader (or a second validation pass) never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=settings.IMPORT_JOB_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _path(token, '.json'))
+
+
+def stage(kind, uploaded_file, count='auto'):
+    """
+    Store an upload and read its head and record count (`count`: see
+    count_records); small files are validated too. Returns the StagedImport
+    (raises StagingError, UnicodeDecodeError).
+    """
+    return _stage(kind, uploaded_file.name, lambda csv_path: _store_upload(uploaded_file, csv_path), count)
+
+
+def stage_file(kind, path, file_name, count='auto'):
+    """stage() for a file already in IMPORT_JOB_DIR (a finished chunked upload), which is moved into the session."""
+    return _stage(kind, file_name, lambda csv_path: os.replace(path, csv_path), count)
+
+
+def _stage(kind, file_name, store, count):
+    cleanup_expired()
+    os.makedirs(settings.IMPORT_JOB_DIR, mode=0o700, exist_ok=True)
+    token = uuid.uuid4().hex
+    csv_path = _path(token, '.csv')
+    try:
+        store(csv_path)
+        headers, preview_rows = _read_head(kind, csv_path)
+        total_records, exact = count_records(csv_path, count)
+    except BaseException:
+        _discard(token)
+        raise
+    meta = {
+        'kind': kind,
+        'file_name': file_name,
+        'file_size': os.path.getsize(csv_path),
+        'created_at': time.time(),
+        'headers': headers,
+        'header_map': {name: i for i, name in enumerate(headers)},
+        'preview_rows': preview_rows,
+        'total_records': total_records,
+        'total_exact': exact,
+        'validated': False,
+    }
+    session = StagedImport(token, meta)
+    try:
+        if meta['file_size'] <= INLINE_VALIDATE_MAX_BYTES:
+            session.validate()
+        else:
+            _write_meta(token, meta)
+    except BaseException:
+        _discard(token)
+        raise
+    return session
+
+
+# --- Validation --- #
+
+def _validate(kind, token, processes=None, heartbeat=None):
+    """
+    Full validation pass; writes the rows, offsets and status files and returns
+    the metadata it adds. With IMPORT_VALIDATION_PROCESSES (or `processes`) > 1,
+    files of SHARD_MIN_BYTES or more are split into byte ranges on row
+    boundaries and validated by a process pool; the results are merged in file
+    order, so the session is the same as from a single-process pass.
+    `heartbeat()` is called every batch (every HEARTBEAT_SECONDS while the pool
+    works) so a background job can show it is alive; it may raise to stop.
+    """
+    processes = settings.IMPORT_VALIDATION_PROCESSES if processes is None else processes
+    heartbeat = heartbeat or (lambda: None)
+    csv_path = _path(token, '.csv')
+    with open(csv_path, 'rb') as f:
+        lines = _CountingLines(f)
+        try:
+            headers = [h.strip().lower() for h in next(csv.reader(codecs.iterdecode(lines, 'utf-8-sig')))]
+        except StopIteration: # Handle empty file
+            raise StagingError('CSV file is empty or contains only a header.')
+        data_start = lines.bytes_read # csv.reader pulls lines one record at a time
+    header_error = _header_error(kind, headers)
+    if header_error:
+        raise StagingError(header_error)
+
+    # Taken here, once: workers get it pickled and never touch the database
+    snapshot = reference.get_snapshot() if kind == 'patients' else None
+    if processes > 1 and os.path.getsize(csv_path) >= SHARD_MIN_BYTES:
+        ranges = _shard_ranges(csv_path, data_start, processes, heartbeat)
+    else:
+        ranges = [(data_start, os.path.getsize(csv_path), 2)]
+
+    rows_paths = []
+    errors_paths = []
+    try:
+        for _ in ranges:
+            for paths in (rows_paths, errors_paths):
+                fd, path = tempfile.mkstemp(dir=settings.IMPORT_JOB_DIR, suffix='.tmp')
+                os.close(fd)
+                paths.append(path)
+        tasks = [(kind, csv_path, headers, start, end, row_num, snapshot, rows_path, errors_path)
+                 for (start, end, row_num), rows_path, errors_path in zip(ranges, rows_paths, errors_paths)]
+        if len(tasks) == 1:
+            results = [_validate_range(*tasks[0], heartbeat=heartbeat)]
+        else:
+            # spawn, not fork: the web process may be running import threads
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=django.setup) as pool:
+                futures = [pool.submit(_validate_range, *task) for task in tasks]
+                try:
+                    while wait(futures, timeout=HEARTBEAT_SECONDS, return_when=FIRST_EXCEPTION).not_done:
+                        heartbeat()
+                except BaseException:
+                    pool.shutdown(cancel_futures=True) # Shards already running still finish
+                    raise
+                results = [future.result() for future in futures]
+
+        # Merge in file order: counts add up, the first MAX_KEPT_ERRORS messages are kept
+        errors = importing.ErrorLog()
+        offsets = array.array('q')
+        status = bytearray()
+        error_rows = {} # row number -> index into errors.messages
+        for result in results:
+            kept_before = len(errors.messages)
+            for row_num, index in result['error_rows'].items():
+                if kept_before + index < errors.limit:
+                    error_rows[row_num] = kept_before + index
+            errors.count += result['error_count']
+            errors.messages.extend(result['errors'][:errors.limit - kept_before])
+            offsets.frombytes(result['offsets'])
+            status += result['status']
+        if not offsets:
+            raise StagingError('CSV file contains only a header row.')
+
+        # Written under temporary names: a concurrent pass (row index and job) may
+        # validate the same session, and readers only ever see complete files
+        for paths in (rows_paths, errors_paths):
+            with open(paths[0], 'ab') as merged_file:
+                for path in paths[1:]:
+                    with open(path, 'rb') as shard_file:
+                        shutil.copyfileobj(shard_file, merged_file, SCAN_CHUNK_BYTES)
+        for suffix, data in (('.offsets', offsets.tobytes()), ('.status', bytes(status))):
+            fd, tmp_path = tempfile.mkstemp(dir=settings.IMPORT_JOB_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, _path(token, suffix))
+        os.replace(rows_paths[0], _path(token, '.rows.jsonl'))
+        os.replace(errors_paths[0], _path(token, '.errors.jsonl'))
+    finally:
+        for path in rows_paths + errors_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    error_count, messages = errors.state()
+    return {
+        'total_records': len(offsets),
+        'total_exact': True,
+        'invalid_records': status.count(1),
+        'error_count': error_count,
+        'errors': messages,
+        'error_rows': error_rows,
+        # Species ids in the rows are only valid for this reference version
+        'reference_version': snapshot.version if snapshot else None,
+        'validated': True,
+    }
+
+
+def _shard_ranges(path, data_start, shards, heartbeat=None):
+    """
+    [(start, end, first row number)]: the data rows split into about `shards`
+    equal byte ranges, each starting on a row boundary. One quote-aware scan
+    up to the last boundary finds the boundaries and the row numbers.
+    """
+    size = os.path.getsize(path)
+    scanner = _LineScanner(at_line_start=True)
+    ranges = []
+    start, row_num = data_start, 2
+    position = data_start
+    with open(path, 'rb') as f:
+        f.seek(data_start)
+        for shard in range(1, shards):
+            target = data_start + (size - data_start) * shard // shards
+            while position < target:
+                chunk = f.read(min(SCAN_CHUNK_BYTES, target - position))
+                scanner.feed(chunk)
+                position += len(chunk)
+                if heartbeat is not None:
+                    heartbeat()
+            # Move on to the end of the row the target falls in
+            while True:
+                block = f.read(HEAD_BYTES)
+                if not block:
+                    break
+                end = scanner.row_end(block)
+                if end == -1:
+                    scanner.feed(block)
+                    position += len(block)
+                    continue
+                scanner.feed(block[:end])
+                position += end
+                f.seek(position)
+                break
+            if position >= size:
+                break
+            if position > start:
+                ranges.append((start, position, row_num))
+                start, row_num = position, 2 + scanner.newlines - scanner.blank
+    ranges.append((start, size, row_num))
+    return ranges
+
+
+def _validate_range(kind, csv_path, headers, start, end, row_num, snapshot, rows_path, errors_path, heartbeat=None):
+    """
+    Validate the rows in bytes [start, end) of the file, numbering them from
+    `row_num`; typed rows go to `rows_path`, every error to `errors_path`.
+    Runs in a pool worker for sharded validation, so everything it needs comes
+    in as (picklable) arguments; `heartbeat` is only passed in-process.
+    """
+    spool = reports.ErrorSpool(errors_path)
+    try:
+        importer = (importing.PatientImporter(snapshot=snapshot, spool=spool) if kind == 'patients'
+                    else importing.OwnerImporter(spool=spool))
+        return _validate_rows(importer, kind, csv_path, headers, start, end, row_num, rows_path, heartbeat)
+    finally:
+        spool.close()
+
+
+def _validate_rows(importer, kind, csv_path, headers, start, end, row_num, rows_path, heartbeat=None):
+    # _validate_range's pass, with the importer whose error spool it closes
+    header_map = {name: i for i, name in enumerate(headers)}
+    errors = importer.errors
+    offsets = array.array('q')
+    status = bytearray()
+    error_rows = {} # row number -> index into errors.messages
+    batch = [] # Cells of the rows read since the last validated batch
+    row_num -= 1
+
+    def validate_batch(rows_file):
+        # Column-wise (importing.parse_batch); each invalid row records exactly one error
+        first = row_num - len(batch) + 1
+        row_nums = list(range(first, row_num + 1))
+        before = errors.count
+        results = importing.parse_batch(importer, row_nums, importing.cell_columns(batch, header_map, importer.COLUMNS))
+        valid = []
+        for current, parsed in zip(row_nums, results):
+            if parsed is None:
+                status.append(1)
+                if before < errors.limit: # Message kept
+                    error_rows[current] = before
+                before += 1
+                continue
+            status.append(0)
+            valid.append(_encode(kind, current, parsed))
+        if valid:
+            rows_file.write(json.dumps(valid, separators=(',', ':')) + '\n')
+        batch.clear()
+        if heartbeat is not None:
+            heartbeat()
+
+    with open(csv_path, 'rb') as f, open(rows_path, 'w') as rows_file:
+        f.seek(start)
+        lines = _CountingLines(f, limit=end - start)
+        reader = csv.reader(codecs.iterdecode(lines, 'utf-8'))
+        while True:
+            offset = start + lines.bytes_read # csv.reader pulls lines one record at a time
+            try:
+                cells = next(reader)
+            except StopIteration:
+                break
+            if not cells:
+                continue # Blank line (skipped by the importers' DictReader too)
+            row_num += 1
+            offsets.append(offset)
+            batch.append(cells)
+            if len(batch) >= importing.IMPORT_BATCH_SIZE:
+                validate_batch(rows_file)
+        if batch:
+            validate_batch(rows_file)
+
+    error_count, messages = errors.state()
+    return {
+        'offsets': offsets.tobytes(),
+        'status': bytes(status),
+        'error_count': error_count,
+        'errors': messages,
+        'error_rows': error_rows,
+    }
+
+
+def load(token, kind=None):
+    """The StagedImport for `token` (raises StagingError if it is unknown, expired or not of `kind`)."""
+    if not _TOKEN_RE.match(token or ''):
+        raise StagingError('Invalid import session.')
+    try:
+        with open(_path(token, '.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise StagingError('Import session not found or expired. Please upload the file again.')
+    if kind is not None and meta['kind'] != kind:
+        raise StagingError('Import session is for a different import type.')
+    if meta['created_at'] < time.time() - STAGE_TTL:
+        _discard(token)
+        raise StagingError('Import session not found or expired. Please upload the file again.')
+    return StagedImport(token, meta)
+
+
+def _discard(token):
+    for suffix in _SUFFIXES:
+        try:
+            os.remove(_path(token, suffix))
+        except OSError:
+            pass
+
+
+def cleanup_expired():
+    """Remove sessions older than STAGE_TTL."""
+    cutoff = time.time() - STAGE_TTL
+    try:
+        names = os.listdir(settings.IMPORT_JOB_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith('stage-') and name.endswith('.csv'):
+            path = os.path.join(settings.IMPORT_JOB_DIR, name)
+            try:
+                expired = os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if expired:
+                _discard(name[len('stage-'):-len('.csv')])
+
+
+class StagedImport:
+    def __init__(self, token, meta):
+        self.token = token
+        self.meta = meta
+        self.kind = meta['kind']
+        self.bytes_read = 0 # Of the rows file, while run() reads it (job progress)
+
+    @property
+    def rows_path(self):
+        return _path(self.token, '.rows.jsonl')
+
+    @property
+    def csv_path(self):
+        return _path(self.token, '.csv')
+
+    def summary(self):
+        """JSON-ready description for the preview response (counts of invalid rows once validated)."""
+        meta = self.meta
+        validated = meta['validated']
+        return {
+            'token': self.token,
+            'kind': self.kind,
+            'file_name': meta['file_name'],
+            'file_size': meta['file_size'],
+            'headers': meta['headers'],
+            'header_map': meta['header_map'],
+            'total_records': meta['total_records'],
+            'total_exact': meta['total_exact'],
+            'validated': validated,
+            'valid_records': meta['total_records'] - meta['invalid_records'] if validated else None,
+            'invalid_records': meta['invalid_records'] if validated else None,
+            'errors': meta['errors'][:SUMMARY_ERRORS] if validated else [],
+            'error_count': meta['error_count'] if validated else None,
+            'expires_at': int(meta['created_at'] + STAGE_TTL),
+            'rows_url': reverse('import-session-rows', args=[self.token]),
+        }
+
+    def discard(self):
+        _discard(self.token)
+
+    def validate(self, heartbeat=None):
+        """
+        Run the validation pass if it hasn't run yet (call outside the import
+        transaction). `heartbeat()` is called while it runs (see _validate).
+        """
+        if self.meta['validated']:
+            return
+        try:
+            # Another request or the job may have validated it meanwhile
+            with open(_path(self.token, '.json')) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        if not stored.get('validated'):
+            stored = {**self.meta, **_validate(self.kind, self.token, heartbeat=heartbeat)}
+            _write_meta(self.token, stored)
+        self.meta = stored
+
+    # --- Executing --- #
+
+    def rows(self):
+        """(row_num, parsed row) pairs of the valid rows, in file order."""
+        with open(self.rows_path, 'rb') as f:
+            for line in f:
+                self.bytes_read += len(line)
+                for row in json.loads(line):
+                    yield _decode(self.kind, row)
+
+    def run(self, importer):
+        """Import the staged rows with `importer` (call inside the import transaction, after validate())."""
+        # Staging errors are part of the import's result and error report
+        importer.errors.restore(self.meta['error_count'], self.meta['errors'])
+        if importer.errors.spool is not None:
+            importer.errors.spool.extend(_path(self.token, '.errors.jsonl'))
+        rows = self.rows()
+        if self.kind == 'patients':
+            snapshot = reference.get_snapshot()
+            if snapshot.version != self.meta['reference_version']:
+                rows = self._recheck_species(rows, snapshot, importer.errors)
+        importer.run_staged(rows)
+
+    @staticmethod
+    def _recheck_species(rows, snapshot, errors):
+        # Species changed since staging: the stored ids may no longer exist
+        for row_num, row in rows:
+            species = snapshot.species(row.species_code)
+            if species is None:
+                errors.add(f"Row {row_num}: Species code '{row.species_code}' not found in database.")
+                continue
+            if species.pk != row.species_id:
+                row = row._replace(species_id=species.pk)
+            yield row_num, row
+
+    # --- Row Index --- #
+
+    def row_index(self, start=0, limit=50, only_invalid=False):
+        """
+        Rows from position `start` (0 = first data row): row number, byte offset,
+        validation status, error message (if kept) and the raw cells.
+        """
+        self.validate()
+        with open(_path(self.token, '.status'), 'rb') as f:
+            status = f.read()
+        if only_invalid:
+            positions = []
+            position = status.find(1, start)
+            while position != -1 and len(positions) < limit:
+                positions.append(position)
+                position = status.find(1, position + 1)
+        else:
+            positions = range(start, min(start + limit, len(status)))
+
+        error_rows = self.meta['error_rows']
+        messages = self.meta['errors']
+        index = []
+        with open(_path(self.token, '.offsets'), 'rb') as offsets_file, open(_path(self.token, '.csv'), 'rb') as csv_file:
+            for position in positions:
+                offsets_file.seek(position * 8)
+                offset = array.array('q', offsets_file.read(8))[0]
+                csv_file.seek(offset)
+                cells = next(csv.reader(codecs.iterdecode(csv_file, 'utf-8')), [])
+                row_num = position + 2
+                message = error_rows.get(str(row_num))
+                index.append({
+                    'row': row_num,
+                    'offset': offset,
+                    'valid': not status[position],
+                    'error': messages[message] if message is not None else None,
+                    'cells': cells,
+                })
+        return {'total_records': len(status), 'start': start, 'rows': index}
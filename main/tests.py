@@ -1,3 +1,396 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import bulk, changes, importing, listing, search, staging
+from .models import Breed, ImportCheckpoint, Owner, Patient, PatientListEntry, Species
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+def make_species(code):
+    # The migrations seed the common species
+    return Species.objects.get_or_create(code=code)[0]
+
+
+def make_patient(owner, name, species, breed, **fields):
+    values = {'sex': 'M', 'intact': True, 'date_of_birth': datetime.date(2020, 1, 1), 'weight': Decimal('10.00')}
+    values.update(fields)
+    return Patient.objects.create(owner=owner, name=name, species=species, breed=breed, **values)
+
+
+# --- CSV Scanning (main/staging.py) --- #
+
+# Quoted newlines (LF and CRLF), "" escapes, a quoted field that looks like a row,
+# blank lines and a last row without a line break
+TRICKY_ROWS = (
+    'last_name,first_name,comments\r\n'
+    'Smith,John,plain\r\n'
+    '"Jones","Ann","two\nlines"\r\n'
+    'Brown,Bob,"quoted ""word"", then\r\na CRLF"\n'
+    '\r\n'
+    'Green,,"Ends with a newline\n"\n'
+    '\n'
+    'White,Al,"x\n\n\ny,Fake,row\n"\r\n'
+    'Black,Kim,last'
+)
+
+
+def csv_records(text):
+    """The non-blank records of `text`, as the csv module reads them."""
+    return [row for row in csv.reader(io.StringIO(text, newline='')) if row]
+
+
+class CsvScanningTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, text):
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        return text.encode('utf-8')
+
+    def test_line_scanner_ignores_quoted_newlines_at_any_chunk_boundary(self):
+        data = self.write(TRICKY_ROWS)
+        expected = len(csv_records(TRICKY_ROWS))
+        for size in range(1, len(data) + 1):
+            with self.subTest(chunk_size=size):
+                scanner = staging._LineScanner(at_line_start=True)
+                for start in range(0, len(data), size):
+                    scanner.feed(data[start:start + size])
+                # The last row has no line break: one record more than the counted line ends
+                self.assertEqual(scanner.newlines - scanner.blank + 1, expected)
+
+    def test_count_records_matches_csv_module(self):
+        self.write(TRICKY_ROWS)
+        expected = len(csv_records(TRICKY_ROWS)) - 1 # Without the header
+        for size in (1, 2, 3, 7, 16, 64 * 1024):
+            with self.subTest(chunk_size=size), mock.patch.object(staging, 'SCAN_CHUNK_BYTES', size):
+                self.assertEqual(staging.count_records(self.path, 'exact'), (expected, True))
+
+    def test_shard_ranges_end_on_row_boundaries(self):
+        text = TRICKY_ROWS.split('\r\n', 1)[0] + '\r\n' + (TRICKY_ROWS.split('\r\n', 1)[1] + '\n') * 8
+        data = self.write(text)
+        data_start = data.index(b'\r\n') + 2
+        expected = csv_records(text)[1:]
+        for shards in range(2, 7):
+            with self.subTest(shards=shards), mock.patch.object(staging, 'SCAN_CHUNK_BYTES', 16), \
+                    mock.patch.object(staging, 'HEAD_BYTES', 8):
+                ranges = staging._shard_ranges(self.path, data_start, shards)
+                self.assertEqual(ranges[0][0], data_start)
+                self.assertEqual(ranges[-1][1], len(data))
+                records = []
+                for (start, end, row_num), following in zip(ranges, ranges[1:] + [None]):
+                    if following is not None:
+                        self.assertEqual(end, following[0]) # Contiguous
+                    # Every range starts on a row: its first row number follows the rows before it
+                    self.assertEqual(row_num, 2 + len(records))
+                    records += csv_records(data[start:end].decode('utf-8'))
+                self.assertEqual(records, expected)
+
+
+# --- Keyset Pagination (main/pagination.py, main/listing.py) --- #
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        dog, cat = make_species('DOG'), make_species('CAT')
+        lab = Breed.objects.get_or_create(species=dog, name='Labrador')[0]
+        mixed = Breed.objects.get_or_create(species=cat, name='Mixed')[0]
+        # Repeated values and NULLs in every sort column
+        owners = [
+            ('Brown', 'Ann', 'ann@example.com', '555-0100'),
+            ('Brown', None, None, None),
+            ('Brown', 'Ann', None, '555-0100'),
+            ('Adams', 'Zed', 'zed@example.com', None),
+            ('Clark', None, 'clark@example.com', '555-0101'),
+            ('Brown', 'Bob', 'bob@example.com', None),
+            ('Adams', None, None, None),
+            ('Clark', 'Ann', None, '555-0101'),
+            ('Adams', 'Ann', 'adams@example.com', '555-0099'),
+        ]
+        created = [Owner.objects.create(last_name=ln, first_name=fn, email=em, telephone=tel)
+                   for ln, fn, em, tel in owners]
+        for index, owner in enumerate(created):
+            for name in ('Rex', 'Tom')[:1 + index % 2]:
+                species, breed = (dog, lab) if index % 3 else (cat, mixed)
+                make_patient(owner, name, species, breed, sex='MF'[index % 2], intact=bool(index % 3),
+                             date_of_birth=datetime.date(2018 + index % 4, 1, 1))
+
+    def walk(self, queryset, ordering, per_page):
+        """Pages forwards to the end, then backwards from there; both as lists of pk lists."""
+        paginator = KeysetPaginator(queryset, ordering, per_page)
+        page = paginator.page()
+        self.assertFalse(page.has_previous)
+        forwards = [[row.pk for row in page.object_list]]
+        while page.has_next:
+            page = paginator.page(page.next_cursor)
+            forwards.append([row.pk for row in page.object_list])
+        backwards = [[row.pk for row in page.object_list]]
+        while page.has_previous:
+            page = paginator.page(page.prev_cursor)
+            backwards.append([row.pk for row in page.object_list])
+        return forwards, backwards[::-1]
+
+    def check_sorts(self, list_rows, sort_fields):
+        for sort_field in sorted(sort_fields):
+            for direction in ('asc', 'desc'):
+                params = QueryDict(f'sort={sort_field}&direction={direction}')
+                queryset, ordering = list_rows(params)[:2]
+                expected = list(queryset.values_list('pk', flat=True))
+                for per_page in (2, 3):
+                    with self.subTest(sort=sort_field, direction=direction, per_page=per_page):
+                        forwards, backwards = self.walk(queryset, ordering, per_page)
+                        self.assertEqual(sum(forwards, []), expected)
+                        self.assertEqual(backwards, forwards)
+
+    def test_owner_sorts_in_both_directions(self):
+        self.check_sorts(listing.owners, listing.OWNER_SORT_FIELDS)
+
+    def test_patient_sorts_in_both_directions(self):
+        # owner__last_name sorts on three columns (owner last name, first name, patient name)
+        self.check_sorts(listing.patients, listing.PATIENT_SORT_FIELDS)
+
+    def test_cursor_of_another_sort_is_rejected(self):
+        queryset, ordering, _ = listing.owners(QueryDict('sort=last_name&direction=asc'))
+        cursor = KeysetPaginator(queryset, ordering, 2).page().next_cursor
+        queryset, ordering, _ = listing.owners(QueryDict('sort=email&direction=asc'))
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(queryset, ordering, 2).page(cursor)
+
+
+# --- Chunked Imports (main/importing.py) --- #
+
+class _Stop(Exception):
+    pass
+
+
+@override_settings(IMPORT_CHUNK_PAUSE=0)
+class ChunkedImportTests(TestCase):
+    ROWS = [{'last_name': f'Owner{n}', 'first_name': 'Test', 'email': f'owner{n}@example.com'} for n in range(12)]
+
+    def test_resume_from_checkpoint(self):
+        calls = []
+
+        def progress(importer):
+            calls.append(importer.rows_read)
+            if len(calls) == 2:
+                raise _Stop # Stop after the second chunk is committed
+
+        with self.assertRaises(_Stop):
+            with importing.ChunkedCommit('owners', key='resume-test') as chunks:
+                importing.OwnerImporter(batch_size=5, progress=progress, chunks=chunks).run(self.ROWS)
+        # Rows 2-11 (two chunks) are kept, with the checkpoint after them
+        self.assertEqual(Owner.objects.count(), 10)
+        checkpoint = ImportCheckpoint.objects.get(key='resume-test')
+        self.assertEqual(checkpoint.row, 11)
+        self.assertEqual(checkpoint.counts['created_count'], 10)
+
+        with importing.ChunkedCommit('owners', key='resume-test') as chunks:
+            importer = importing.OwnerImporter(batch_size=5, chunks=chunks)
+            importer.run(self.ROWS)
+        result = importer.result()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['imported_count'], 12) # Counters carried over from the checkpoint
+        self.assertEqual(result['skipped_count'], 0)   # Committed rows aren't read again as duplicates
+        self.assertIn('Resumed after row 11', result['message'])
+        self.assertEqual(Owner.objects.count(), 12)
+        self.assertFalse(ImportCheckpoint.objects.filter(key='resume-test').exists())
+
+
+# --- Bulk Batches (main/bulk.py) --- #
+
+class BulkApplyTests(TestCase):
+    def setUp(self):
+        self.smith = Owner.objects.create(last_name='Smith', first_name='John', email='john@example.com')
+        self.jones = Owner.objects.create(last_name='Jones', first_name='Ann', email='ann@example.com')
+
+    def test_one_invalid_item_rejects_the_batch(self):
+        result = bulk.apply('owners', [
+            {'op': 'create', 'data': {'last_name': 'New'}},
+            {'op': 'update', 'id': self.smith.pk, 'data': {'last_name': 'Smythe', 'first_name': 'John'}},
+            {'op': 'create', 'data': {'first_name': 'No last name'}},
+            {'op': 'delete', 'id': self.jones.pk},
+        ])
+        self.assertFalse(result['success'])
+        self.assertEqual([item['success'] for item in result['results']], [True, True, False, True])
+        self.assertIn('last_name', result['results'][2]['errors'])
+        # Nothing was written
+        self.assertFalse(Owner.objects.filter(last_name='New').exists())
+        self.smith.refresh_from_db()
+        self.assertEqual(self.smith.last_name, 'Smith')
+        self.assertTrue(Owner.objects.filter(pk=self.jones.pk).exists())
+
+    def test_duplicate_of_existing_row_is_rejected(self):
+        result = bulk.apply('owners', [
+            {'op': 'create', 'data': {'last_name': 'SMITH', 'first_name': 'john', 'email': 'john@example.com'}},
+        ])
+        self.assertFalse(result['success'])
+        self.assertEqual(result['results'][0]['errors'], {'__all__': [bulk.DUPLICATE_OWNER_ERROR]})
+
+    def test_duplicates_within_the_batch_are_rejected(self):
+        data = {'last_name': 'Taylor', 'first_name': 'Sam'}
+        result = bulk.apply('owners', [{'op': 'create', 'data': data}, {'op': 'create', 'data': data}])
+        self.assertFalse(result['success'])
+        self.assertEqual([item['success'] for item in result['results']], [True, False])
+        self.assertFalse(Owner.objects.filter(last_name='Taylor').exists())
+
+    def test_identity_released_by_update_and_delete(self):
+        result = bulk.apply('owners', [
+            # Smith moves to a new identity and Jones is deleted, so both old identities are free
+            {'op': 'update', 'id': self.smith.pk,
+             'data': {'last_name': 'Smith', 'first_name': 'Johnny', 'email': 'john@example.com'}},
+            {'op': 'create', 'data': {'last_name': 'Smith', 'first_name': 'John', 'email': 'john@example.com'}},
+            {'op': 'delete', 'id': self.jones.pk},
+            {'op': 'create', 'data': {'last_name': 'Jones', 'first_name': 'Ann', 'email': 'ann@example.com'}},
+        ])
+        self.assertTrue(result['success'], result)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (2, 1, 1))
+        self.smith.refresh_from_db()
+        self.assertEqual(self.smith.first_name, 'Johnny')
+        self.assertTrue(Owner.objects.filter(first_name='John', pk=result['results'][1]['id']).exists())
+        self.assertFalse(Owner.objects.filter(pk=self.jones.pk).exists())
+        self.assertTrue(Owner.objects.filter(first_name='Ann', pk=result['results'][3]['id']).exists())
+
+    def test_patient_batch_is_all_or_nothing(self):
+        dog, cat = make_species('DOG'), make_species('CAT')
+        lab = Breed.objects.get_or_create(species=dog, name='Labrador')[0]
+        persian = Breed.objects.get_or_create(species=cat, name='Persian')[0]
+        rex = make_patient(self.smith, 'Rex', dog, lab)
+        data = {'owner': self.jones.pk, 'name': 'Rex', 'species': dog.code, 'breed': lab.pk, 'sex': 'F',
+                'intact': False, 'date_of_birth': '2021-05-01', 'weight': '12.5'}
+        result = bulk.apply('patients', [
+            {'op': 'update', 'id': rex.pk, 'data': data},
+            {'op': 'create', 'data': {**data, 'owner': self.smith.pk, 'breed': persian.pk}}, # Cat breed on a dog
+        ])
+        self.assertFalse(result['success'])
+        self.assertEqual([item['success'] for item in result['results']], [True, False])
+        self.assertIn('breed', result['results'][1]['errors'])
+        rex.refresh_from_db()
+        self.assertEqual(rex.owner_id, self.smith.pk)
+
+        result = bulk.apply('patients', [{'op': 'update', 'id': rex.pk, 'data': data}])
+        self.assertTrue(result['success'], result)
+        rex.refresh_from_db()
+        self.assertEqual((rex.owner_id, rex.sex, rex.weight), (self.jones.pk, 'F', Decimal('12.50')))
+        self.assertEqual(PatientListEntry.objects.get(pk=rex.pk).owner_last_name, 'Jones')
+
+
+# --- Changes Feed (main/changes.py) --- #
+
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        self.owners = [Owner.objects.create(last_name=f'Owner{n}') for n in range(5)]
+
+    def feed(self, token=None, limit=changes.DEFAULT_LIMIT):
+        page = changes.changes_since('owners', token, limit)
+        return [row['id'] for row in page['changes']], page['deleted'], page
+
+    def test_full_load_then_only_changes(self):
+        early = Owner.objects.create(last_name='Early')
+        early.delete() # A delete before the full load isn't reported to the new client
+        ids, deleted, page = self.feed()
+        self.assertEqual(ids, [owner.pk for owner in self.owners])
+        self.assertEqual(deleted, [])
+
+        ids, deleted, page = self.feed(page['next'])
+        self.assertEqual((ids, deleted), ([], []))
+
+        owner = self.owners[1]
+        owner.last_name = 'Renamed'
+        owner.save()
+        removed = self.owners[3].pk
+        self.owners[3].delete()
+        ids, deleted, page = self.feed(page['next'])
+        self.assertEqual((ids, deleted), ([owner.pk], [removed]))
+
+    def test_deleted_ids_are_reported(self):
+        token = self.feed()[2]['next']
+        removed = self.owners[2].pk
+        self.owners[2].delete()
+        ids, deleted, _ = self.feed(token)
+        self.assertEqual((ids, deleted), ([], [removed]))
+
+    def test_latest_starts_at_the_end(self):
+        page = changes.changes_since('owners', changes.LATEST)
+        self.assertEqual((page['changes'], page['deleted'], page['has_more']), ([], [], False))
+        added = Owner.objects.create(last_name='Added')
+        removed = self.owners[0].pk
+        self.owners[0].delete()
+        ids, deleted, _ = self.feed(page['next'])
+        self.assertEqual((ids, deleted), ([added.pk], [removed]))
+
+    def test_pages_with_limit(self):
+        ids, _, page = self.feed(limit=2)
+        seen = list(ids)
+        while page['has_more']:
+            ids, _, page = self.feed(page['next'], limit=2)
+            seen += ids
+        self.assertEqual(seen, [owner.pk for owner in self.owners])
+
+    def test_bad_tokens(self):
+        token = self.feed()[2]['next']
+        for bad in ('not a token', token[:-4]):
+            with self.subTest(token=bad), self.assertRaises(changes.InvalidToken):
+                changes.changes_since('owners', bad)
+        with self.assertRaises(changes.InvalidToken):
+            changes.changes_since('patients', token) # Another feed's token
+        issued = timezone.now() - datetime.timedelta(days=settings.CHANGES_TOMBSTONE_DAYS)
+        with self.assertRaises(changes.TokenExpired):
+            changes.changes_since('owners', changes._encode('owners', None, None, issued))
+
+
+# --- Full-Text Search Sync (main/search.py, main/signals.py) --- #
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        if not search.is_available():
+            self.skipTest('SQLite has no FTS5')
+        dog = make_species('DOG')
+        lab = Breed.objects.get_or_create(species=dog, name='Labrador')[0]
+        self.owner = Owner.objects.create(last_name='Whitfield', first_name='Grace')
+        self.patient = make_patient(self.owner, 'Biscuit', dog, lab)
+        self.species = dog
+
+    def owner_matches(self, query):
+        return list(search.filter_owners(Owner.objects.all(), query, ['last_name']).values_list('pk', flat=True))
+
+    def patient_matches(self, query, field):
+        queryset = PatientListEntry.objects.all()
+        return list(search.filter_patients(queryset, query, [field]).values_list('pk', flat=True))
+
+    def index_rows(self, table, row_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE rowid = %s', [row_id])
+            return cursor.fetchone()[0]
+
+    def test_owner_rename_updates_owner_and_patient_rows(self):
+        self.owner.last_name = 'Ashcombe'
+        self.owner.save()
+        self.assertEqual(self.owner_matches('Ashcombe'), [self.owner.pk])
+        self.assertEqual(self.owner_matches('Whitfield'), [])
+        self.assertEqual(self.patient_matches('Ashcombe', 'owner__last_name'), [self.patient.pk])
+        self.assertEqual(self.patient_matches('Whitfield', 'owner__last_name'), [])
+
+    def test_owner_delete_removes_owner_and_patient_rows(self):
+        owner_id, patient_id = self.owner.pk, self.patient.pk
+        self.owner.delete()
+        self.assertEqual(self.index_rows(search.OWNER_TABLE, owner_id), 0)
+        self.assertEqual(self.index_rows(search.PATIENT_TABLE, patient_id), 0)
+
+    def test_species_rename_updates_patient_rows(self):
+        self.species.code = 'CANINE'
+        self.species.save()
+        self.assertEqual(self.patient_matches('CANINE', 'species__code'), [self.patient.pk])
+        self.assertEqual(self.patient_matches('DOG', 'species__code'), [])
@@ -0,0 +1,230 @@
+"""
+In-memory prefix index for owner autocomplete.
+
+Each worker process keeps a sorted list of normalized keys (last name, first
+name, email and telephone digits) with the owner id alongside, so a lookup is a
+couple of bisects plus a short walk over the matching range: no SQL besides a
+single primary-key read of the Owner TableCounter to check freshness.
+
+Freshness:
+* Writes in this process update the index incrementally after commit
+  (see main.signals).
+* Writes from other processes are noticed through the Owner change version;
+  rows updated since the last sync are then reloaded, and a row-count mismatch
+  (deletes, back-dated imports) triggers a full rebuild.
+
+The sync watermark is the newest updated_at the index has actually read, not
+the clock: a writer in another process stamps its rows inside its transaction,
+so a row stamped before our clock reading may commit after it. SQLite writers
+are serialized, so nothing can commit behind the newest committed stamp (as in
+main/changes.py); SYNC_OVERLAP re-reads a little more to absorb clock skew
+between processes.
+
+An empty query (the dropdown opening) lists owners by (last name, first name),
+from a second sorted list kept alongside the keys.
+"""
+import threading
+import unicodedata
+import datetime
+from bisect import bisect_left, insort
+
+from .models import Owner
+from . import counts
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Batches larger than this rebuild the index instead of patching it row by row
+INCREMENTAL_LIMIT = 1000
+# Rows stamped this long before the watermark are read again on every sync
+SYNC_OVERLAP = datetime.timedelta(seconds=2)
+
+_FIELDS = ('id', 'last_name', 'first_name', 'email', 'telephone')
+_PHONE_CHARS = set('0123456789+-()./ ')
+
+
+def normalize(value):
+    """Lower-case and strip accents so 'Müller' and 'muller' share a key."""
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).lower().strip()
+
+
+def _phone_digits(value):
+    return ''.join(ch for ch in value or '' if ch.isdigit())
+
+
+def _owner_keys(last_name, first_name, email, telephone):
+    keys = {normalize(email), _phone_digits(telephone)}
+    for name in (normalize(last_name), normalize(first_name)):
+        keys.add(name)
+        keys.update(name.replace('-', ' ').split())  # 'van dyke' is also found by 'dyke'
+    keys.discard('')
+    return keys
+
+
+def _query_tokens(query):
+    query = query.strip()
+    if query and any(ch.isdigit() for ch in query) and set(query) <= _PHONE_CHARS:
+        return [_phone_digits(query)]  # '555-12 34' -> '5551234'
+    return [token for token in (normalize(t) for t in query.split()) if token]
+
+
+def _name_entry(pk, row):
+    # Sort entry of the empty-query order; first_name may be NULL
+    return (row[0], row[1] or '', pk)
+
+
+class OwnerPrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []    # sorted normalized keys
+        self._ids = []     # owner id for each key, same positions
+        self._owners = {}  # id -> (last_name, first_name, email, telephone)
+        self._by_name = [] # sorted (last_name, first_name, id), for empty queries
+        self._version = None
+        self._synced_at = None # newest updated_at read so far
+        self._stale = True # guarded by _lock: apply_changes also runs from on_commit in other threads
+
+    # --- Maintenance --- #
+
+    def rebuild(self):
+        keys = []
+        owners = {}
+        synced_at = None
+        version = counts.get_versions(Owner)[0]
+        rows = Owner.objects.values_list(*_FIELDS, 'updated_at').iterator(chunk_size=5000)
+        for pk, last_name, first_name, email, telephone, updated_at in rows:
+            owners[pk] = (last_name, first_name, email, telephone)
+            keys.extend((key, pk) for key in _owner_keys(last_name, first_name, email, telephone))
+            if synced_at is None or updated_at > synced_at:
+                synced_at = updated_at
+        keys.sort()
+        by_name = sorted(_name_entry(pk, row) for pk, row in owners.items())
+        with self._lock:
+            self._keys = [key for key, _ in keys]
+            self._ids = [pk for _, pk in keys]
+            self._owners = owners
+            self._by_name = by_name
+            self._version = version
+            self._synced_at = synced_at
+            self._stale = False
+
+    def _remove_locked(self, pk):
+        row = self._owners.pop(pk, None)
+        if row is None:
+            return
+        entry = _name_entry(pk, row)
+        position = bisect_left(self._by_name, entry)
+        if position < len(self._by_name) and self._by_name[position] == entry:
+            del self._by_name[position]
+        for key in _owner_keys(*row):
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == pk:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+    def _add_locked(self, pk, row):
+        self._owners[pk] = row
+        insort(self._by_name, _name_entry(pk, row))
+        for key in sorted(_owner_keys(*row)):
+            position = bisect_left(self._keys, key)
+            # Keep (key, id) order so duplicate keys stay sorted by id
+            while position < len(self._keys) and self._keys[position] == key and self._ids[position] < pk:
+                position += 1
+            self._keys.insert(position, key)
+            self._ids.insert(position, pk)
+
+    def apply_changes(self, ids, deleted=False):
+        """Patch the index for owners written in this process."""
+        with self._lock:
+            if self._stale:
+                return
+            if len(ids) > INCREMENTAL_LIMIT:
+                self._stale = True
+                return
+        rows = {} if deleted else {
+            pk: (last_name, first_name, email, telephone)
+            for pk, last_name, first_name, email, telephone in Owner.objects.filter(pk__in=ids).values_list(*_FIELDS)
+        }
+        with self._lock:
+            if self._stale: # A rebuild is due anyway
+                return
+            for pk in ids:
+                self._remove_locked(pk)
+                if pk in rows:
+                    self._add_locked(pk, rows[pk])
+
+    def _sync(self):
+        """Catch up with writes made by other processes since the last sync."""
+        with self._lock:
+            stale, current_version, synced_at = self._stale, self._version, self._synced_at
+        if stale:
+            self.rebuild()
+            return
+        version = counts.get_versions(Owner)[0]
+        if version == current_version:
+            return
+        changed = Owner.objects.all()
+        if synced_at is not None: # None: the table was empty at the last sync
+            changed = changed.filter(updated_at__gte=synced_at - SYNC_OVERLAP)
+        changed = list(changed.values_list('pk', 'updated_at'))
+        if len(changed) > INCREMENTAL_LIMIT:
+            self.rebuild()
+            return
+        self.apply_changes([pk for pk, _ in changed])
+        with self._lock:
+            count = len(self._owners)
+        if count != counts.total_count(Owner):
+            self.rebuild()
+            return
+        # Watermark: the newest stamp actually read (committed), never the clock
+        newest = max((updated_at for _, updated_at in changed), default=synced_at)
+        with self._lock:
+            self._version = version
+            self._synced_at = newest if synced_at is None or newest > synced_at else synced_at
+
+    # --- Lookup --- #
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to `limit` owner dicts whose keys prefix-match every word of `query`."""
+        self._sync()
+        tokens = _query_tokens(query)
+        with self._lock:
+            keys, ids, owners = self._keys, self._ids, self._owners
+            if not tokens:
+                candidates = (pk for _, _, pk in self._by_name) # By name, as the old minimal owner list
+                others = []
+            else:
+                # Walk the range of the most selective token, check the rest per owner
+                ranges = []
+                for token in tokens:
+                    start = bisect_left(keys, token)
+                    end = bisect_left(keys, token + '\uffff', start)
+                    ranges.append((end - start, start, end, token))
+                ranges.sort()
+                _, start, end, _ = ranges[0]
+                candidates = (ids[i] for i in range(start, end))
+                others = [token for _, _, _, token in ranges[1:]]
+
+            results = []
+            seen = set()
+            for pk in candidates:
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                row = owners[pk]
+                if others:
+                    owner_keys = _owner_keys(*row)
+                    if not all(any(key.startswith(token) for key in owner_keys) for token in others):
+                        continue
+                last_name, first_name, email, telephone = row
+                results.append({'id': pk, 'last_name': last_name, 'first_name': first_name,
+                                'email': email, 'telephone': telephone})
+                if len(results) >= limit:
+                    break
+        return results
+
+
+owner_index = OwnerPrefixIndex()
@@ -0,0 +1,222 @@
+"""
+Resumable chunked uploads for large import files.
+
+Instead of one multipart POST, the browser:
+
+1. POSTs the file name and size to /api/import-uploads/ and gets a token,
+   the chunk size and the chunk count;
+2. PUTs each chunk's raw bytes to .../chunks/<n>/ with its SHA-256 in the
+   X-Chunk-SHA256 header. Chunks are streamed straight into their place in
+   a preallocated file and only marked as received once the checksum matches.
+   They can be sent in any order and again after a failure;
+3. after a dropped connection, GETs the upload to see the missing chunks and
+   sends only those;
+4. POSTs .../finalize/ with the import kind: the file becomes a staged import
+   session (main/staging.py) and the response is the normal preview, so
+   execute and background jobs work exactly as for a regular upload.
+
+Files in IMPORT_JOB_DIR:
+
+* chunked-<token>.part    the file being assembled (sparse until complete)
+* chunked-<token>.chunks  one byte per chunk: 0 missing, 1 received
+* chunked-<token>.json    name, size, chunk size, created time
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.urls import reverse
+
+from . import staging
+
+# Seconds an unfinished upload is kept, to be resumed
+UPLOAD_TTL = 24 * 60 * 60
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024
+# Request body read size while streaming a chunk to disk
+READ_SIZE = 256 * 1024
+
+_TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_SUFFIXES = ('.part', '.chunks', '.json')
+
+
+class UploadError(Exception):
+    """Problem with a chunked upload; the message is shown to the user."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _path(token, suffix):
+    return os.path.join(settings.IMPORT_JOB_DIR, f'chunked-{token}{suffix}')
+
+
+def create(file_name, file_size, chunk_size=None):
+    """Start an upload of `file_size` bytes; returns the ChunkedUpload (raises UploadError)."""
+    if not file_name or not file_name.lower().endswith('.csv'):
+        raise UploadError('Invalid file type. Please upload a .csv file.')
+    if file_size <= 0:
+        raise UploadError('CSV file is empty or contains only a header.')
+    if file_size > MAX_FILE_SIZE:
+        raise UploadError(f'File is too large (maximum {MAX_FILE_SIZE // (1024 * 1024)} MB).')
+    chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+    cleanup_expired()
+    os.makedirs(settings.IMPORT_JOB_DIR, mode=0o700, exist_ok=True)
+    token = uuid.uuid4().hex
+    meta = {
+        'file_name': os.path.basename(file_name),
+        'file_size': file_size,
+        'chunk_size': chunk_size,
+        'created_at': time.time(),
+    }
+    try:
+        with open(_path(token, '.part'), 'wb') as f:
+            f.truncate(file_size) # Sparse: chunks are written at their offsets
+        with open(_path(token, '.chunks'), 'wb') as f:
+            f.write(bytes(-(-file_size // chunk_size)))
+        with open(_path(token, '.json'), 'w') as f:
+            json.dump(meta, f)
+    except BaseException:
+        _discard(token)
+        raise
+    return ChunkedUpload(token, meta)
+
+
+def load(token):
+    """The ChunkedUpload for `token` (raises UploadError with status 404 if unknown or expired)."""
+    if not _TOKEN_RE.match(token or ''):
+        raise UploadError('Invalid upload.', status=404)
+    try:
+        with open(_path(token, '.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadError('Upload not found or expired. Please upload the file again.', status=404)
+    if meta['created_at'] < time.time() - UPLOAD_TTL:
+        _discard(token)
+        raise UploadError('Upload not found or expired. Please upload the file again.', status=404)
+    return ChunkedUpload(token, meta)
+
+
+def _discard(token):
+    for suffix in _SUFFIXES:
+        try:
+            os.remove(_path(token, suffix))
+        except OSError:
+            pass
+
+
+def cleanup_expired():
+    """Remove uploads older than UPLOAD_TTL."""
+    cutoff = time.time() - UPLOAD_TTL
+    try:
+        names = os.listdir(settings.IMPORT_JOB_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith('chunked-') and name.endswith('.json'):
+            try:
+                expired = os.path.getmtime(os.path.join(settings.IMPORT_JOB_DIR, name)) < cutoff
+            except OSError:
+                continue
+            if expired:
+                _discard(name[len('chunked-'):-len('.json')])
+
+
+class ChunkedUpload:
+    def __init__(self, token, meta):
+        self.token = token
+        self.meta = meta
+        self.total_chunks = -(-meta['file_size'] // meta['chunk_size'])
+
+    def chunk_length(self, index):
+        """Expected byte length of chunk `index` (the last one may be short)."""
+        start = index * self.meta['chunk_size']
+        return min(self.meta['chunk_size'], self.meta['file_size'] - start)
+
+    def _received(self):
+        with open(_path(self.token, '.chunks'), 'rb') as f:
+            return f.read()
+
+    def status(self):
+        """JSON-ready state of the upload; `missing_chunks` are the ones still to send."""
+        received = self._received()
+        missing = [index for index, done in enumerate(received) if not done]
+        return {
+            'token': self.token,
+            'file_name': self.meta['file_name'],
+            'file_size': self.meta['file_size'],
+            'chunk_size': self.meta['chunk_size'],
+            'total_chunks': self.total_chunks,
+            'received_chunks': self.total_chunks - len(missing),
+            'missing_chunks': missing,
+            'complete': not missing,
+            'expires_at': int(self.meta['created_at'] + UPLOAD_TTL),
+            'status_url': reverse('import-upload-detail', args=[self.token]),
+            # PUT chunk n to chunks_url + 'n/'
+            'chunks_url': reverse('import-upload-chunk', args=[self.token, 0])[:-len('0/')],
+            'finalize_url': reverse('import-upload-finalize', args=[self.token]),
+        }
+
+    def write_chunk(self, index, stream, content_length, checksum):
+        """
+        Stream chunk `index` from `stream` (the request body) to its offset in
+        the part file and mark it as received if its SHA-256 matches `checksum`.
+        Sending a chunk again is harmless.
+        """
+        if not 0 <= index < self.total_chunks:
+            raise UploadError(f'Chunk {index} is out of range (0-{self.total_chunks - 1}).')
+        checksum = (checksum or '').strip().lower()
+        if not _SHA256_RE.match(checksum):
+            raise UploadError('Missing or invalid X-Chunk-SHA256 header.')
+        expected = self.chunk_length(index)
+        if content_length != expected:
+            raise UploadError(f'Chunk {index} must be {expected} bytes (got {content_length}).')
+
+        # Missing until verified again: a failed re-send must not leave bad bytes marked as received
+        self._mark(index, b'\x00')
+        digest = hashlib.sha256()
+        written = 0
+        with open(_path(self.token, '.part'), 'r+b') as f:
+            f.seek(index * self.meta['chunk_size'])
+            while written < expected:
+                data = stream.read(min(READ_SIZE, expected - written))
+                if not data:
+                    break # Client went away; the chunk stays missing
+                digest.update(data)
+                f.write(data)
+                written += len(data)
+        if written != expected:
+            raise UploadError(f'Chunk {index} was incomplete ({written} of {expected} bytes). Please send it again.')
+        if digest.hexdigest() != checksum:
+            raise UploadError(f'Chunk {index} checksum mismatch. Please send it again.')
+
+        self._mark(index, b'\x01')
+
+    def _mark(self, index, flag):
+        # One byte per chunk: parallel chunk requests don't overwrite each other
+        with open(_path(self.token, '.chunks'), 'r+b') as f:
+            f.seek(index)
+            f.write(flag)
+
+    def finalize(self, kind, count='auto'):
+        """Turn the complete file into a staged import session (see staging.stage_file) and drop the upload."""
+        received = self._received()
+        missing = received.count(0)
+        if missing:
+            raise UploadError(f'Upload is incomplete: {missing} of {self.total_chunks} chunks are missing.', status=409)
+        try:
+            return staging.stage_file(kind, _path(self.token, '.part'), self.meta['file_name'], count=count)
+        finally:
+            self.discard()
+
+    def discard(self):
+        _discard(self.token)
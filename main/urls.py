@@ -8,9 +8,12 @@ urlpatterns = [
 
     # API URLs for Owner CRUD (AJAX)
     path('api/owners/', views.OwnerListCreateAPIView.as_view(), name='owner-list-api'),
+    path('api/owners/autocomplete/', views.OwnerAutocompleteAPIView.as_view(), name='owner-autocomplete-api'),
     path('api/owners/<int:pk>/', views.OwnerDetailView.as_view(), name='owner-detail'),
     path('api/owners/<int:pk>/update/', views.OwnerCreateUpdateView.as_view(), name='owner-update'),
     path('api/owners/<int:pk>/delete/', views.OwnerDeleteView.as_view(), name='owner-delete'),
+    path('api/owners/bulk/', views.BulkWriteView.as_view(kind='owners'), name='owner-bulk'), # Batch create/update/delete
+    path('api/owners/changes/', views.ChangesView.as_view(kind='owners'), name='owner-changes'), # Delta sync (?since=token)
 
     # URLs for Owner Import
     path('manage/owners/import/template/', views.OwnerImportTemplateView.as_view(), name='owner-import-template'),
@@ -21,6 +24,10 @@ urlpatterns = [
     path('api/species/', views.SpeciesListCreateView.as_view(), name='species-list-create'), # Handles GET & POST
     path('api/species/<str:code>/', views.SpeciesDeleteView.as_view(), name='species-delete'), # Handles DELETE
 
+    # Species -> breeds catalog (reference data)
+    path('api/reference/catalog/', views.ReferenceCatalogView.as_view(), name='reference-catalog'),
+    path('api/reference/cache-stats/', views.ReferenceCacheStatsView.as_view(), name='reference-cache-stats'),
+
     # Breed API
     path('api/breeds/', views.BreedListCreateView.as_view(), name='breed-list-create'), # Handles GET (list) & POST (create)
     path('api/breeds/<int:pk>/', views.BreedDeleteView.as_view(), name='breed-delete'),   # Handles DELETE
@@ -32,13 +39,43 @@ urlpatterns = [
     path('api/patients/<int:pk>/', views.PatientDetailView.as_view(), name='patient-detail'),
     path('api/patients/<int:pk>/update/', views.PatientCreateUpdateView.as_view(), name='patient-update'),
     path('api/patients/<int:pk>/delete/', views.PatientDeleteView.as_view(), name='patient-delete'),
+    path('api/patients/bulk/', views.BulkWriteView.as_view(kind='patients'), name='patient-bulk'), # Batch create/update/delete
+    path('api/patients/changes/', views.ChangesView.as_view(kind='patients'), name='patient-changes'), # Delta sync (?since=token)
 
     # URLs for Patient Import
     path('manage/patients/import/template/', views.PatientImportTemplateView.as_view(), name='patient-import-template'),
     path('manage/patients/import/preview/', views.PatientImportPreviewView.as_view(), name='patient-import-preview'),
     path('manage/patients/import/execute/', views.PatientImportExecuteView.as_view(), name='patient-import-execute'),
 
+    # Staged import sessions (created by the preview views)
+    path('api/import-sessions/<str:token>/', views.ImportSessionDetailView.as_view(), name='import-session-detail'),
+    path('api/import-sessions/<str:token>/rows/', views.ImportSessionRowsView.as_view(), name='import-session-rows'),
+
+    # Resumable chunked uploads of large import files; finalize returns the preview
+    path('api/import-uploads/', views.ImportUploadCreateView.as_view(), name='import-upload-create'),
+    path('api/import-uploads/<str:token>/', views.ImportUploadDetailView.as_view(), name='import-upload-detail'),
+    path('api/import-uploads/<str:token>/chunks/<int:index>/', views.ImportUploadChunkView.as_view(), name='import-upload-chunk'),
+    path('api/import-uploads/<str:token>/finalize/', views.ImportUploadFinalizeView.as_view(), name='import-upload-finalize'),
+
+    # Background imports: queue a job, then poll its status (or cancel it)
+    path('manage/owners/import/jobs/', views.ImportJobCreateView.as_view(kind='owners'), name='owner-import-job-create'),
+    path('manage/patients/import/jobs/', views.ImportJobCreateView.as_view(kind='patients'), name='patient-import-job-create'),
+    path('api/import-jobs/<int:pk>/', views.ImportJobDetailView.as_view(), name='import-job-detail'),
+    path('api/import-jobs/<int:pk>/cancel/', views.ImportJobCancelView.as_view(), name='import-job-cancel'),
+
+    # CSV of every failed row of an import (id from the import result)
+    path('api/import-reports/<str:report_id>/', views.ImportReportView.as_view(), name='import-report-download'),
+
+    # Streaming exports (?format=csv|ndjson plus the list API filter/sort parameters)
+    path('api/owners/export/', views.ExportView.as_view(kind='owners'), name='owner-export'),
+    path('api/patients/export/', views.ExportView.as_view(kind='patients'), name='patient-export'),
+    path('api/cases/export/', views.ExportView.as_view(kind='cases'), name='case-export'),
+
+    # Live change events for the list pages (Server-Sent Events, ASGI only)
+    path('api/live/', views.LiveEventsView.as_view(), name='live-events'),
+
     # Case URLs
     path('cases/create/', views.CreateCaseView.as_view(), name='case-create-page'), # Page to render the Vue app
     path('api/cases/create/', views.CaseCreateAPIView.as_view(), name='case-create-api'), # API endpoint for saving cases
+    path('api/cases/changes/', views.ChangesView.as_view(kind='cases'), name='case-changes'), # Delta sync (?since=token)
 ]
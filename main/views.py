@@ -1,24 +1,28 @@
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import ListView, View
-from django.http import JsonResponse, HttpResponse
-from django.forms.models import model_to_dict
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse, StreamingHttpResponse
 # Remove serialize import if no longer needed elsewhere
 # from django.core.serializers import serialize
 import json
 import csv
-import io
-from datetime import datetime
-from django.utils import timezone
+import os
 from django.db import transaction
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
-from django.db import IntegrityError
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Concat, Trim
+from django.db import IntegrityError, DatabaseError
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 
-from .models import Owner, Species, Breed, Patient, Case
-from .forms import OwnerForm, PatientForm, CaseForm
+from .models import Owner, Species, Breed, Patient, Case, ImportJob
+from .forms import OwnerForm, PatientForm, CaseForm, DUPLICATE_OWNER_ERROR, DUPLICATE_PATIENT_ERROR
+from .pagination import KeysetPaginator, InvalidCursor
+from .conditional import conditional_get, versioned_get, table_validators, row_validators, unvalidated
+from .serializers import FastJsonResponse, OWNER_ROW, OWNER_FORM, PATIENT_ROW, PATIENT_DETAIL
+from . import counts, typeahead, reference, importing, jobs, staging, uploads, reports, listing, exports, bulk, changes, live
 
 # Create your views here.
 def home(request):
@@ -27,6 +31,32 @@ def home(request):
 def manage(request):
     return render(request, 'manage.html')
 
+def keyset_page_response(queryset, ordering, per_page, cursor, serialize=None):
+    """
+    Build a list response for the opt-in `cursor=` mode of the list APIs: seeks on
+    `ordering` instead of OFFSET and skips the COUNT(*) entirely, so there are no
+    page/total fields, only opaque next/prev cursors.
+    """
+    paginator = KeysetPaginator(queryset, ordering, per_page)
+    try:
+        keyset_page = paginator.page(cursor)
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    results = keyset_page.object_list
+    if serialize:
+        results = [serialize(row) for row in results]
+
+    return FastJsonResponse({
+        'success': True,
+        'per_page': per_page,
+        'has_previous': keyset_page.has_previous,
+        'has_next': keyset_page.has_next,
+        'prev_cursor': keyset_page.prev_cursor,
+        'next_cursor': keyset_page.next_cursor,
+        'results': results,
+    })
+
 # View to render the owner list page structure (template renders Vue app)
 class OwnerListView(ListView):
     model = Owner
@@ -39,8 +69,9 @@ class OwnerListView(ListView):
 class OwnerListCreateAPIView(View):
     DEFAULT_PER_PAGE = 20
     MAX_PER_PAGE = 100
-    DEFAULT_FILTER_FIELDS = ['last_name', 'first_name', 'email', 'telephone', 'address', 'comments'] # Default fields to search
+    DEFAULT_FILTER_FIELDS = listing.OWNER_FILTER_FIELDS # Default fields to search
 
+    @method_decorator(conditional_get(*table_validators(Owner, name='owners')))
     def get(self, request, *args, **kwargs):
         # Get query parameters
         try:
@@ -55,50 +86,24 @@ class OwnerListCreateAPIView(View):
         elif per_page > self.MAX_PER_PAGE:
             per_page = self.MAX_PER_PAGE
 
-        # Get filter parameters
-        query = request.GET.get('query', '').strip()
-        filter_fields = request.GET.getlist('filter_fields')
-        if not filter_fields:
-            filter_fields = self.DEFAULT_FILTER_FIELDS
-
-        # Validate filter_fields against allowed fields
-        allowed_filter_fields = set(self.DEFAULT_FILTER_FIELDS)
-        valid_filter_fields = [f for f in filter_fields if f in allowed_filter_fields]
-        if not valid_filter_fields and query: # Only error/default if query is present
-            # Option 1: Error if query present but no valid fields selected
-            # return JsonResponse({'success': False, 'error': 'Please select valid fields to search.'}, status=400)
-            # Option 2: Default back to all searchable fields if query present
-             valid_filter_fields = self.DEFAULT_FILTER_FIELDS
-
-        # Get sort parameters
-        default_sort_field = 'updated_at'
-        allowed_sort_fields = {'last_name', 'first_name', 'email', 'telephone', 'updated_at'} # Add any other sortable fields
-        sort_field = request.GET.get('sort', default_sort_field).lower()
-        sort_direction = request.GET.get('direction', 'desc').lower()
-
-        # Validate sort parameters
-        if sort_field not in allowed_sort_fields:
-            sort_field = default_sort_field
-        if sort_direction not in ['asc', 'desc']:
-            sort_direction = 'desc'
-
-        # Get base queryset
-        owner_queryset = Owner.objects.all()
-
-        # Apply filters if query and valid fields are provided
-        if query and valid_filter_fields:
-            q_objects = Q()
-            for field_name in valid_filter_fields:
-                q_objects |= Q(**{f'{field_name}__icontains': query})
-            owner_queryset = owner_queryset.filter(q_objects)
-
-        # Apply dynamic ordering
-        order_by_string = f"{'-' if sort_direction == 'desc' else ''}{sort_field}"
-        # Add a secondary sort key (e.g., pk) for stable sorting if primary keys are equal
-        owner_queryset = owner_queryset.order_by(order_by_string, 'pk')
+        # Filtered (query, filter_fields) and sorted (sort, direction, then pk), see main/listing.py
+        owner_queryset, ordering, search_key = listing.owners(request.GET)
+
+        # Cursor mode: seek on (sort_field, pk) instead of OFFSET + COUNT
+        if 'cursor' in request.GET:
+            return keyset_page_response(
+                OWNER_ROW.values(owner_queryset), ordering,
+                per_page, request.GET.get('cursor'), serialize=OWNER_ROW.from_dict)
+
+        # Totals: counter row when unfiltered, cached count otherwise (see main/counts.py)
+        if search_key is not None:
+            total, total_exact = counts.filtered_count(owner_queryset, search_key, depends_on=[Owner])
+        else:
+            total, total_exact = counts.total_count(Owner), True
 
         # Paginate
         paginator = Paginator(owner_queryset, per_page)
+        paginator.count = total # Skip Paginator's own COUNT(*)
         try:
             owners_page = paginator.page(page)
         except PageNotAnInteger:
@@ -110,11 +115,8 @@ class OwnerListCreateAPIView(View):
             owners_page = paginator.page(paginator.num_pages)
             page = paginator.num_pages
 
-        # Serialize the data for the current page
-        results = list(owners_page.object_list.values(
-            'id', 'last_name', 'first_name', 'email', 'telephone', 'address', 'comments',
-            'created_at', 'updated_at' # Include timestamps if needed
-        ))
+        # Serialize the data for the current page (tuples -> dicts, see main/serializers.py)
+        results = OWNER_ROW.rows(owners_page.object_list)
 
         # Prepare JSON response with data and metadata
         data = {
@@ -123,11 +125,13 @@ class OwnerListCreateAPIView(View):
             'per_page': per_page,
             'total_pages': paginator.num_pages,
             'total_owners': paginator.count,
+            'total_exact': total_exact,
             'has_previous': owners_page.has_previous(),
             'has_next': owners_page.has_next(),
             'results': results,
         }
-        return JsonResponse(data, safe=False) # safe=False needed for list serialization if not using dict wrapper
+        response = FastJsonResponse(data)
+        return unvalidated(response) if not total_exact else response
 
     # --- POST method added for CREATING owners ---
     def post(self, request, *args, **kwargs):
@@ -141,13 +145,31 @@ class OwnerListCreateAPIView(View):
         form = OwnerForm(data)
 
         if form.is_valid():
-            owner = form.save()
+            try:
+                with transaction.atomic(): # Derived tables (search, read model, counters) commit with the row
+                    owner = form.save()
+            except IntegrityError: # Unique identity key: no existence check first
+                return JsonResponse({'success': False, 'errors': {'__all__': [DUPLICATE_OWNER_ERROR]}}, status=400)
             # Return the saved owner data as JSON (convert model instance to dict)
-            return JsonResponse({'success': True, 'owner': model_to_dict(owner)}, status=201) # Use 201 Created status
+            return FastJsonResponse({'success': True, 'owner': OWNER_FORM.from_instance(owner)}, status=201) # Use 201 Created status
         else:
             # Return form errors as JSON
             return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
+# API View for owner autocomplete (dropdowns in the case and patient modals)
+class OwnerAutocompleteAPIView(View):
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('query', request.GET.get('q', ''))
+        try:
+            limit = int(request.GET.get('limit', typeahead.DEFAULT_LIMIT))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid limit parameter.'}, status=400)
+        limit = min(max(limit, 1), typeahead.MAX_LIMIT)
+
+        # Served from the in-memory prefix index (see main/typeahead.py)
+        results = typeahead.owner_index.search(query, limit)
+        return JsonResponse({'success': True, 'results': results})
+
 # View to handle Owner Update via AJAX (Removed Create logic)
 class OwnerCreateUpdateView(View):
     def post(self, request, pk): # Expect pk for updates
@@ -167,13 +189,68 @@ class OwnerCreateUpdateView(View):
         form = OwnerForm(data, instance=owner)
 
         if form.is_valid():
-            owner = form.save()
+            try:
+                with transaction.atomic(): # Derived tables (search, read model, counters) commit with the row
+                    owner = form.save()
+            except IntegrityError: # Unique identity key
+                return JsonResponse({'success': False, 'errors': {'__all__': [DUPLICATE_OWNER_ERROR]}}, status=400)
             # Return the saved owner data as JSON (convert model instance to dict)
-            return JsonResponse({'success': True, 'owner': model_to_dict(owner)})
+            return FastJsonResponse({'success': True, 'owner': OWNER_FORM.from_instance(owner)})
         else:
             # Return form errors as JSON
             return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
+# Rows changed since a sync token, plus deletes (see main/changes.py)
+class ChangesView(View):
+    kind = None # 'owners', 'patients' or 'cases', set in urls.py
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.GET.get('limit', changes.DEFAULT_LIMIT))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid limit parameter.'}, status=400)
+        limit = min(max(limit, 1), changes.MAX_LIMIT)
+        try:
+            page = changes.changes_since(self.kind, request.GET.get('since'), limit)
+        except changes.TokenExpired as e:
+            return JsonResponse({'success': False, 'error': str(e), 'resync': True}, status=410)
+        except changes.InvalidToken as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return FastJsonResponse({'success': True, **page})
+
+# Live change events as Server-Sent Events (see main/live.py); ?kinds=owners,patients,cases
+class LiveEventsView(View):
+    async def get(self, request, *args, **kwargs):
+        kinds = [kind for kind in request.GET.get('kinds', ','.join(changes.FEEDS)).split(',') if kind]
+        invalid = [kind for kind in kinds if kind not in changes.FEEDS]
+        if invalid or not kinds:
+            return JsonResponse({'success': False, 'error': f'Invalid kinds: {", ".join(invalid) or "none given"}.'}, status=400)
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI an open stream would hold a worker thread for as long as the page is open
+            return JsonResponse({'success': False, 'error': 'Live updates need the ASGI server (pulsar.asgi).'}, status=501)
+        subscription = live.broker.subscribe(kinds, request.headers.get('Last-Event-ID'))
+        response = StreamingHttpResponse(live.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Don't let a proxy buffer the stream
+        return response
+
+# Batch create/update/delete of owners or patients (see main/bulk.py)
+class BulkWriteView(View):
+    kind = None # 'owners' or 'patients', set in urls.py
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+        operations = data.get('operations') if isinstance(data, dict) else None
+        try:
+            result = bulk.apply(self.kind, operations)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        # All or nothing: 400 with every item's result if anything failed
+        return JsonResponse(result, status=200 if result['success'] else 400)
+
 # View to handle Owner Delete via AJAX
 class OwnerDeleteView(View):
     def post(self, request, pk):
@@ -186,9 +263,89 @@ class OwnerDeleteView(View):
 
 # View to get Owner details via AJAX (for pre-filling edit form)
 class OwnerDetailView(View):
+     @method_decorator(conditional_get(*row_validators(Owner.objects, 'updated_at', name='owner')))
      def get(self, request, pk):
-        owner = get_object_or_404(Owner, pk=pk)
-        return JsonResponse(model_to_dict(owner))
+        owner = OWNER_FORM.first(Owner.objects.filter(pk=pk))
+        if owner is None:
+            raise Http404("No Owner matches the given query.")
+        return FastJsonResponse(owner)
+
+def staged_preview_response(request, kind):
+    """
+    Preview an owner/patient CSV from the head of the upload, with a byte-scan
+    record count (POST `count`: exact, approx or auto). The upload is stored as
+    a staged session (see main/staging.py); execute takes the session token.
+    """
+    if 'file' not in request.FILES:
+        return JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
+
+    file = request.FILES['file']
+    if not file.name.lower().endswith('.csv'):
+        return JsonResponse({'success': False, 'error': 'Invalid file type. Please upload a .csv file.'}, status=400)
+
+    return preview_response(kind, lambda: staging.stage(kind, file, count=request.POST.get('count', 'auto')))
+
+
+def preview_response(kind, stage):
+    """The preview JSON for the staged session `stage()` creates (a regular or a finished chunked upload)."""
+    try:
+        session = stage()
+    except staging.StagingError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except UnicodeDecodeError:
+         return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
+    except Exception as e:
+        print(f"Error during {kind} import preview: {e}") # Basic logging
+        return JsonResponse({'success': False, 'error': 'An unexpected error occurred while reading the file.'}, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'preview': {
+            'headers': session.meta['headers'], # Return the actual headers found in the file
+            'rows': session.meta['preview_rows'],
+        },
+        'total_records': session.meta['total_records'],
+        'total_exact': session.meta['total_exact'], # False: estimated from a sample (very large files)
+        'session': session.summary(),
+    })
+
+
+def import_source(request, kind):
+    """
+    (file, session, error response) for an execute request: either a staged
+    session `token` from the preview step or a re-uploaded `file`.
+    """
+    token = request.POST.get('token')
+    if token:
+        try:
+            return None, staging.load(token, kind), None
+        except staging.StagingError as e:
+            return None, None, JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if 'file' not in request.FILES:
+        return None, None, JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
+    file = request.FILES['file']
+    if not file.name.lower().endswith('.csv'):
+        return None, None, JsonResponse({'success': False, 'error': 'Invalid file type.'}, status=400)
+    return file, None, None
+
+def import_commit_mode(request):
+    """
+    (mode, error response) for an execute request: POST `commit` is 'chunked'
+    (commit every chunk, resumable) or 'atomic' (all or nothing); the default
+    is IMPORT_COMMIT_MODE. See importing.ChunkedCommit.
+    """
+    mode = request.POST.get('commit') or settings.IMPORT_COMMIT_MODE
+    if mode not in importing.COMMIT_MODES:
+        return None, JsonResponse({'success': False, 'error': 'commit must be "chunked" or "atomic".'}, status=400)
+    return mode, None
+
+
+def import_chunks(mode, kind, session):
+    """ChunkedCommit for an import in `mode` (resumable per staged session), or None for one transaction."""
+    if mode != importing.COMMIT_CHUNKED:
+        return None
+    return importing.ChunkedCommit(kind, key=session.token if session else None)
 
 # View to download the CSV template
 class OwnerImportTemplateView(View):
@@ -205,218 +362,61 @@ class OwnerImportTemplateView(View):
 
 # View to preview the uploaded CSV
 class OwnerImportPreviewView(View):
-    PREVIEW_ROW_COUNT = 10
-
     def post(self, request, *args, **kwargs):
-        if 'file' not in request.FILES:
-            return JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
-
-        file = request.FILES['file']
-        if not file.name.lower().endswith('.csv'):
-            return JsonResponse({'success': False, 'error': 'Invalid file type. Please upload a .csv file.'}, status=400)
-
-        required_headers = {'last_name'}
-        allowed_headers = {'last_name', 'first_name', 'email', 'telephone', 'address', 'comments', 'created_at'}
-        total_record_count = 0
-        preview_rows = []
-        headers = []
-
-        try:
-            decoded_file = file.read().decode('utf-8-sig')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.reader(io_string)
-
-            # Read header
-            try:
-                headers = next(reader)
-                headers = [h.strip().lower() for h in headers]
-            except StopIteration: # Handle empty file
-                 return JsonResponse({'success': False, 'error': 'CSV file is empty or contains only a header.'}, status=400)
-
-            # Validate Headers
-            actual_headers_set = set(headers)
-            if not required_headers.issubset(actual_headers_set):
-                missing = required_headers - actual_headers_set
-                return JsonResponse({'success': False, 'error': f'Missing required columns: {", ".join(missing)}.'}, status=400)
-
-            # Process rows: count all, preview first N
-            for i, row in enumerate(reader):
-                total_record_count += 1
-                if i < self.PREVIEW_ROW_COUNT:
-                    # Basic validation: check column count
-                    if len(row) != len(headers):
-                        return JsonResponse({'success': False, 'error': f'Row {i+2} has incorrect number of columns ({len(row)}). Expected {len(headers)}.'}, status=400)
-                    preview_rows.append(row)
-
-            # Check if any data rows were found
-            if total_record_count == 0:
-                 return JsonResponse({'success': False, 'error': 'CSV file contains only a header row.'}, status=400)
-
-            preview_data = {
-                'headers': headers,
-                'rows': preview_rows
-            }
-            return JsonResponse({
-                'success': True,
-                'preview': preview_data,
-                'total_records': total_record_count
-             })
-
-        except UnicodeDecodeError:
-             return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
-        except Exception as e:
-            print(f"Error during preview: {e}") # Basic logging
-            return JsonResponse({'success': False, 'error': 'An unexpected error occurred while reading the file.'}, status=500)
+        return staged_preview_response(request, 'owners')
 
 # View to execute the CSV import
 class OwnerImportExecuteView(View):
     def post(self, request, *args, **kwargs):
-        if 'file' not in request.FILES:
-            return JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
-
-        file = request.FILES['file']
-        if not file.name.lower().endswith('.csv'):
-            return JsonResponse({'success': False, 'error': 'Invalid file type.'}, status=400)
-
-        allowed_headers = {'last_name', 'first_name', 'email', 'telephone', 'address', 'comments', 'created_at'}
-        import_comment = "<Added through bulk import>"
-        created_count = 0
-        errors = []
-        skipped_duplicates = 0 # Keep track of duplicates
-
+        file, session, error_response = import_source(request, 'owners')
+        if error_response:
+            return error_response
+        mode, error_response = import_commit_mode(request)
+        if error_response:
+            return error_response
+
+        # Every row error is spooled to disk; the response links the full report (see main/reports.py)
+        report = reports.create(session.meta['file_name'] if session else file.name)
+        chunks = None
         try:
-            decoded_file = file.read().decode('utf-8-sig')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-
-            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-
-            actual_headers_set = set(reader.fieldnames)
-            if 'last_name' not in actual_headers_set:
-                 return JsonResponse({'success': False, 'error': 'Missing required column: last_name'}, status=400)
-
-            owners_to_create = []
-            current_time = timezone.now()
-
-            # --- Optimization: Fetch existing relevant owners upfront? ---
-            # For very large files, querying per row is inefficient.
-            # Consider fetching relevant existing owners into memory if performance becomes an issue.
-            # For now, we will query per row for simplicity.
-            # existing_owners = {(o.last_name, o.first_name or '', o.email or '')
-            #                    for o in Owner.objects.all()} # Example: Fetch all
-
-            for i, row in enumerate(reader): # reader is DictReader
-                row_num = i + 2
-                owner_data = {}
-                has_error = False
-
-                # Prepare data and handle case sensitivity/whitespace
-                ln = row.get('last_name', '').strip()
-                fn = row.get('first_name', '').strip()
-                em = row.get('email', '').strip()
-
-                # Required field check
-                if not ln:
-                    errors.append(f"Row {row_num}: Missing required value for last_name.")
-                    continue # Skip row
-
-                # --- Uniqueness Check --- (Case-insensitive example)
-                # Adjust filter based on how you want to handle nulls/blanks
-                # Treat empty strings from CSV as null/blank for matching
-                filter_kwargs = {
-                    'last_name__iexact': ln,
-                    'first_name__iexact': fn or '', # Match empty string if fn is empty
-                    'email__iexact': em or ''      # Match empty string if em is empty
-                }
-                # Use filter().exists() for efficiency
-                is_duplicate = Owner.objects.filter(**filter_kwargs).exists()
-
-                # Alternative check using pre-fetched set (if implemented):
-                # is_duplicate = (ln.lower(), (fn or '').lower(), (em or '').lower()) in existing_owners
-
-                if is_duplicate:
-                    skipped_duplicates += 1
-                    # Optional: Add to errors list if you want to report skipped rows
-                    # errors.append(f"Row {row_num}: Skipped duplicate owner ({ln}, {fn}, {em}).")
-                    continue # Skip this row
-
-                # --- Populate Owner Data (if not duplicate) ---
-                owner_data['last_name'] = ln
-                if fn: owner_data['first_name'] = fn
-                if em: owner_data['email'] = em
-
-                # Populate other allowed fields
-                for header in allowed_headers - {'last_name', 'first_name', 'email', 'created_at'}:
-                     if header in row:
-                         value = row[header].strip()
-                         if value:
-                             owner_data[header] = value
-
-                # Comments handling
-                existing_comment = owner_data.get('comments', '')
-                owner_data['comments'] = f"{existing_comment}\n{import_comment}".strip()
-
-                # created_at handling
-                created_at_str = row.get('created_at', '').strip()
-                parsed_created_at = None
-                if created_at_str:
-                    try:
-                        parsed_created_at = datetime.strptime(created_at_str, '%Y-%m-%d %H:%M:%S')
-                        if timezone.is_aware(current_time):
-                             parsed_created_at = timezone.make_aware(parsed_created_at, timezone.get_current_timezone())
-                    except ValueError:
-                        errors.append(f"Row {row_num}: Invalid format for created_at '{created_at_str}'. Expected YYYY-MM-DD HH:MM:SS.")
-                        has_error = True
-
-                if has_error:
-                    continue
-
-                owner = Owner(**owner_data)
-                if parsed_created_at:
-                    owner.created_at = parsed_created_at
-                    owner.updated_at = parsed_created_at
-
-                owners_to_create.append(owner)
-
-            # --- Bulk Create & Response Handling --- (remains largely the same)
-            if owners_to_create:
-                try:
-                    with transaction.atomic():
-                        Owner.objects.bulk_create(owners_to_create)
-                        created_count = len(owners_to_create)
-                except Exception as e:
-                    print(f"Bulk create error: {e}")
-                    return JsonResponse({'success': False, 'error': 'Database error during bulk import.'}, status=500)
-
-            # Adjust response message
-            response_message = f"Import finished. Imported: {created_count} new owners."
-            if skipped_duplicates > 0:
-                response_message += f" Skipped: {skipped_duplicates} duplicate owners."
-
-            if errors:
-                error_summary = "\n".join(errors[:10])
-                if len(errors) > 10:
-                    error_summary += f"\n...and {len(errors) - 10} more errors."
-                # Return success=False if there were validation errors, even if some were imported
-                return JsonResponse({
-                    'success': False,
-                    'error': f'{response_message}\n\nErrors found:\n{error_summary}',
-                    'imported_count': created_count,
-                    'skipped_count': skipped_duplicates
-                }, status=400)
+            # Chunked: each chunk commits on its own, so other users can save in between
+            chunks = import_chunks(mode, 'owners', session)
+            importer = importing.OwnerImporter(spool=report, chunks=chunks)
+            if session:
+                # Rows validated by the preview step, or now for large files (see main/staging.py)
+                session.validate()
+                run = lambda: session.run(importer)
             else:
-                return JsonResponse({
-                    'success': True,
-                    'message': response_message,
-                    'imported_count': created_count,
-                    'skipped_count': skipped_duplicates
-                })
+                # Decoded incrementally and imported in batches (see main/importing.py)
+                reader = importing.csv_dict_reader(file)
+                header_error = importing.OwnerImporter.missing_headers_error(reader.fieldnames)
+                if header_error:
+                     return JsonResponse({'success': False, 'error': header_error}, status=400)
+                run = lambda: importer.run(reader)
 
+            try:
+                with importing.import_transaction(chunks):
+                    run()
+            except DatabaseError as e:
+                print(f"Bulk create error: {e}")
+                return JsonResponse({'success': False, 'error': f'Database error during bulk import. {importing.stopped_note(chunks)}'}, status=500)
+
+            # success=False (400) if there were validation errors, even if some were imported
+            result = importer.result()
+            result.update(report.finish(session.csv_path if session else file))
+            if session:
+                session.discard() # Imported; executing it again would only report duplicates
+            return JsonResponse(result, status=200 if result['success'] else 400)
+
+        except staging.StagingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         except UnicodeDecodeError:
-             return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
+             return JsonResponse({'success': False, 'error': f'File encoding error. Please ensure the file is UTF-8 encoded. {importing.stopped_note(chunks)}'}, status=400)
         except Exception as e:
             print(f"Error during execute: {e}")
-            return JsonResponse({'success': False, 'error': 'An unexpected error occurred while importing the file.'}, status=500)
+            return JsonResponse({'success': False, 'error': f'An unexpected error occurred while importing the file. {importing.stopped_note(chunks)}'}, status=500)
+        finally:
+            report.close()
 
 # ==========================
 # Patient Views & API
@@ -428,19 +428,21 @@ class PatientListView(ListView):
     template_name = 'patient_list.html'
     # Vue app will handle data fetching
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Stamped into the species/breed API URLs so the browser can cache them (see main/reference.py)
+        context['reference_version'] = reference.reference_version()
+        return context
+
 # API View for Paginated Patients
 class PatientListAPIView(View):
     DEFAULT_PER_PAGE = 20
     MAX_PER_PAGE = 100
-    # Default fields to search (add more as needed)
-    DEFAULT_FILTER_FIELDS = ['name', 'owner__last_name', 'owner__first_name', 'species__code', 'breed__name']
-    ALLOWED_SORT_FIELDS = {
-        'name', 'owner__last_name', 'species__code', 'breed__name',
-        'sex', 'intact', 'date_of_birth', 'updated_at',
-        # Add aliases if needed, e.g., 'owner' : 'owner__last_name'
-    }
-    DEFAULT_SORT_FIELD = 'updated_at'
+    # Filter and sort parameters: see main/listing.py
+    DEFAULT_FILTER_FIELDS = listing.PATIENT_FILTER_FIELDS
+    ALLOWED_SORT_FIELDS = listing.PATIENT_SORT_FIELDS
 
+    @method_decorator(conditional_get(*table_validators(Patient, Owner, Species, Breed, name='patients')))
     def get(self, request, *args, **kwargs):
         # --- Parameter Parsing (Page, Per Page) ---
         try:
@@ -455,73 +457,32 @@ class PatientListAPIView(View):
         # --- Parameter Parsing (Minimal Owner List for Dropdown) ---
         minimal_owner_list = request.GET.get('minimal', 'false').lower() == 'true'
         if minimal_owner_list:
-            # Override sorting/pagination for minimal list if needed
-            owners_qs = Owner.objects.order_by('last_name', 'first_name')
-            owners_data = list(owners_qs.values('id', 'last_name', 'first_name', 'email')) # Only required fields
+            # Owner dropdown: top matches from the autocomplete index instead of every owner
+            query = request.GET.get('query', '')
+            owners_data = typeahead.owner_index.search(query, per_page)
             return JsonResponse({'success': True, 'results': owners_data}) # Return only results
 
-        # --- Parameter Parsing (Filtering) ---
-        query = request.GET.get('query', '').strip()
-        filter_fields = request.GET.getlist('filter_fields')
-        owner_id_filter = request.GET.get('owner_id')
-
-        if not filter_fields:
-            filter_fields = self.DEFAULT_FILTER_FIELDS
-        
-        # Validate filter_fields against allowed fields
-        valid_filter_fields = [f for f in filter_fields if f in self.DEFAULT_FILTER_FIELDS]
-        if not valid_filter_fields and query:
-            valid_filter_fields = self.DEFAULT_FILTER_FIELDS
-
-        # --- Parameter Parsing (Sorting) ---
-        sort_field = request.GET.get('sort', self.DEFAULT_SORT_FIELD).lower()
-        sort_direction = request.GET.get('direction', 'desc').lower()
-        
-        if sort_field not in self.ALLOWED_SORT_FIELDS:
-            sort_field = self.DEFAULT_SORT_FIELD
-        if sort_direction not in ['asc', 'desc']:
-            sort_direction = 'desc'
-
-        # --- Base Queryset & Prefetching ---
-        patient_queryset = Patient.objects.select_related('owner', 'species', 'breed').all()
-
-        # --- Apply Filters ---
-        if query and valid_filter_fields:
-            q_objects = Q()
-            for field_name in valid_filter_fields:
-                q_objects |= Q(**{f'{field_name}__icontains': query})
-            patient_queryset = patient_queryset.filter(q_objects)
-
-        # Filter by owner if owner_id is provided
-        if owner_id_filter:
-            try:
-                owner_id_int = int(owner_id_filter)
-                patient_queryset = patient_queryset.filter(owner_id=owner_id_int)
-            except ValueError:
-                # Optional: Handle invalid owner_id (e.g., return error or ignore)
-                # For now, we'll just ignore an invalid ID
-                pass
-
-        # --- Apply Sorting ---
-        # Handle related field sorting (owner__last_name requires secondary sort on first_name)
-        order_by_list = []
-        sort_prefix = '-' if sort_direction == 'desc' else ''
-
-        if sort_field == 'owner__last_name':
-            order_by_list.append(f"{sort_prefix}owner__last_name")
-            order_by_list.append(f"{sort_prefix}owner__first_name") # Secondary sort for owner name
-            order_by_list.append(f"{sort_prefix}name") # Tertiary sort by patient name
+        # --- Filtering (query, filter_fields, owner_id) and sorting on the flat read model (main/listing.py) ---
+        patient_queryset, order_by_list, sort_columns, search_key = listing.patients(request.GET)
+
+        # --- Cursor mode: keyset on the same ordering, no COUNT ---
+        if 'cursor' in request.GET:
+            # Sort columns are selected too so cursors can be built from the rows
+            value_fields = PATIENT_ROW.sources + tuple(c for c in sort_columns if c not in PATIENT_ROW.sources)
+            return keyset_page_response(patient_queryset.values(*value_fields), order_by_list, per_page,
+                                        request.GET.get('cursor'), serialize=PATIENT_ROW.from_dict)
+
+        # --- Totals (counter row when unfiltered, cached count otherwise) ---
+        if search_key is not None:
+            # Searches match on owner/species/breed names too, so their writes invalidate as well
+            total, total_exact = counts.filtered_count(
+                patient_queryset, search_key, depends_on=[Patient, Owner, Species, Breed])
         else:
-            order_by_list.append(f"{sort_prefix}{sort_field}")
-        
-        # Add pk for stable pagination
-        if 'pk' not in [f.lstrip('-') for f in order_by_list]:
-            order_by_list.append('pk')
-
-        patient_queryset = patient_queryset.order_by(*order_by_list)
+            total, total_exact = counts.total_count(Patient), True
 
         # --- Paginate ---
         paginator = Paginator(patient_queryset, per_page)
+        paginator.count = total
         try:
             patients_page = paginator.page(page)
         except PageNotAnInteger:
@@ -537,23 +498,7 @@ class PatientListAPIView(View):
             patients_page = paginator.page(page)
 
         # --- Serialize Results ---
-        results = []
-        for patient in patients_page.object_list:
-            results.append({
-                'id': patient.id,
-                'name': patient.name,
-                'owner_id': patient.owner.id,
-                'owner_name': f"{patient.owner.first_name or ''} {patient.owner.last_name}".strip(),
-                'species_code': patient.species.code,
-                'breed_id': patient.breed.id,
-                'breed_name': patient.breed.name,
-                'sex': patient.sex,
-                'intact': patient.intact,
-                'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
-                'weight': str(patient.weight) if patient.weight is not None else None, # Send as string
-                'created_at': patient.created_at.isoformat() if patient.created_at else None,
-                'updated_at': patient.updated_at.isoformat() if patient.updated_at else None,
-            })
+        results = PATIENT_ROW.rows(patients_page.object_list)
 
         # --- Prepare JSON Response ---
         data = {
@@ -562,11 +507,13 @@ class PatientListAPIView(View):
             'per_page': per_page,
             'total_pages': paginator.num_pages,
             'total_patients': paginator.count, # Changed
+            'total_exact': total_exact,
             'has_previous': patients_page.has_previous(),
             'has_next': patients_page.has_next(),
             'results': results,
         }
-        return JsonResponse(data)
+        response = FastJsonResponse(data)
+        return unvalidated(response) if not total_exact else response
 
 # View to handle Patient Create/Update via AJAX
 class PatientCreateUpdateView(View):
@@ -579,9 +526,8 @@ class PatientCreateUpdateView(View):
         # We need to transform species code back to Species instance for the form
         species_code = data.get('species')
         if species_code:
-            try:
-                data['species'] = Species.objects.get(code=species_code)
-            except Species.DoesNotExist:
+            data['species'] = reference.get_snapshot().species(species_code) # Shared reference cache
+            if data['species'] is None:
                  return JsonResponse({'success': False, 'errors': {'species': [f'Invalid species code: {species_code}']}}, status=400)
         # Breed should be passed as ID from frontend, so no transformation needed for the form
         # Owner should be passed as ID from frontend
@@ -593,7 +539,11 @@ class PatientCreateUpdateView(View):
             form = PatientForm(data)
 
         if form.is_valid():
-            patient = form.save()
+            try:
+                with transaction.atomic(): # Derived tables (search, read model, counters) commit with the row
+                    patient = form.save()
+            except IntegrityError: # Unique (owner, name, species, breed, date of birth)
+                return JsonResponse({'success': False, 'errors': {'__all__': [DUPLICATE_PATIENT_ERROR]}}, status=400)
             # Return the saved patient data (simplified for now, can expand)
             return JsonResponse({'success': True, 'patient_id': patient.id})
         else:
@@ -613,27 +563,15 @@ class PatientDeleteView(View):
 
 # View to get Patient details via AJAX (for pre-filling edit form)
 class PatientDetailView(View):
+     @method_decorator(conditional_get(*row_validators(Patient.objects, 'updated_at', 'owner__updated_at', name='patient')))
      def get(self, request, pk):
-        patient = get_object_or_404(Patient.objects.select_related('owner', 'species', 'breed'), pk=pk)
-        # Return data in a format usable by the Vue form
-        data = {
-            'id': patient.id,
-            'owner': patient.owner.id, # Send owner ID
-            'name': patient.name,
-            'species': patient.species.code, # Send species code
-            'breed': patient.breed.id, # Send breed ID
-            'sex': patient.sex,
-            'intact': patient.intact,
-            'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
-            'weight': str(patient.weight) if patient.weight is not None else None,
-            # Include related names if needed by view modal (though Vue can format)
-            'owner_name': f"{patient.owner.first_name or ''} {patient.owner.last_name}".strip(),
-            'species_code': patient.species.code,
-            'breed_name': patient.breed.name,
-            'created_at': patient.created_at.isoformat() if patient.created_at else None,
-            'updated_at': patient.updated_at.isoformat() if patient.updated_at else None,
-        }
-        return JsonResponse(data)
+        # Return data in a format usable by the Vue form (one row, no model instances)
+        patient_queryset = Patient.objects.filter(pk=pk).annotate(
+            owner_name=Trim(Concat(Coalesce('owner__first_name', Value('')), Value(' '), 'owner__last_name')))
+        data = PATIENT_DETAIL.first(patient_queryset)
+        if data is None:
+            raise Http404("No Patient matches the given query.")
+        return FastJsonResponse(data)
 
 # ==========================
 # Species API Views
@@ -642,9 +580,10 @@ class PatientDetailView(View):
 # Combined View for List (GET) and Create (POST)
 class SpeciesListCreateView(View):
     # GET method from original SpeciesListView
+    @method_decorator(versioned_get(reference.reference_version, name='species'))
     def get(self, request, *args, **kwargs):
-        species = Species.objects.all().order_by('code').values('code')
-        return JsonResponse(list(species), safe=False)
+        species = [{'code': code} for code in reference.get_snapshot().species_codes()]
+        return FastJsonResponse(species)
 
     # POST method from original SpeciesCreateView
     def post(self, request, *args, **kwargs):
@@ -678,6 +617,17 @@ class SpeciesListCreateView(View):
 
 # Remove csrf_exempt as token is sent via X-CSRFToken header in AJAX
 # @method_decorator(csrf_exempt, name='dispatch')
+# Whole species -> breeds catalog for client-side caching (`?v=<reference version>` to cache long-term)
+class ReferenceCatalogView(View):
+    @method_decorator(versioned_get(reference.reference_version, name='catalog'))
+    def get(self, request, *args, **kwargs):
+        return FastJsonResponse(reference.catalog())
+
+# Hit/miss counters of the reference cache in the worker serving the request
+class ReferenceCacheStatsView(View):
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'success': True, 'stats': reference.stats()})
+
 class SpeciesDeleteView(View):
     def delete(self, request, code, *args, **kwargs):
         try:
@@ -707,6 +657,7 @@ class BreedListCreateView(View):
     MAX_PER_PAGE = 100
 
     # GET: List breeds (filtered, searched, paginated)
+    @method_decorator(versioned_get(reference.reference_version, name='breeds'))
     def get(self, request, *args, **kwargs):
         species_code = request.GET.get('species_code')
         search_query = request.GET.get('search', '').strip()
@@ -723,9 +674,8 @@ class BreedListCreateView(View):
         if not species_code:
             return JsonResponse({'success': False, 'error': 'Species code is required.'}, status=400)
 
-        try:
-            target_species = Species.objects.get(code=species_code.upper())
-        except Species.DoesNotExist:
+        target_species = reference.get_snapshot().species(species_code.upper())
+        if target_species is None:
              return JsonResponse({'success': False, 'error': f'Species "{species_code}" not found.'}, status=404)
 
         # Base queryset for the selected species
@@ -738,8 +688,18 @@ class BreedListCreateView(View):
         # Apply ordering
         breed_queryset = breed_queryset.order_by('name')
 
+        # Cursor mode: keyset on (name, pk), no COUNT
+        if 'cursor' in request.GET:
+            return keyset_page_response(breed_queryset.values('id', 'name'), ['name', 'pk'],
+                                        per_page, request.GET.get('cursor'))
+
+        # Totals are always filtered by species: use the count cache
+        total, total_exact = counts.filtered_count(
+            breed_queryset, {'species': target_species.pk, 'search': search_query.lower()}, depends_on=[Breed])
+
         # Paginate
         paginator = Paginator(breed_queryset, per_page)
+        paginator.count = total
         try:
             breeds_page = paginator.page(page)
         except PageNotAnInteger:
@@ -762,11 +722,13 @@ class BreedListCreateView(View):
             'per_page': per_page,
             'total_pages': paginator.num_pages,
             'total_breeds': paginator.count,
+            'total_exact': total_exact,
             'has_previous': breeds_page.has_previous(),
             'has_next': breeds_page.has_next(),
             'results': results,
         }
-        return JsonResponse(data)
+        response = FastJsonResponse(data)
+        return unvalidated(response) if not total_exact else response
 
     # POST: Create a new breed
     def post(self, request, *args, **kwargs):
@@ -782,21 +744,18 @@ class BreedListCreateView(View):
             if not name:
                 return JsonResponse({'error': 'Breed name cannot be empty.'}, status=400)
 
-            try:
-                target_species = Species.objects.get(code=species_code.upper())
-            except Species.DoesNotExist:
+            target_species = reference.get_snapshot().species(species_code.upper())
+            if target_species is None:
                 return JsonResponse({'error': f'Species "{species_code}" not found.'}, status=404)
             
-            # Check for duplicate breed name within the same species
-            if Breed.objects.filter(species=target_species, name__iexact=name).exists():
-                 return JsonResponse({'error': f'Breed "{name}" already exists for species "{species_code}".'}, status=400)
-
             try:
-                new_breed = Breed.objects.create(species=target_species, name=name)
+                # Duplicate names within the species (case-insensitive) are rejected by the unique name key
+                with transaction.atomic():
+                    new_breed = Breed.objects.create(species=target_species, name=name)
                 # Return the created breed's id and name
                 return JsonResponse({'id': new_breed.id, 'name': new_breed.name}, status=201)
-            except IntegrityError as e: # Catch potential db-level constraints
-                return JsonResponse({'error': f'Could not create breed. Database error: {e}'}, status=400)
+            except IntegrityError:
+                return JsonResponse({'error': f'Breed "{name}" already exists for species "{species_code}".'}, status=400)
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON format.'}, status=400)
@@ -859,412 +818,238 @@ class PatientImportTemplateView(View):
 
 
 class PatientImportPreviewView(View):
-    PREVIEW_ROW_COUNT = 10
+    def post(self, request, *args, **kwargs):
+        return staged_preview_response(request, 'patients')
 
+
+class PatientImportExecuteView(View):
     def post(self, request, *args, **kwargs):
-        if 'file' not in request.FILES:
-            return JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
+        file, session, error_response = import_source(request, 'patients')
+        if error_response:
+            return error_response
+        mode, error_response = import_commit_mode(request)
+        if error_response:
+            return error_response
+
+        # Every row error is spooled to disk; the response links the full report (see main/reports.py)
+        report = reports.create(session.meta['file_name'] if session else file.name)
+        chunks = None
+        try:
+            # Chunked: each chunk commits on its own, so other users can save in between
+            chunks = import_chunks(mode, 'patients', session)
+            if session:
+                # Rows validated by the preview step, or now for large files (see main/staging.py)
+                session.validate()
+                importer = importing.PatientImporter(spool=report, chunks=chunks)
+                run = lambda: session.run(importer)
+            else:
+                # Decoded incrementally; owners, breeds and duplicates are resolved per chunk (see main/importing.py)
+                reader = importing.csv_dict_reader(file)
+                header_error = importing.PatientImporter.missing_headers_error(reader.fieldnames)
+                if header_error:
+                    return JsonResponse({'success': False, 'error': header_error}, status=400)
+                # Created before the transaction: takes the shared species/breed snapshot
+                importer = importing.PatientImporter(spool=report, chunks=chunks)
+                run = lambda: importer.run(reader)
+
+            with importing.import_transaction(chunks): # One transaction, or one per chunk
+                run()
 
-        file = request.FILES['file']
-        if not file.name.lower().endswith('.csv'):
-            return JsonResponse({'success': False, 'error': 'Invalid file type. Please upload a .csv file.'}, status=400)
+            # --- Transaction committed successfully here ---
+            # success=False (400) if *any* row failed, even if some imports succeeded
+            result = importer.result()
+            result.update(report.finish(session.csv_path if session else file))
+            if session:
+                session.discard()
+            return JsonResponse(result, status=200 if result['success'] else 400)
+
+        except staging.StagingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        except UnicodeDecodeError:
+             return JsonResponse({'success': False, 'error': f'File encoding error. Please ensure the file is UTF-8 encoded. {importing.stopped_note(chunks)}'}, status=400)
+        except DatabaseError as db_error: # Catch transaction rollback errors
+             print(f"Patient import database error: {db_error}")
+             return JsonResponse({'success': False, 'error': f'Database error during import: {db_error}. {importing.stopped_note(chunks)}'}, status=500)
+        except Exception as e:
+            print(f"Error during patient import execute: {e}")
+            import traceback
+            traceback.print_exc() # Print full traceback for debugging
+            return JsonResponse({'success': False, 'error': f'An unexpected server error occurred: {e}. {importing.stopped_note(chunks)}'}, status=500)
+        finally:
+            report.close()
 
-        # Define required and allowed headers
-        required_headers = {
-            'last_name', 'patient_name', 'species_code', 'breed_name', 'sex', 'intact', 'weight_kg'
-        }
-        # Need at least one of date_of_birth or age_years
-        date_or_age_headers = {'date_of_birth', 'age_years'}
-        allowed_headers = {
-            'last_name', 'first_name', 'email', 'telephone', 'address', 'owner_comments',
-            'patient_name', 'species_code', 'breed_name', 'sex', 'intact', 'date_of_birth', 'age_years', 'weight_kg'
-        }
+# ==========================
+# Background Import Jobs
+# ==========================
+
+# Queue an owner/patient import (see main/jobs.py); manage.js polls the returned status_url
+class ImportJobCreateView(View):
+    kind = None # 'owners' or 'patients', set in urls.py
 
-        total_record_count = 0
-        preview_rows = []
-        headers = []
+    def post(self, request, *args, **kwargs):
+        # A staged session token from the preview step, or the file itself
+        file, session, error_response = import_source(request, self.kind)
+        if error_response:
+            return error_response
+        mode, error_response = import_commit_mode(request)
+        if error_response:
+            return error_response
 
         try:
-            decoded_file = file.read().decode('utf-8-sig')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.reader(io_string)
+            job = jobs.create_staged_job(session, mode) if session else jobs.create_job(self.kind, file, mode)
+        except (OSError, DatabaseError) as e:
+            # On SQLite, typically "database is locked" while another import is writing
+            print(f"Could not queue {self.kind} import: {e}")
+            return JsonResponse({'success': False, 'error': 'Could not start the import (the database may be busy with another import). Please try again.'}, status=503)
+        return FastJsonResponse({'success': True, 'job': jobs.job_status(job)}, status=202)
 
-            # Read header
-            try:
-                headers = next(reader)
-                headers = [h.strip().lower() for h in headers]
-            except StopIteration:
-                 return JsonResponse({'success': False, 'error': 'CSV file is empty or contains only a header.'}, status=400)
-
-            # Validate Headers
-            actual_headers_set = set(headers)
-            if not required_headers.issubset(actual_headers_set):
-                missing = required_headers - actual_headers_set
-                return JsonResponse({'success': False, 'error': f'Missing required columns: {", ".join(missing)}.'}, status=400)
-
-            if not any(h in actual_headers_set for h in date_or_age_headers):
-                 return JsonResponse({'success': False, 'error': 'Missing required column: Must include either "date_of_birth" or "age_years".'}, status=400)
-
-            # Process rows: count all, preview first N
-            for i, row in enumerate(reader):
-                total_record_count += 1
-                if i < self.PREVIEW_ROW_COUNT:
-                    # Basic validation: check column count
-                    if len(row) != len(headers):
-                        return JsonResponse({'success': False, 'error': f'Row {i+2} has incorrect number of columns ({len(row)}). Expected {len(headers)}.'}, status=400)
-                    preview_rows.append(row)
-
-            # Check if any data rows were found
-            if total_record_count == 0:
-                 return JsonResponse({'success': False, 'error': 'CSV file contains only a header row.'}, status=400)
-
-            preview_data = {
-                'headers': headers, # Return the actual headers found in the file
-                'rows': preview_rows
-            }
-            return JsonResponse({
-                'success': True,
-                'preview': preview_data,
-                'total_records': total_record_count
-             })
 
+# Staged import sessions (created by the preview views)
+class ImportSessionDetailView(View):
+    def get(self, request, token, *args, **kwargs):
+        try:
+            session = staging.load(token)
+        except staging.StagingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=404)
+        return JsonResponse({'success': True, 'session': session.summary()})
+
+
+class ImportSessionRowsView(View):
+    MAX_ROWS = 200
+
+    def get(self, request, token, *args, **kwargs):
+        try:
+            session = staging.load(token)
+        except staging.StagingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=404)
+        try:
+            start = max(int(request.GET.get('start', 0)), 0)
+            limit = min(max(int(request.GET.get('limit', 50)), 1), self.MAX_ROWS)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'start and limit must be integers.'}, status=400)
+        only_invalid = request.GET.get('invalid') in ('1', 'true')
+        try:
+            # Validates the session first if the preview left that for later (large files)
+            index = session.row_index(start, limit, only_invalid)
+        except staging.StagingError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         except UnicodeDecodeError:
-             return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
-        except Exception as e:
-            print(f"Error during patient import preview: {e}") # Basic logging
-            return JsonResponse({'success': False, 'error': 'An unexpected error occurred while reading the file.'}, status=500)
+            return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
+        return JsonResponse({'success': True, **index})
 
 
-class PatientImportExecuteView(View):
+# --- Chunked Uploads (see main/uploads.py) --- #
+
+class ImportUploadCreateView(View):
     def post(self, request, *args, **kwargs):
-        if 'file' not in request.FILES:
-            return JsonResponse({'success': False, 'error': 'No file uploaded.'}, status=400)
-
-        file = request.FILES['file']
-        if not file.name.lower().endswith('.csv'):
-            return JsonResponse({'success': False, 'error': 'Invalid file type.'}, status=400)
-
-        import_comment = "<Patient and Owner data added through bulk import>"
-        created_owners = 0
-        updated_owners = 0
-        created_patients = 0
-        skipped_patients = 0
-        errors = []
-
-        # Cache species and breeds to reduce DB hits
-        species_cache = {s.code: s for s in Species.objects.all()}
-        breed_cache = {(b.species.code, b.name.lower()): b for b in Breed.objects.select_related('species').all()}
-        # Cache owners found/created during import to avoid repeated DB checks within the same file
-        owner_cache = {} # Key: (last_name_lower, first_name_lower, email_lower), Value: Owner instance
+        try:
+            file_size = int(request.POST.get('file_size', ''))
+            chunk_size = int(request.POST['chunk_size']) if request.POST.get('chunk_size') else None
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'file_size and chunk_size must be integers.'}, status=400)
+        try:
+            upload = uploads.create(request.POST.get('file_name', ''), file_size, chunk_size)
+        except uploads.UploadError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+        return JsonResponse({'success': True, 'upload': upload.status()}, status=201)
 
+
+class ImportUploadDetailView(View):
+    def get(self, request, token, *args, **kwargs):
         try:
-            decoded_file = file.read().decode('utf-8-sig')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-
-            # Normalize field names from the file header
-            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-            actual_headers = set(reader.fieldnames)
-
-            # Re-validate headers required for execution
-            required_headers = {'last_name', 'patient_name', 'species_code', 'breed_name', 'sex', 'intact', 'weight_kg'}
-            if not required_headers.issubset(actual_headers):
-                missing = required_headers - actual_headers
-                return JsonResponse({'success': False, 'error': f'Execution failed: Missing required columns: {", ".join(missing)}.'}, status=400)
-            if not ('date_of_birth' in actual_headers or 'age_years' in actual_headers):
-                return JsonResponse({'success': False, 'error': 'Execution failed: Missing required column (date_of_birth or age_years).'}, status=400)
-
-            patients_to_create = []
-            owners_to_update_fields = {} # owner_id: {field: value} - track updates for found owners
-            today = timezone.localdate() # Get today's date for age calculation
-
-            with transaction.atomic(): # Wrap the whole process in a transaction
-                for i, row in enumerate(reader):
-                    row_num = i + 2
-                    try:
-                        # --- 1. Extract and Validate Owner Data ---
-                        owner_ln = row.get('last_name', '').strip()
-                        owner_fn = row.get('first_name', '').strip()
-                        owner_em = row.get('email', '').strip()
-                        owner_tel = row.get('telephone', '').strip()
-                        owner_addr = row.get('address', '').strip()
-                        owner_comm = row.get('owner_comments', '').strip()
-
-                        if not owner_ln:
-                            errors.append(f"Row {row_num}: Missing required owner field: last_name.")
-                            continue
-
-                        # --- 2. Find or Prepare Owner ---
-                        owner_key = (owner_ln.lower(), owner_fn.lower(), owner_em.lower())
-                        owner = owner_cache.get(owner_key)
-                        owner_created_this_import = False
-
-                        if not owner:
-                            # Query DB using case-insensitive match
-                            filter_kwargs = {
-                                'last_name__iexact': owner_ln,
-                                'first_name__iexact': owner_fn or '',
-                                'email__iexact': owner_em or ''
-                            }
-                            try:
-                                owner = Owner.objects.get(**filter_kwargs)
-                                # Owner found in DB, potentially update fields
-                                update_needed = False
-                                if owner_tel and owner.telephone != owner_tel:
-                                    owners_to_update_fields.setdefault(owner.id, {})['telephone'] = owner_tel
-                                    update_needed = True
-                                if owner_addr and owner.address != owner_addr:
-                                     owners_to_update_fields.setdefault(owner.id, {})['address'] = owner_addr
-                                     update_needed = True
-                                # Append import comment if new comments provided
-                                if owner_comm and import_comment not in owner.comments:
-                                     new_comment = f"{owner.comments}\n{import_comment}\n{owner_comm}".strip()
-                                     owners_to_update_fields.setdefault(owner.id, {})['comments'] = new_comment
-                                     update_needed = True
-                                elif import_comment not in owner.comments: # Append import comment even if no new comment in file
-                                    new_comment = f"{owner.comments}\n{import_comment}".strip()
-                                    owners_to_update_fields.setdefault(owner.id, {})['comments'] = new_comment
-                                    update_needed = True
-
-                                if update_needed and owner.id not in owners_to_update_fields.get(owner.id, {}): # Check if we added fields
-                                     # Only count as updated if fields were actually added to the dict
-                                     # This logic might need refinement depending on how updates are counted
-                                     pass # Update count handled later
-
-                            except Owner.DoesNotExist:
-                                # Create new owner instance (don't save yet)
-                                owner_data = {
-                                    'last_name': owner_ln,
-                                    'first_name': owner_fn,
-                                    'email': owner_em,
-                                    'telephone': owner_tel,
-                                    'address': owner_addr,
-                                    'comments': f"{owner_comm}\n{import_comment}".strip()
-                                }
-                                owner = Owner(**owner_data)
-                                owner.save() # Save immediately to get an ID for the patient FK
-                                created_owners += 1
-                                owner_created_this_import = True
-                            except Owner.MultipleObjectsReturned:
-                                errors.append(f"Row {row_num}: Found multiple existing owners matching ({owner_ln}, {owner_fn}, {owner_em}). Skipping.")
-                                continue
-
-                            owner_cache[owner_key] = owner # Add found/created owner to cache
-
-                        # --- 3. Extract and Validate Patient Data ---
-                        patient_name = row.get('patient_name', '').strip()
-                        species_code = row.get('species_code', '').strip().upper()
-                        breed_name = row.get('breed_name', '').strip()
-                        sex = row.get('sex', '').strip().upper()
-                        intact_str = row.get('intact', '').strip().lower()
-                        dob_str = row.get('date_of_birth', '').strip()
-                        age_str = row.get('age_years', '').strip()
-                        weight_str = row.get('weight_kg', '').strip()
-
-                        # Required patient fields check
-                        if not all([patient_name, species_code, breed_name, sex, intact_str, weight_str]):
-                            errors.append(f"Row {row_num}: Missing required patient field(s) (name, species, breed, sex, intact, weight).")
-                            continue
-                        if not dob_str and not age_str:
-                             errors.append(f"Row {row_num}: Missing required patient field (date_of_birth or age_years).")
-                             continue
-
-                        # --- 4. Process Patient Fields ---
-                        # Species
-                        species = species_cache.get(species_code)
-                        if not species:
-                            # Try creating species if not found? Or error out? Let's error for now.
-                            errors.append(f"Row {row_num}: Species code '{species_code}' not found in database.")
-                            continue
-                            # Alternative: Create on the fly
-                            # try:
-                            #     species = Species.objects.create(code=species_code)
-                            #     species_cache[species_code] = species
-                            # except IntegrityError:
-                            #     errors.append(f"Row {row_num}: Error creating new species '{species_code}'.")
-                            #     continue
-
-                        # Breed
-                        breed_key = (species_code, breed_name.lower())
-                        breed = breed_cache.get(breed_key)
-                        if not breed:
-                             # Try finding case-insensitive first, then create if not found
-                            try:
-                                breed = Breed.objects.get(species=species, name__iexact=breed_name)
-                                breed_cache[breed_key] = breed # Add found breed to cache
-                            except Breed.DoesNotExist:
-                                # Create new breed
-                                try:
-                                    breed = Breed.objects.create(species=species, name=breed_name)
-                                    breed_cache[breed_key] = breed
-                                except IntegrityError:
-                                     errors.append(f"Row {row_num}: Error creating new breed '{breed_name}' for species '{species_code}'.")
-                                     continue
-
-                        # Sex
-                        if sex not in ['M', 'F', 'U']: # Assuming U for Unknown/Unspecified
-                             errors.append(f"Row {row_num}: Invalid value for sex '{sex}'. Use M, F, or U.")
-                             continue
-
-                        # Intact (Handle variations: true/false, yes/no, 1/0)
-                        intact = None
-                        if intact_str in ['true', 'yes', '1']: intact = True
-                        elif intact_str in ['false', 'no', '0']: intact = False
-                        else:
-                            errors.append(f"Row {row_num}: Invalid value for intact '{intact_str}'. Use true/false, yes/no, or 1/0.")
-                            continue
-
-                         # Weight
-                        try:
-                            weight_kg = float(weight_str)
-                            if weight_kg < 0: raise ValueError("Weight cannot be negative")
-                        except ValueError:
-                             errors.append(f"Row {row_num}: Invalid numeric value for weight_kg '{weight_str}'.")
-                             continue
-
-                        # Date of Birth / Age
-                        dob = None
-                        if dob_str:
-                            try:
-                                dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
-                            except ValueError:
-                                # If DOB format is invalid, check if age is provided
-                                if age_str:
-                                     try:
-                                         age_years = float(age_str)
-                                         if age_years < 0: raise ValueError("Age cannot be negative")
-                                         # Calculate approximate DOB based on age
-                                         dob = today - timezone.timedelta(days=age_years * 365.25)
-                                     except ValueError:
-                                         errors.append(f"Row {row_num}: Invalid date_of_birth '{dob_str}' AND invalid numeric age_years '{age_str}'.")
-                                         continue
-                                else:
-                                    # DOB invalid, no age provided
-                                    errors.append(f"Row {row_num}: Invalid format for date_of_birth '{dob_str}'. Expected YYYY-MM-DD.")
-                                    continue
-                        elif age_str: # No DOB provided, use age
-                             try:
-                                age_years = float(age_str)
-                                if age_years < 0: raise ValueError("Age cannot be negative")
-                                dob = today - timezone.timedelta(days=age_years * 365.25)
-                             except ValueError:
-                                 errors.append(f"Row {row_num}: Invalid numeric value for age_years '{age_str}'.")
-                                 continue
-                        else:
-                             # Should have been caught earlier, but defensively check
-                             errors.append(f"Row {row_num}: Missing date_of_birth or age_years.")
-                             continue
-
-                        # --- 5. Check Patient Uniqueness ---
-                        # Unique based on owner, name (case-insensitive), species, breed, dob
-                        patient_filter = {
-                            'owner': owner,
-                            'name__iexact': patient_name,
-                            'species': species,
-                            'breed': breed,
-                            'date_of_birth': dob
-                        }
-                        if Patient.objects.filter(**patient_filter).exists():
-                            skipped_patients += 1
-                            # Optional: Add to errors if you want to report skipped duplicates
-                            # errors.append(f"Row {row_num}: Skipped duplicate patient record.")
-                            continue
-
-                        # --- 6. Prepare Patient for Bulk Create ---
-                        patient_data = {
-                             'owner': owner,
-                             'name': patient_name,
-                             'species': species,
-                             'breed': breed,
-                             'sex': sex,
-                             'intact': intact,
-                             'date_of_birth': dob,
-                             'weight': weight_kg,
-                         }
-                        patients_to_create.append(Patient(**patient_data))
-
-                    except Exception as e:
-                        # Catch unexpected errors during row processing
-                        errors.append(f"Row {row_num}: Unexpected error processing row: {e}")
-                        print(f"Row {row_num} Error: {e}") # Log the specific error
-
-                # --- End of row loop ---
-
-                # --- 7. Bulk Create Patients ---
-                if patients_to_create:
-                    try:
-                        Patient.objects.bulk_create(patients_to_create)
-                        created_patients = len(patients_to_create)
-                    except Exception as e:
-                        # If bulk create fails, the transaction should roll back owners created in this run
-                        print(f"Patient bulk create error: {e}")
-                        raise IntegrityError(f"Database error during patient bulk import: {e}") # Reraise to trigger rollback
-
-                # --- 8. Bulk Update Owners (outside the main loop) ---
-                owners_to_batch_update = []
-                updated_owner_ids = set()
-                for owner_id, fields_to_update in owners_to_update_fields.items():
-                    if fields_to_update: # Only update if there are changes
-                        owner_instance = Owner.objects.get(pk=owner_id) # Fetch instance again
-                        for field, value in fields_to_update.items():
-                             setattr(owner_instance, field, value)
-                        owners_to_batch_update.append(owner_instance)
-                        updated_owner_ids.add(owner_id)
-
-                if owners_to_batch_update:
-                    try:
-                        Owner.objects.bulk_update(owners_to_batch_update, ['telephone', 'address', 'comments'])
-                        updated_owners = len(updated_owner_ids)
-                    except Exception as e:
-                         print(f"Owner bulk update error: {e}")
-                         # Don't necessarily rollback everything if only owner update fails,
-                         # but report it as an error. Patients might already be created.
-                         errors.append(f"Warning: Failed to update some existing owner records: {e}")
+            upload = uploads.load(token)
+        except uploads.UploadError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+        response = JsonResponse({'success': True, 'upload': upload.status()})
+        response['Cache-Control'] = 'no-store' # Changes with every chunk
+        return response
 
 
-            # --- Transaction committed successfully here ---
+class ImportUploadChunkView(View):
+    def put(self, request, token, index, *args, **kwargs):
+        try:
+            upload = uploads.load(token)
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            # The raw body is streamed to disk (request.read, never request.body)
+            upload.write_chunk(index, request, content_length, request.headers.get('X-Chunk-SHA256'))
+        except uploads.UploadError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid Content-Length.'}, status=400)
+        return JsonResponse({'success': True, 'chunk': index})
 
-            # --- 9. Prepare Response ---
-            response_message = f"Import finished. Created: {created_patients} patients."
-            if created_owners > 0:
-                response_message += f" Created {created_owners} new owners."
-            if updated_owners > 0:
-                 response_message += f" Updated {updated_owners} existing owners."
-            if skipped_patients > 0:
-                response_message += f" Skipped: {skipped_patients} duplicate/existing patients."
-
-            if errors:
-                error_summary = "\n".join(errors[:20]) # Show more errors for patient import
-                if len(errors) > 20:
-                    error_summary += f"\n...and {len(errors) - 20} more errors."
-                # Consider success=False if *any* errors occurred, even if some imports succeeded.
-                return JsonResponse({
-                    'success': False, # Indicate partial failure/errors
-                    'error': f'{response_message}\n\nErrors/Warnings found:\n{error_summary}',
-                    'created_patients': created_patients,
-                    'created_owners': created_owners,
-                    'updated_owners': updated_owners,
-                    'skipped_patients': skipped_patients
-                }, status=400) # Bad request due to data errors
-            else:
-                return JsonResponse({
-                    'success': True,
-                    'message': response_message,
-                    'created_patients': created_patients,
-                    'created_owners': created_owners,
-                    'updated_owners': updated_owners,
-                    'skipped_patients': skipped_patients
-                })
 
-        except UnicodeDecodeError:
-             return JsonResponse({'success': False, 'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}, status=400)
-        except IntegrityError as db_error: # Catch transaction rollback errors
-             return JsonResponse({'success': False, 'error': f'Database error during import: {db_error}. Import cancelled.'}, status=500)
-        except Exception as e:
-            print(f"Error during patient import execute: {e}")
-            import traceback
-            traceback.print_exc() # Print full traceback for debugging
-            return JsonResponse({'success': False, 'error': f'An unexpected server error occurred: {e}'}, status=500)
+class ImportUploadFinalizeView(View):
+    def post(self, request, token, *args, **kwargs):
+        kind = request.POST.get('kind')
+        if kind not in importing.IMPORTERS:
+            return JsonResponse({'success': False, 'error': 'kind must be "owners" or "patients".'}, status=400)
+        try:
+            upload = uploads.load(token)
+        except uploads.UploadError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+        status = upload.status()
+        if not status['complete']:
+            return JsonResponse({
+                'success': False,
+                'error': f"Upload is incomplete: {len(status['missing_chunks'])} of {status['total_chunks']} chunks are missing.",
+                'upload': status,
+            }, status=409)
+        # Same response as the preview views: the client continues with the session token
+        return preview_response(kind, lambda: upload.finalize(kind, count=request.POST.get('count', 'auto')))
+
+
+# Every failed row of a finished import, with its error messages (see main/reports.py)
+class ImportReportView(View):
+    def get(self, request, report_id, *args, **kwargs):
+        try:
+            path, meta = reports.load(report_id)
+        except reports.ReportError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=404)
+        name = os.path.splitext(meta['file_name'])[0]
+        # Streamed from disk in blocks
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}-errors.csv', content_type='text/csv')
+
+
+class ImportJobDetailView(View):
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            job = ImportJob.objects.get(pk=pk)
+        except ImportJob.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Import job not found.'}, status=404)
+        response = FastJsonResponse({'success': True, 'job': jobs.job_status(job)})
+        response['Cache-Control'] = 'no-store' # Live progress
+        return response
+
+
+class ImportJobCancelView(View):
+    def post(self, request, pk, *args, **kwargs):
+        try:
+            job = ImportJob.objects.get(pk=pk)
+        except ImportJob.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Import job not found.'}, status=404)
+        if job.status in ImportJob.FINISHED_STATUSES:
+            return JsonResponse({'success': False, 'error': f'Import already {job.status}.', 'job': jobs.job_status(job)}, status=409)
+        job = jobs.request_cancel(job)
+        return FastJsonResponse({'success': True, 'job': jobs.job_status(job)})
+
+# ==========================
+# Export Views
+# ==========================
+
+# Streams every matching row as CSV (import format) or NDJSON; see main/exports.py
+class ExportView(View):
+    kind = None # 'owners', 'patients' or 'cases', set in urls.py
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv').lower()
+        try:
+            export = exports.Export(self.kind, request.GET, fmt)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        response = StreamingHttpResponse(export, content_type=export.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export.file_name()}"'
+        return response
 
 # ==========================
 # Case Views & API
@@ -1307,7 +1092,8 @@ class CaseCreateAPIView(View):
 
         if form.is_valid():
             try:
-                case = form.save()
+                with transaction.atomic(): # Stamped under the write lock, like every write (see main/changes.py)
+                    case = form.save()
                 # Optionally return more case details if needed by the frontend
                 return JsonResponse({'success': True, 'case_id': case.id, 'case_date': case.case_date}, status=201)
             except Exception as e:
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -89,6 +90,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: readers (pages, import progress polling) aren't blocked by a long-running import transaction
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            # Transactions take the write lock when they start, and wait up to `timeout` seconds for it
+            # (e.g. for a chunk of a running import, see IMPORT_COMMIT_MODE) instead of failing with
+            # "database is locked" when a read turns into a write
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -137,3 +147,27 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Directory for the shared species/breed snapshot files (see main/reference.py).
+# All worker processes of one deployment must see the same directory.
+REFERENCE_CACHE_DIR = os.getenv('REFERENCE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pulsar-reference'))
+
+# Background imports (see main/jobs.py): uploads and progress files of queued/running jobs.
+# Must be shared by the web processes and any `manage.py run_import_worker` process.
+IMPORT_JOB_DIR = os.getenv('IMPORT_JOB_DIR', os.path.join(tempfile.gettempdir(), 'pulsar-import-jobs'))
+# Import threads per web process; 0 leaves all jobs to `manage.py run_import_worker`
+IMPORT_WORKER_THREADS = int(os.getenv('IMPORT_WORKER_THREADS', '1'))
+# Processes validating a large staged import (main/staging.py); 1 validates in the calling process
+IMPORT_VALIDATION_PROCESSES = int(os.getenv('IMPORT_VALIDATION_PROCESSES', '1'))
+# Default commit mode of imports (see importing.ChunkedCommit): 'atomic' imports all rows or none, so a
+# cancelled or failed import leaves nothing behind; 'chunked' commits every chunk of rows, so other
+# writers aren't locked out for the whole import, but stopping it keeps the chunks already committed
+IMPORT_COMMIT_MODE = os.getenv('IMPORT_COMMIT_MODE', 'atomic')
+# Seconds a chunked import waits after each commit, so other writers get the lock
+IMPORT_CHUNK_PAUSE = float(os.getenv('IMPORT_CHUNK_PAUSE', '0.02'))
+# Days deleted rows are kept as tombstones for the changes feed (main/changes.py); sync tokens
+# older than this (less a day) get 410 and must resync. Pruned by `manage.py prune_tombstones`.
+CHANGES_TOMBSTONE_DAYS = int(os.getenv('CHANGES_TOMBSTONE_DAYS', '30'))
+# Directory of the Unix sockets that relay live change events (main/live.py) between the processes
+# of one host (ASGI workers, import workers); empty: each process only sees its own writes
+LIVE_SOCKET_DIR = os.getenv('LIVE_SOCKET_DIR', '')
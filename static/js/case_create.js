@@ -81,6 +81,9 @@ const caseCreateApp = Vue.createApp({
                 valueField: 'id',
                 labelField: 'display_name',
                 searchField: ['last_name', 'first_name', 'email'],
+                // The server already matched (phone digits, accents, several words) and ordered the results:
+                // show them as they are instead of re-filtering them client-side
+                score: () => () => 1,
                 maxOptions: 100,
                 loadThrottle: 300,
                 create: false,
@@ -98,7 +101,7 @@ const caseCreateApp = Vue.createApp({
                 },
                 load: (query, callback) => {
                     this.loading.owners = true;
-                    const url = `${this.ownerListApiUrl}&query=${encodeURIComponent(query)}`; // Uses minimal=true from config
+                    const url = `${this.ownerListApiUrl}&query=${encodeURIComponent(query)}`; // Autocomplete URL (with limit) from config
                     axios.get(url)
                         .then(response => {
                             let owners = [];
@@ -108,6 +111,8 @@ const caseCreateApp = Vue.createApp({
                                     display_name: `${owner.last_name}, ${owner.first_name || ''} (${owner.email || 'No email'})`.trim()
                                 }));
                             }
+                            // Drop the previous query's results (the selected owner is kept), or they would all show
+                            this.ownerTomSelect.clearOptions();
                             callback(owners);
                         })
                         .catch(error => callback())
@@ -7,7 +7,7 @@ const PatientCreateEditModal = {
         updateApiUrlBase: { type: String, required: true }, // e.g., /api/patients/0/update/
         speciesListUrl: { type: String, required: true },
         breedsBySpeciesUrlBase: { type: String, required: true }, // e.g., /api/breeds/?species_code=
-        ownerListUrl: { type: String, required: true } // e.g., /api/owners/?minimal=true
+        ownerListUrl: { type: String, required: true } // e.g., /api/owners/autocomplete/?limit=50
     },
     emits: ['patient-saved', 'modal-closed'],
     data() {
@@ -300,6 +300,9 @@ const PatientCreateEditModal = {
                 valueField: 'id',
                 labelField: 'display_name',
                 searchField: ['last_name', 'first_name', 'email'],
+                // The server already matched (phone digits, accents, several words) and ordered the results:
+                // show them as they are instead of re-filtering them client-side
+                score: () => () => 1,
                 maxOptions: 100,
                 loadThrottle: 300,
                 preload: !!initialOwner, // Preload only if initial owner exists
@@ -314,7 +317,7 @@ const PatientCreateEditModal = {
                  onBlur: () => { this.isLoadingOwners = false; }, // Reset loading on blur
                  load: (query, callback) => {
                      this.isLoadingOwners = true;
-                     const url = `${this.ownerListUrl}&query=${encodeURIComponent(query)}`; // ownerListUrl already includes minimal=true
+                     const url = `${this.ownerListUrl}&query=${encodeURIComponent(query)}`; // ownerListUrl already includes ?limit=
                      axios.get(url)
                          .then(response => {
                              let owners = [];
@@ -324,6 +327,8 @@ const PatientCreateEditModal = {
                                      display_name: `${owner.last_name}, ${owner.first_name || ''} (${owner.email || 'No email'})`.trim()
                                  }));
                              }
+                             // Drop the previous query's results (the selected owner is kept), or they would all show
+                             this.ownerTomSelect?.clearOptions();
                              callback(owners);
                          })
                          .catch(error => callback())
@@ -0,0 +1,87 @@
+// Live updates of a list page from the Server-Sent Events at /api/live/ (ASGI deployments, see main/live.py).
+// For each event the page's `onEvent(event)` answers 'ignore' (nothing it shows changed), 'patch' (fetch the
+// changed rows from the changes feed and hand them to `onRows`) or 'reload' (call `onReload`). Events within
+// `delay` ms are handled together, so an import streaming in reloads the page at most once per delay.
+class LiveListUpdates {
+    constructor({ liveUrl, changesUrl, onEvent, onRows, onReload, delay = 1000 }) {
+        this.liveUrl = liveUrl;
+        this.changesUrl = changesUrl;
+        this.onEvent = onEvent;
+        this.onRows = onRows;
+        this.onReload = onReload;
+        this.delay = delay;
+        this.token = null; // Changes feed position of the rows on the page
+        this.pending = null; // 'patch' or 'reload', waiting for the timer
+        this.timer = null;
+        this.eventSource = null;
+    }
+
+    start() {
+        if (!this.liveUrl || !this.changesUrl || !window.EventSource) return;
+        this.fetchLatestToken()
+            .then(() => {
+                this.eventSource = new EventSource(this.liveUrl);
+                this.eventSource.addEventListener('change', event => {
+                    const action = this.onEvent(JSON.parse(event.data));
+                    if (action !== 'ignore') this.schedule(action);
+                });
+                // Missed events (slow connection, reconnect to another worker): reload to be safe
+                this.eventSource.addEventListener('resync', () => this.schedule('reload'));
+                this.eventSource.addEventListener('error', () => {
+                    // EventSource reconnects by itself, except after an HTTP error (e.g. 501 under WSGI)
+                    if (this.eventSource.readyState === EventSource.CLOSED) {
+                        console.info("Live updates unavailable; the list refreshes on reload only.");
+                    }
+                });
+            })
+            .catch(error => console.error("Error starting live updates:", error));
+    }
+
+    stop() {
+        if (this.eventSource) this.eventSource.close();
+        clearTimeout(this.timer);
+    }
+
+    fetchLatestToken() {
+        return axios.get(this.changesUrl, { params: { since: 'latest' } })
+            .then(response => { this.token = response.data.next; });
+    }
+
+    schedule(action) {
+        this.pending = (this.pending === 'reload' || action === 'reload') ? 'reload' : 'patch';
+        if (!this.timer) {
+            this.timer = setTimeout(() => this.flush(), this.delay);
+        }
+    }
+
+    flush() {
+        const action = this.pending;
+        this.pending = null;
+        this.timer = null;
+        if (action === 'reload') {
+            // Token first: anything changed after it is either in the reloaded page or patched later
+            this.fetchLatestToken().then(() => this.onReload());
+        } else {
+            this.fetchChanges([], []);
+        }
+    }
+
+    fetchChanges(rows, deletedIds) {
+        axios.get(this.changesUrl, { params: { since: this.token } })
+            .then(response => {
+                this.token = response.data.next;
+                rows = rows.concat(response.data.changes);
+                deletedIds = deletedIds.concat(response.data.deleted);
+                if (response.data.has_more) {
+                    this.fetchChanges(rows, deletedIds);
+                } else {
+                    this.onRows(rows, deletedIds);
+                }
+            })
+            .catch(error => {
+                // e.g. 410 for an expired token: start over from the current state
+                console.error("Error fetching changes:", error);
+                this.schedule('reload');
+            });
+    }
+}
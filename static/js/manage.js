@@ -13,6 +13,10 @@ const manageApp = Vue.createApp({
             patientTemplateDownloadUrl: '',
             patientImportPreviewUrl: '',
             patientImportExecuteUrl: '',
+            ownerImportJobUrl: '', // Background imports (queue + poll)
+            patientImportJobUrl: '',
+            importUploadUrl: '', // Resumable chunked uploads (large files)
+            chunkedUploadMinBytes: 16 * 1024 * 1024, // Smaller files are sent in one request
 
             // Import Modal State
             isImportModalOpen: false,
@@ -27,6 +31,11 @@ const manageApp = Vue.createApp({
             importedCount: 0,
             skippedCount: 0,
             skippedRowsInfo: [],
+            ownerImportJob: null, // Latest status of the running background import
+            ownerImportSession: null, // Staged session from the preview (execute sends its token, not the file)
+            ownerUploadPercent: null, // Chunked upload progress (null: not uploading in chunks)
+            ownerErrorReportUrl: null, // CSV of every failed row of the last import
+            ownerImportChunked: false, // Commit per chunk instead of one transaction (opt-in)
 
             // Patient Import Modal State (Similar to Owner Import)
             isPatientImportModalOpen: false,
@@ -36,6 +45,11 @@ const manageApp = Vue.createApp({
             patientTotalRecords: 0,
             patientPreviewHeaders: [],
             isProcessingPatientImport: false,
+            patientImportJob: null,
+            patientImportSession: null,
+            patientUploadPercent: null,
+            patientErrorReportUrl: null,
+            patientImportChunked: false,
 
             // Notification State
             notification: {
@@ -130,9 +144,12 @@ const manageApp = Vue.createApp({
                 this.patientTemplateDownloadUrl = appElement.dataset.patientImportTemplateUrl;
                 this.patientImportPreviewUrl = appElement.dataset.patientImportPreviewUrl;
                 this.patientImportExecuteUrl = appElement.dataset.patientImportExecuteUrl;
+                this.ownerImportJobUrl = appElement.dataset.ownerImportJobUrl;
+                this.patientImportJobUrl = appElement.dataset.patientImportJobUrl;
+                this.importUploadUrl = appElement.dataset.importUploadUrl;
 
                 // Basic check if URLs seem loaded
-                 if (!this.csrfToken || !this.templateDownloadUrl || !this.ownerImportPreviewUrl || !this.ownerImportExecuteUrl || !this.speciesListCreateUrl || !this.speciesDeleteUrlBase || !this.breedListCreateUrl || !this.breedDeleteUrlBase || !this.patientTemplateDownloadUrl || !this.patientImportPreviewUrl || !this.patientImportExecuteUrl) {
+                 if (!this.csrfToken || !this.templateDownloadUrl || !this.ownerImportPreviewUrl || !this.ownerImportExecuteUrl || !this.speciesListCreateUrl || !this.speciesDeleteUrlBase || !this.breedListCreateUrl || !this.breedDeleteUrlBase || !this.patientTemplateDownloadUrl || !this.patientImportPreviewUrl || !this.patientImportExecuteUrl || !this.ownerImportJobUrl || !this.patientImportJobUrl || !this.importUploadUrl) {
                      console.warn("Manage App: Some config URLs might be missing from data attributes.");
                      // Consider showing a more specific error
                  }
@@ -164,6 +181,137 @@ const manageApp = Vue.createApp({
             }
         },
 
+        // --- Preview Uploads ---
+        // Sends a file to the preview: one multipart POST for small files, or a resumable chunked
+        // upload (init, PUT each chunk with its SHA-256, finalize) for large ones. Finalize answers
+        // with the same preview response, so callers handle both the same way.
+        previewImportFile(previewUrl, kind, file, percentField) {
+            if (file.size < this.chunkedUploadMinBytes || !(window.crypto && window.crypto.subtle)) {
+                let formData = new FormData();
+                formData.append('file', file);
+                return axios.post(previewUrl, formData, {
+                    headers: {
+                        'Content-Type': 'multipart/form-data',
+                        'X-CSRFToken': this.csrfToken
+                    }
+                });
+            }
+            // Same file picked again after a dropped connection: resume its upload
+            const resumeKey = `pulsar-upload:${file.name}:${file.size}:${file.lastModified}`;
+            const savedToken = localStorage.getItem(resumeKey);
+            this[percentField] = 0;
+            return (savedToken ? axios.get(`${this.importUploadUrl}${savedToken}/`).catch(() => null) : Promise.resolve(null))
+            .then(response => {
+                if (response && response.data.upload) return response.data.upload;
+                let formData = new FormData();
+                formData.append('file_name', file.name);
+                formData.append('file_size', file.size);
+                return axios.post(this.importUploadUrl, formData, { headers: { 'X-CSRFToken': this.csrfToken } })
+                    .then(created => {
+                        localStorage.setItem(resumeKey, created.data.upload.token);
+                        return created.data.upload;
+                    });
+            })
+            .then(upload => this.sendUploadChunks(file, upload, percentField).then(() => {
+                let formData = new FormData();
+                formData.append('kind', kind);
+                return axios.post(upload.finalize_url, formData, { headers: { 'X-CSRFToken': this.csrfToken } });
+            }))
+            .then(response => {
+                localStorage.removeItem(resumeKey); // Finalized: the upload is gone on the server
+                return response;
+            })
+            .finally(() => {
+                this[percentField] = null;
+            });
+        },
+        sendUploadChunks(file, upload, percentField) {
+            let received = upload.received_chunks;
+            this[percentField] = Math.round(100 * received / upload.total_chunks);
+            // One chunk at a time: a dropped connection loses at most one chunk
+            return upload.missing_chunks.reduce((previous, index) => previous.then(() => {
+                const blob = file.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size);
+                return this.sendUploadChunk(upload, index, blob, 0).then(() => {
+                    received += 1;
+                    this[percentField] = Math.round(100 * received / upload.total_chunks);
+                });
+            }), Promise.resolve());
+        },
+        sendUploadChunk(upload, index, blob, attempt) {
+            return blob.arrayBuffer()
+            .then(data => crypto.subtle.digest('SHA-256', data).then(digest => {
+                const checksum = Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+                return axios.put(`${upload.chunks_url}${index}/`, data, {
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'X-CSRFToken': this.csrfToken,
+                        'X-Chunk-SHA256': checksum
+                    }
+                });
+            }))
+            .catch(error => {
+                // Network error or damaged chunk: retry with backoff (the upload can also be resumed later)
+                if (attempt >= 4 || (error.response && error.response.status === 404)) throw error;
+                return new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt))
+                    .then(() => this.sendUploadChunk(upload, index, blob, attempt + 1));
+            });
+        },
+
+        // --- Background Import Jobs ---
+        // Starts a background job for the staged preview session (or uploads the file if there is none)
+        // and polls its status until it finishes.
+        // Resolves like the old execute request ({ data: <import result> }), so callers handle both the same way.
+        runImportJob(url, session, file, jobField, chunked) {
+            let formData = new FormData();
+            if (session) {
+                formData.append('token', session.token); // Already uploaded and validated by the preview
+            } else {
+                formData.append('file', file);
+            }
+            // Default: all or nothing. Chunked: resumable, other users can save meanwhile, stopping keeps the chunks done
+            formData.append('commit', chunked ? 'chunked' : 'atomic');
+            this[jobField] = null;
+            return axios.post(url, formData, {
+                headers: {
+                    'Content-Type': 'multipart/form-data',
+                    'X-CSRFToken': this.csrfToken
+                }
+            })
+            .then(response => this.pollImportJob(response.data.job, jobField));
+        },
+        pollImportJob(job, jobField) {
+            this[jobField] = job;
+            if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+                this[jobField] = null;
+                return { data: job.result || { success: false, error: 'Import failed.' } };
+            }
+            return new Promise(resolve => setTimeout(resolve, 1000))
+                .then(() => axios.get(job.status_url))
+                .then(response => this.pollImportJob(response.data.job, jobField));
+        },
+        cancelImportJob(jobField) {
+            const job = this[jobField];
+            if (!job) return;
+            axios.post(job.cancel_url, null, { headers: { 'X-CSRFToken': this.csrfToken } })
+            .catch(error => {
+                // 409: the job finished meanwhile; polling picks up the result
+                console.error("Import Cancel Error:", error);
+            });
+        },
+        importJobPercent(job) {
+            if (!job || !job.file_size) return 0;
+            return Math.min(100, Math.round(100 * job.bytes_processed / job.file_size));
+        },
+        importJobSummary(job) {
+            if (!job) return '';
+            if (job.status === 'queued') return 'Waiting for an import worker...';
+            let text = `Processed ${job.rows_processed.toLocaleString()} rows`;
+            if (job.rows_per_second) text += ` (${Math.round(job.rows_per_second).toLocaleString()} rows/s)`;
+            if (job.errors > 0) text += `, ${job.errors} errors so far`;
+            if (job.eta_seconds !== null && job.eta_seconds !== undefined) text += `, about ${Math.ceil(job.eta_seconds)} s left`;
+            return text + '.';
+        },
+
         // --- Owner Import Methods ---
          openImportModal() {
             this.isImportModalOpen = true;
@@ -177,6 +325,7 @@ const manageApp = Vue.createApp({
             this.importedCount = 0;
             this.skippedCount = 0;
             this.skippedRowsInfo = [];
+            this.ownerErrorReportUrl = null;
             this.clearNotification();
             const fileInput = document.getElementById('file-upload');
             if (fileInput) fileInput.value = '';
@@ -218,22 +367,17 @@ const manageApp = Vue.createApp({
             }
             this.isProcessingImport = true;
             this.validationErrors = [];
+            this.ownerImportSession = null;
             this.previewData = [];
             this.totalRecords = 0;
             this.previewHeaders = [];
-            let formData = new FormData();
-            formData.append('file', this.importFile);
-            axios.post(this.ownerImportPreviewUrl, formData, { // Use config URL
-                headers: {
-                    'Content-Type': 'multipart/form-data',
-                    'X-CSRFToken': this.csrfToken // Use config CSRF token
-                }
-            })
+            this.previewImportFile(this.ownerImportPreviewUrl, 'owners', this.importFile, 'ownerUploadPercent')
             .then(response => {
                 if (response.data.success && response.data.preview && response.data.preview.headers && response.data.preview.rows) {
                     this.previewHeaders = response.data.preview.headers;
                     this.previewData = response.data.preview.rows;
                     this.totalRecords = response.data.total_records || 0;
+                    this.ownerImportSession = response.data.session || null;
                 } else {
                     this.validationErrors = response.data.errors || response.data.error ? (Array.isArray(response.data.errors) ? response.data.errors : [response.data.error || 'Preview failed.']) : ['Unknown preview error.'];
                     this.importFile = null;
@@ -262,15 +406,10 @@ const manageApp = Vue.createApp({
             this.isProcessingImport = true;
             this.importSuccess = null;
             this.importMessage = '';
+            this.ownerErrorReportUrl = null;
             this.clearNotification();
-            let formData = new FormData();
-            formData.append('file', this.importFile);
-            axios.post(this.ownerImportExecuteUrl, formData, { // Use config URL
-                headers: {
-                    'Content-Type': 'multipart/form-data',
-                    'X-CSRFToken': this.csrfToken // Use config CSRF token
-                }
-            })
+            // Runs in the background; progress is shown from ownerImportJob
+            this.runImportJob(this.ownerImportJobUrl, this.ownerImportSession, this.importFile, 'ownerImportJob', this.ownerImportChunked)
             .then(response => {
                 if (response.data.success) {
                     this.importSuccess = true;
@@ -284,6 +423,7 @@ const manageApp = Vue.createApp({
                     this.closeModal();
                 } else {
                     this.importSuccess = false;
+                    this.ownerErrorReportUrl = response.data.error_report_url || null;
                     let errorMsg = response.data.error || 'Import failed due to errors.';
                      this.validationErrors = response.data.error ? [response.data.error] : (response.data.errors || ['Import failed.']);
                      this.showNotification(errorMsg, 'error', 0); // Show error in modal and banner
@@ -301,6 +441,7 @@ const manageApp = Vue.createApp({
             })
             .finally(() => {
                 this.isProcessingImport = false;
+                this.ownerImportJob = null;
             });
         },
 
@@ -313,6 +454,7 @@ const manageApp = Vue.createApp({
             this.patientTotalRecords = 0;
             this.patientPreviewHeaders = [];
             this.isProcessingPatientImport = false;
+            this.patientErrorReportUrl = null;
             this.clearNotification();
             const fileInput = document.getElementById('patient-file-upload');
             if (fileInput) fileInput.value = ''; // Reset file input visually
@@ -355,24 +497,18 @@ const manageApp = Vue.createApp({
 
             this.isProcessingPatientImport = true;
             this.patientValidationErrors = [];
+            this.patientImportSession = null;
             this.patientPreviewData = [];
             this.patientTotalRecords = 0;
             this.patientPreviewHeaders = [];
 
-            let formData = new FormData();
-            formData.append('file', this.patientImportFile);
-
-            axios.post(this.patientImportPreviewUrl, formData, {
-                headers: {
-                    'Content-Type': 'multipart/form-data',
-                    'X-CSRFToken': this.csrfToken
-                }
-            })
+            this.previewImportFile(this.patientImportPreviewUrl, 'patients', this.patientImportFile, 'patientUploadPercent')
             .then(response => {
                 if (response.data.success && response.data.preview && response.data.preview.headers && response.data.preview.rows) {
                     this.patientPreviewHeaders = response.data.preview.headers;
                     this.patientPreviewData = response.data.preview.rows;
                     this.patientTotalRecords = response.data.total_records || 0;
+                    this.patientImportSession = response.data.session || null;
                 } else {
                      // Use errors array if provided, otherwise fall back to single error message
                     const errors = response.data.errors || (response.data.error ? [response.data.error] : ['Preview failed.']);
@@ -403,17 +539,11 @@ const manageApp = Vue.createApp({
             this.isProcessingPatientImport = true;
             // Keep validation errors from preview if any, or clear for execution feedback
             // this.patientValidationErrors = [];
+            this.patientErrorReportUrl = null;
             this.clearNotification();
 
-            let formData = new FormData();
-            formData.append('file', this.patientImportFile);
-
-            axios.post(this.patientImportExecuteUrl, formData, {
-                headers: {
-                    'Content-Type': 'multipart/form-data',
-                    'X-CSRFToken': this.csrfToken
-                }
-            })
+            // Runs in the background; progress is shown from patientImportJob
+            this.runImportJob(this.patientImportJobUrl, this.patientImportSession, this.patientImportFile, 'patientImportJob', this.patientImportChunked)
             .then(response => {
                 if (response.data.success) {
                      // Use the detailed message from backend
@@ -421,6 +551,7 @@ const manageApp = Vue.createApp({
                     this.closePatientImportModal();
                 } else {
                      // Display errors from the backend execution attempt
+                    this.patientErrorReportUrl = response.data.error_report_url || null;
                     let errorMsg = response.data.error || 'Import failed due to errors.';
                     // Backend might send a detailed error string or an array of errors
                     this.patientValidationErrors = response.data.error ? [response.data.error] : (response.data.errors || ['Import failed.']);
@@ -439,6 +570,7 @@ const manageApp = Vue.createApp({
             })
             .finally(() => {
                 this.isProcessingPatientImport = false;
+                this.patientImportJob = null;
             });
         },
 
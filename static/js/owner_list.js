@@ -40,6 +40,8 @@ const ownerApp = Vue.createApp({
             detailApiUrlBase: '', // Base URL, pk appended later
             updateApiUrlBase: '', // Base URL, pk appended later
             deleteApiUrlBase: '', // Base URL, pk appended later
+            liveUrl: '', // Server-Sent Events of other users' changes
+            changesUrl: '', // Changes feed, for the rows that changed
             csrfToken: '',
         };
     },
@@ -81,6 +83,8 @@ const ownerApp = Vue.createApp({
                 this.detailApiUrlBase = appElement.dataset.detailApiUrlBase;
                 this.updateApiUrlBase = appElement.dataset.updateApiUrlBase;
                 this.deleteApiUrlBase = appElement.dataset.deleteApiUrlBase;
+                this.liveUrl = appElement.dataset.liveUrl;
+                this.changesUrl = appElement.dataset.changesUrl;
             } else {
                 console.error("Could not read config from #owner-app data attributes.");
             }
@@ -125,6 +129,31 @@ const ownerApp = Vue.createApp({
                     this.isLoading = false;
                 });
         },
+        startLiveUpdates() {
+            // Other users' edits: visible rows are patched in place, added/removed owners reload the page
+            this.liveUpdates = new LiveListUpdates({
+                liveUrl: this.liveUrl,
+                changesUrl: this.changesUrl,
+                onEvent: event => {
+                    if (event.action !== 'updated' || !event.ids) return 'reload'; // Totals/positions changed
+                    return event.ids.some(id => this.owners.some(owner => owner.id === id)) ? 'patch' : 'ignore';
+                },
+                onRows: (rows, deletedIds) => this.patchOwners(rows, deletedIds),
+                onReload: () => this.fetchPaginatedOwners(),
+            });
+            this.liveUpdates.start();
+        },
+        patchOwners(rows, deletedIds) {
+            if (deletedIds.some(id => this.owners.some(owner => owner.id === id))) {
+                this.fetchPaginatedOwners();
+                return;
+            }
+            // Same row format as the list API; the page keeps its order until the next reload
+            rows.forEach(row => {
+                const index = this.owners.findIndex(owner => owner.id === row.id);
+                if (index !== -1) this.owners.splice(index, 1, row);
+            });
+        },
         goToPage(page) {
             if (page >= 1 && page <= this.totalPages) {
                 this.currentPage = page;
@@ -264,6 +293,7 @@ const ownerApp = Vue.createApp({
          this.readConfig(); // Read config from data attributes
          if (this.listApiUrl && this.csrfToken) { // Check if config loaded
             this.fetchPaginatedOwners(); // Fetch initial data
+            this.startLiveUpdates();
          } else {
              console.error("App initialization failed: Missing config.");
              this.isLoading = false; // Stop loading indicator
@@ -280,6 +310,7 @@ const ownerApp = Vue.createApp({
          });
     },
      beforeUnmount() {
+         if (this.liveUpdates) this.liveUpdates.stop();
          // Clean up event listener when the component is destroyed
          // Need to store the listener function reference to remove it correctly
          // window.removeEventListener('keydown', this.globalKeydownListener); 
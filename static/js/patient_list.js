@@ -42,6 +42,8 @@ const patientApp = Vue.createApp({
             speciesListUrl: '',
             breedsBySpeciesUrlBase: '',
             ownerListUrl: '',
+            liveUrl: '', // Server-Sent Events of other users' changes
+            changesUrl: '', // Changes feed, for the rows that changed
             csrfToken: '',
         };
     },
@@ -164,6 +166,8 @@ const patientApp = Vue.createApp({
                 this.speciesListUrl = appElement.dataset.speciesListUrl;
                 this.breedsBySpeciesUrlBase = appElement.dataset.breedsBySpeciesUrlBase;
                 this.ownerListUrl = appElement.dataset.ownerListUrl;
+                this.liveUrl = appElement.dataset.liveUrl;
+                this.changesUrl = appElement.dataset.changesUrl;
             } else {
                 console.error("Could not read config from #patient-app data attributes.");
             }
@@ -208,6 +212,38 @@ const patientApp = Vue.createApp({
                     this.isLoading = false;
                 });
         },
+        startLiveUpdates() {
+            // Other users' edits: visible rows are patched in place, added/removed patients reload the page
+            this.liveUpdates = new LiveListUpdates({
+                liveUrl: this.liveUrl,
+                changesUrl: this.changesUrl,
+                onEvent: event => {
+                    if (event.kind === 'owners') {
+                        // Owner names are copied into the rows without changing the patients' feed;
+                        // owner deletes arrive as patient deletes
+                        if (event.action !== 'updated') return 'ignore';
+                        const shown = !event.ids || event.ids.some(id => this.patients.some(patient => patient.owner_id === id));
+                        return shown ? 'reload' : 'ignore';
+                    }
+                    if (event.action !== 'updated' || !event.ids) return 'reload'; // Totals/positions changed
+                    return event.ids.some(id => this.patients.some(patient => patient.id === id)) ? 'patch' : 'ignore';
+                },
+                onRows: (rows, deletedIds) => this.patchPatients(rows, deletedIds),
+                onReload: () => this.fetchPaginatedPatients(),
+            });
+            this.liveUpdates.start();
+        },
+        patchPatients(rows, deletedIds) {
+            if (deletedIds.some(id => this.patients.some(patient => patient.id === id))) {
+                this.fetchPaginatedPatients();
+                return;
+            }
+            // Same row format as the list API; the page keeps its order until the next reload
+            rows.forEach(row => {
+                const index = this.patients.findIndex(patient => patient.id === row.id);
+                if (index !== -1) this.patients.splice(index, 1, row);
+            });
+        },
         goToPage(page) {
             if (page >= 1 && page <= this.totalPages) {
                 this.currentPage = page;
@@ -350,6 +386,7 @@ const patientApp = Vue.createApp({
          this.readConfig(); 
          if (this.listApiUrl && this.csrfToken) { 
             this.fetchPaginatedPatients(); // Fetch initial patient data
+            this.startLiveUpdates();
             // No longer need to fetch species/owners here for the modal
          } else {
              console.error("App initialization failed: Missing config.");
@@ -366,6 +403,7 @@ const patientApp = Vue.createApp({
          });
     },
      beforeUnmount() {
+         if (this.liveUpdates) this.liveUpdates.stop();
          // Clean up event listener
          // Need proper reference removal
          // window.removeEventListener('keydown', this.globalKeydownListener); 